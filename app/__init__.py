@@ -9,10 +9,12 @@ try:
 except Exception:
     pass
 import config as _config  # project-level config module
+from .startup import StartupTimer
 
 
 def create_app(config_object=None):
     """Application factory for ColorWeave."""
+    timer = StartupTimer()
     # Templates/static live at repository root 'templates' and 'static'
     top = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     template_folder = os.path.join(top, 'templates')
@@ -58,6 +60,8 @@ def create_app(config_object=None):
         else:
             app.config.from_object(_config.Config)
 
+    timer.mark('config')
+
     # Initialize extensions
     from .extensions import db, migrate, login_manager, flask_session
     # Ensure a session backend is configured (filesystem fallback)
@@ -89,6 +93,8 @@ def create_app(config_object=None):
     except Exception:
         pass
 
+    timer.mark('extensions')
+
     # Configure login loader (deferred import to avoid circulars)
     from .models import User  # type: ignore
 
@@ -110,9 +116,13 @@ def create_app(config_object=None):
     try:
         from .ai.routes import ai_bp  # type: ignore
         app.register_blueprint(ai_bp, url_prefix='/api/ai')
+        from .ai.profiles import init_app as _init_profiles  # type: ignore
+        _init_profiles(app)
     except Exception:
         pass
 
+    timer.mark('blueprints')
+
     # --- Create compatibility top-level endpoint aliases for legacy templates/tests ---
     try:
         # import view callables from routes so we can register them as top-level endpoints
@@ -143,6 +153,8 @@ def create_app(config_object=None):
     except Exception:
         pass
 
+    timer.mark('aliases')
+
     # Ensure instance folders exist
     try:
         os.makedirs(app.instance_path, exist_ok=True)
@@ -207,6 +219,8 @@ def create_app(config_object=None):
             os.makedirs(os.path.join(static_folder, 'images', 'avatars') if (static_folder := app.static_folder) else os.path.join('static','images','avatars'), exist_ok=True)  # type: ignore
         except Exception:
             pass
+    timer.mark('database')
+    app.extensions['startup'] = timer.report()
 
     return app
 
@@ -14,6 +14,15 @@ def _is_admin_user(user):
     return getattr(user, 'is_admin', False)
 
 
+def _sync_ai_indices(upserted=(), removed=()):
+    """Apply product writes to the shared AI indices (best effort)."""
+    try:
+        from .ai.registry import apply_product_changes
+        apply_product_changes(current_app, upserted=upserted, removed=removed)
+    except Exception:
+        pass
+
+
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -89,6 +98,7 @@ def add():
     prod = Product(name=name, price=price, image=image, stock=stock, description=description)
     db.session.add(prod)
     db.session.commit()
+    _sync_ai_indices(upserted=[prod])
     flash('Product added.', 'success')
     # If caller is not an authenticated admin, avoid redirecting to the protected admin index
     if not _is_admin_user(current_user):
@@ -130,6 +140,7 @@ def edit(product_id):
                     flash(f'Uploaded file is not a valid image: {e}', 'error')
                     return redirect(url_for('admin.index'))
         db.session.commit()
+        _sync_ai_indices(upserted=[prod])
         flash('Product updated.', 'success')
         return redirect(url_for('admin.index'))
     return render_template('admin_edit.html', product=prod)
@@ -222,6 +233,7 @@ def delete(product_id):
     prod = Product.query.get_or_404(product_id)
     db.session.delete(prod)
     db.session.commit()
+    _sync_ai_indices(removed=[product_id])
     flash('Product deleted.', 'success')
     return redirect(url_for('admin.index'))
 
@@ -260,6 +272,7 @@ def import_products():
     try:
         import json
         data = json.load(f)
+        merged = []
         for it in data:
             prod = Product(
                 id=int(it.get('id')) if it.get('id') else None,
@@ -269,8 +282,9 @@ def import_products():
                 image=it.get('image', ''),
                 stock=int(it.get('stock', 0))
             )
-            db.session.merge(prod)
+            merged.append(db.session.merge(prod))
         db.session.commit()
+        _sync_ai_indices(upserted=merged)
         flash('Products imported.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -2,7 +2,7 @@
 
 This package provides a lightweight, local-first implementation:
 - embeddings: TF-IDF fallback or sentence-transformers when available
-- vector store: sklearn NearestNeighbors (faiss optional if installed)
+- vector store: NumPy cosine top-k over a normalized matrix (search.py)
 - imagery: local placeholder generator (PIL)
 
 Modules exported here are intentionally small and test-friendly; adapters
@@ -0,0 +1,129 @@
+"""Approximate nearest-neighbour search: IVF-flat on NumPy.
+
+Rows are clustered with spherical k-means into ``nlist`` inverted lists and
+stored contiguously list by list. A query is compared with the centroids
+first and then only scans the rows of its ``nprobe`` closest lists, so cost
+grows with ``nprobe * n / nlist`` instead of ``n``. Raising ``nprobe`` trades
+speed for recall; ``nprobe == nlist`` is exact. Row filters are applied
+inside the probed lists, before the top-k selection.
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+from .search import is_sparse, l2_normalize, top_k
+
+_ASSIGN_CHUNK = 65536
+_SAMPLE_PER_LIST = 256
+
+
+def default_nlist(n: int) -> int:
+    """Rule-of-thumb list count: about sqrt(n), at least 1."""
+    return max(1, int(round(math.sqrt(n))))
+
+
+def _assign(matrix, centroids) -> np.ndarray:
+    """Closest centroid per row, computed in chunks to bound memory."""
+    out = np.empty(matrix.shape[0], dtype=np.int64)
+    for s in range(0, matrix.shape[0], _ASSIGN_CHUNK):
+        block = np.asarray(matrix[s:s + _ASSIGN_CHUNK], dtype=np.float32)
+        out[s:s + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(matrix, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a row sample; returns ``(nlist, dim)`` unit centroids."""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    nlist = max(1, min(nlist, n))
+    take = np.sort(rng.choice(n, size=min(n, nlist * _SAMPLE_PER_LIST), replace=False))
+    sample = np.asarray(matrix[take], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        # Re-seed empty lists from random sample rows
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        centroids = l2_normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """IVF-flat cosine index with the same ``kneighbors`` API as ``CosineIndex``.
+
+    ``matrix`` rows must be unit length and dense. Pass ``centroids`` to reuse
+    a trained quantizer (e.g. after an incremental update); otherwise they
+    are trained here.
+    """
+
+    def __init__(self, matrix, nlist: Optional[int] = None, nprobe: int = 8,
+                 centroids: Optional[np.ndarray] = None, iters: int = 10):
+        if is_sparse(matrix):
+            raise ValueError('IVFIndex needs a dense matrix')
+        n = matrix.shape[0]
+        if centroids is None:
+            centroids = train_centroids(matrix, nlist or default_nlist(n), iters=iters)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = max(1, int(nprobe))
+        assign = _assign(matrix, self.centroids)
+        self._order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=len(self.centroids))
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        # Rows laid out list by list so each probe scans one contiguous block
+        self._rows = np.ascontiguousarray(np.asarray(matrix, dtype=np.float32)[self._order])
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self):
+        return self._rows.shape[0]
+
+    def kneighbors(self, queries, n_neighbors: int = 10, mask: Optional[np.ndarray] = None):
+        """Return ``(distances, indices)`` of shape ``(len(queries), k)``.
+
+        With ``mask`` only rows where it is ``True`` are candidates; probed
+        lists are filtered before scoring, and if they hold fewer than ``k``
+        allowed rows the query falls back to a scan of all allowed rows.
+        """
+        q = l2_normalize(queries)
+        if is_sparse(q):
+            q = q.toarray()
+        allowed = None if mask is None else np.asarray(mask, dtype=bool)[self._order]
+        k = min(n_neighbors, len(self) if allowed is None else int(np.count_nonzero(allowed)))
+        probes, _ = top_k(q @ self.centroids.T, min(self.nprobe, self.nlist))
+        dists = np.empty((q.shape[0], k), dtype=np.float32)
+        inds = np.empty((q.shape[0], k), dtype=np.intp)
+        if not k:
+            return dists, inds
+        for qi in range(q.shape[0]):
+            sims, pos = [], []
+            for c in probes[qi]:
+                s, e = self._offsets[c], self._offsets[c + 1]
+                if e > s:
+                    block, p = self._rows[s:e] @ q[qi], np.arange(s, e)
+                    if allowed is not None:
+                        keep = allowed[s:e]
+                        block, p = block[keep], p[keep]
+                    sims.append(block)
+                    pos.append(p)
+            if sum(len(p) for p in pos) < k:
+                # Probed lists hold fewer than k rows: fall back to a full scan
+                if allowed is None:
+                    sims, pos = [self._rows @ q[qi]], [np.arange(len(self))]
+                else:
+                    p = np.flatnonzero(allowed)
+                    sims, pos = [self._rows[p] @ q[qi]], [p]
+            sims, pos = np.concatenate(sims), np.concatenate(pos)
+            top, vals = top_k(sims[None, :], k)
+            inds[qi] = self._order[pos[top[0]]]
+            dists[qi] = 1.0 - vals[0]
+        return dists, inds
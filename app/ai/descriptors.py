@@ -0,0 +1,93 @@
+"""Colour descriptors for visual search.
+
+A descriptor turns a PIL image into a fixed-length float32 vector that is
+compared with Euclidean distance. ``VisionIndexer`` takes one by name
+(``VISION_DESCRIPTOR``); its ``name`` and ``version`` are stored with the
+persisted features so switching descriptors never mixes vectors.
+
+- ``rgb768``: the raw 3 x 256-bin ``Image.histogram()``, L2-normalized.
+  Large, mostly zeros and sensitive to lighting.
+- ``hsv``: a 12 x 3 hue x saturation histogram, with grey (unsaturated or
+  very dark) pixels counted in 4 value bins instead, plus colour moments
+  (mean, standard deviation and skew of saturation and value, and the
+  saturation-weighted mean hue direction) in 48 dims. Brightness changes
+  move value, not hue or saturation, so it is far more tolerant to them,
+  and it is 16x smaller to store and scan.
+
+Descriptors use the image as given; callers decode it at a small working
+size first (``vision.load_image``).
+
+``benchmarks/eval_vision_descriptor.py`` compares them.
+"""
+from typing import Callable, Dict
+
+import numpy as np
+from PIL import Image  # type: ignore
+
+_H_BINS, _S_BINS, _V_BINS = 12, 3, 4
+# Pixels below either threshold (0-255) count as grey and are binned by value
+_GREY_SAT, _GREY_VAL = 40, 40
+# Weight of the moment block relative to the unit-length histogram
+_MOMENT_WEIGHT = 0.5
+
+
+class Descriptor:
+    def __init__(self, name: str, version: int, dim: int, fn: Callable[[Image.Image], np.ndarray]):
+        self.name = name
+        self.version = version
+        self.dim = dim
+        self._fn = fn
+
+    def __call__(self, img: Image.Image) -> np.ndarray:
+        return self._fn(img)
+
+    def __repr__(self):
+        return f'Descriptor({self.name!r}, v{self.version}, dim={self.dim})'
+
+
+def rgb_histogram(img: Image.Image) -> np.ndarray:
+    """Compute a simple L2-normalized RGB histogram feature (768 dims, float32)."""
+    img = img.convert('RGB')
+    hist = np.asarray(img.histogram(), dtype=np.float32)  # 256*3 bins
+    norm = float(np.linalg.norm(hist)) or 1.0
+    return hist / norm
+
+
+def hsv_histogram_moments(img: Image.Image) -> np.ndarray:
+    """Hue x saturation histogram plus grey levels (L2-normalized), then 8 colour moments."""
+    img = img.convert('RGB')
+    hsv = np.asarray(img.convert('HSV'), dtype=np.uint16).reshape(-1, 3)
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    # Hue is noise for washed-out or very dark pixels; bin those by value instead
+    grey = (s < _GREY_SAT) | (v < _GREY_VAL)
+    bins = np.where(grey,
+                    _H_BINS * _S_BINS + ((v * _V_BINS) >> 8),
+                    ((h * _H_BINS) >> 8) * _S_BINS + ((s * _S_BINS) >> 8))
+    hist = np.bincount(bins, minlength=_H_BINS * _S_BINS + _V_BINS).astype(np.float32)
+    hist /= float(np.linalg.norm(hist)) or 1.0
+
+    sv = hsv[:, 1:].astype(np.float32) / 255.0
+    mean = sv.mean(axis=0)
+    std = sv.std(axis=0)
+    skew = np.cbrt(((sv - mean) ** 3).mean(axis=0))
+    # Hue is circular: average it as a unit vector, weighted by saturation
+    angle = h.astype(np.float32) * (2.0 * np.pi / 256.0)
+    weight = sv[:, 0]
+    total = float(weight.sum()) or 1.0
+    hue = np.array([(weight * np.cos(angle)).sum(), (weight * np.sin(angle)).sum()], dtype=np.float32) / total
+    moments = np.concatenate([mean, std, skew, hue]) * _MOMENT_WEIGHT
+    return np.concatenate([hist, moments.astype(np.float32)])
+
+
+DESCRIPTORS: Dict[str, Descriptor] = {
+    'rgb768': Descriptor('rgb768', 1, 768, rgb_histogram),
+    'hsv': Descriptor('hsv', 1, _H_BINS * _S_BINS + _V_BINS + 8, hsv_histogram_moments),
+}
+
+
+def get_descriptor(name: str | None) -> Descriptor:
+    """Descriptor registered as ``name`` (default ``rgb768``)."""
+    key = (name or 'rgb768').lower()
+    if key not in DESCRIPTORS:
+        raise ValueError(f'unknown vision descriptor {name!r}; choose from {sorted(DESCRIPTORS)}')
+    return DESCRIPTORS[key]
@@ -1,242 +1,1098 @@
 import os
-from typing import List, Tuple
+import hashlib
+from collections import Counter
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
 from pathlib import Path
 import json
 
-try:  # Optional heavy dependency
-    from sentence_transformers import SentenceTransformer  # type: ignore
-    has_transformer = True
-except Exception:
-    SentenceTransformer = None  # type: ignore
-    has_transformer = False
-
-# Provide lightweight internal fallbacks if scikit-learn is not installed.
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer  # type: ignore
-    from sklearn.neighbors import NearestNeighbors  # type: ignore
-    has_sklearn = True
-except Exception:
-    has_sklearn = False
-
-    class TfidfVectorizer:  # type: ignore
-        def __init__(self, stop_words=None):
-            self.vocab = {}
-        def fit_transform(self, texts):
-            # Extremely naive bag-of-words frequency matrix
-            docs = []
-            vocab_index = {}
-            for t in texts:
-                counts = {}
-                for w in t.lower().split():
-                    counts[w] = counts.get(w,0)+1
-                docs.append(counts)
-                for w in counts:
-                    if w not in vocab_index:
-                        vocab_index[w] = len(vocab_index)
-            import math
-            matrix = []
-            for d in docs:
-                row = [0]*len(vocab_index)
-                for w,c in d.items():
-                    row[vocab_index[w]] = c
-                matrix.append(row)
-            self.vocab = vocab_index
-            return _Array(matrix)
-        def transform(self, texts):
-            matrix = []
-            for t in texts:
-                counts = {}
-                for w in t.lower().split():
-                    counts[w] = counts.get(w,0)+1
-                row = [0]*len(self.vocab)
-                for w,c in counts.items():
-                    if w in self.vocab:
-                        row[self.vocab[w]] = c
-                matrix.append(row)
-            return _Array(matrix)
-
-    class NearestNeighbors:  # type: ignore
-        def __init__(self, n_neighbors=10, metric='cosine'):
-            self.n_neighbors = n_neighbors
-            self.metric = metric
-            self._X = None
-        def fit(self, X):
-            self._X = X
-        def kneighbors(self, vec, n_neighbors=None):
-            import math
-            n = n_neighbors or self.n_neighbors
-            dists = []
-            for i,row in enumerate(self._X.data):
-                d = _cosine_distance(row, vec.data[0])
-                dists.append((d,i))
-            dists.sort(key=lambda x: x[0])
-            chosen = dists[:n]
-            return ( [[d for d,_ in chosen]], [[i for _,i in chosen]] )
-
-    class _Array:  # minimal stand-in for numpy array used
-        def __init__(self, data):
-            self.data = data
-        def toarray(self):
-            return self.data
-        def __getitem__(self, item):
-            return self.data[item]
-
-    def _cosine_distance(a,b):
-        import math
-        dot = sum(x*y for x,y in zip(a,b))
-        na = math.sqrt(sum(x*x for x in a)) or 1e-9
-        nb = math.sqrt(sum(x*x for x in b)) or 1e-9
-        return 1 - (dot/(na*nb))
+import numpy as np
+
+# Optional heavy dependencies are imported on first use (see
+# ``_load_transformer`` / ``_load_sklearn``), not when the app imports this
+# module: importing torch or scikit-learn costs seconds per worker boot.
+# ``None`` means "not probed yet".
+SentenceTransformer = None  # type: ignore
+has_transformer = None
+TfidfVectorizer = None  # type: ignore
+has_sklearn = None
+_import_lock = threading.Lock()
+
+
+def _load_transformer() -> bool:
+    """Import sentence-transformers once; True if it is available."""
+    global SentenceTransformer, has_transformer
+    if has_transformer is None:
+        with _import_lock:
+            if has_transformer is None:
+                try:
+                    from sentence_transformers import SentenceTransformer as cls  # type: ignore
+                    SentenceTransformer = cls
+                    has_transformer = True
+                except Exception:
+                    has_transformer = False
+    return bool(has_transformer)
+
+
+def _load_sklearn() -> bool:
+    """Bind ``TfidfVectorizer`` (scikit-learn's or the fallback below); True if sklearn is available."""
+    global TfidfVectorizer, has_sklearn
+    if has_sklearn is None:
+        with _import_lock:
+            if has_sklearn is None:
+                try:
+                    from sklearn.feature_extraction.text import TfidfVectorizer as cls  # type: ignore
+                    TfidfVectorizer, has_sklearn = cls, True
+                except Exception:
+                    TfidfVectorizer, has_sklearn = _FallbackTfidfVectorizer, False
+    return bool(has_sklearn)
+
+
+# Lightweight internal fallback if scikit-learn is not installed.
+class _FallbackTfidfVectorizer:
+    def __init__(self, stop_words=None):
+        self.vocab = {}
+    def fit_transform(self, texts):
+        # Extremely naive bag-of-words frequency matrix
+        docs = []
+        vocab_index = {}
+        for t in texts:
+            counts = {}
+            for w in t.lower().split():
+                counts[w] = counts.get(w,0)+1
+            docs.append(counts)
+            for w in counts:
+                if w not in vocab_index:
+                    vocab_index[w] = len(vocab_index)
+        matrix = []
+        for d in docs:
+            row = [0]*len(vocab_index)
+            for w,c in d.items():
+                row[vocab_index[w]] = c
+            matrix.append(row)
+        self.vocab = vocab_index
+        return _Array(matrix)
+    def transform(self, texts):
+        matrix = []
+        for t in texts:
+            counts = {}
+            for w in t.lower().split():
+                counts[w] = counts.get(w,0)+1
+            row = [0]*len(self.vocab)
+            for w,c in counts.items():
+                if w in self.vocab:
+                    row[self.vocab[w]] = c
+            matrix.append(row)
+        return _Array(matrix)
+
+
+class _Array:  # minimal stand-in for numpy array used
+    def __init__(self, data):
+        self.data = data
+    def toarray(self):
+        return self.data
+    def __getitem__(self, item):
+        return self.data[item]
 
 from ..models import Product, Event
 from ..extensions import db
-from ..extensions import db
+from .store import (
+    VECTOR_DTYPE,
+    matrix_file_path,
+    pack_matrix,
+    read_arrays_file,
+    read_matrix_file,
+    read_sparse_file,
+    unpack_matrix,
+    write_arrays_file,
+    write_matrix_file,
+    write_sparse_file,
+)
+from .ann import IVFIndex, default_nlist
+from .neighbors import NeighborTable, compute_neighbors
+from .quant import QuantizedIndex
+from .shards import ShardedIndex, ShardPool
+from .search import (CosineIndex, PatchedIndex, StackedRows, is_sparse, l2_normalize, materialize_rows,
+                     take_rows, vstack_rows)
+from .cache import LRUCache
+from .encoders import get_model
+
+
+class _IndexSnapshot:
+    """One consistent view of the index: ids, row matrix, search engine.
+
+    Snapshots are never mutated; updates build a new one and swap
+    ``EmbeddingIndexer._snap`` in a single assignment, so readers that grab
+    the reference once always see ids, rows and the TF-IDF vocabulary that
+    belong together, even while a rebuild is fitting a new one.
+
+    ``prices`` and ``stock`` are aligned with ``ids`` so search filters are
+    evaluated as boolean row masks; ``attrs_version`` bumps when only they
+    change (the rows and the engine are then shared with the previous
+    snapshot).
+    """
+
+    _MAX_MASKS = 64
+
+    def __init__(self, ids: List[int], embeddings, nn, hashes: Dict[int, str], version: int = 0,
+                 vectorizer=None, epoch: int = 0, prices=None, stock=None, attrs_version: int = 0):
+        self.version = version
+        self.vectorizer = vectorizer
+        self.epoch = epoch
+        self.ids = ids
+        self.embeddings = embeddings
+        self.nn = nn
+        self.hashes = hashes
+        self.pos = {pid: i for i, pid in enumerate(ids)}
+        self.prices = np.zeros(len(ids), dtype=np.int64) if prices is None else np.asarray(prices, dtype=np.int64)
+        self.stock = np.zeros(len(ids), dtype=np.int64) if stock is None else np.asarray(stock, dtype=np.int64)
+        self.attrs_version = attrs_version
+        self.in_stock = self.stock > 0
+        self._masks: Dict[tuple, np.ndarray] = {}
+
+    def mask(self, min_price: int | None = None, max_price: int | None = None,
+             in_stock: bool = False) -> np.ndarray | None:
+        """Rows passing the filters (memoized), or None when nothing is filtered."""
+        key = (min_price, max_price, bool(in_stock))
+        if key == (None, None, False):
+            return None
+        m = self._masks.get(key)
+        if m is None:
+            m = self.in_stock.copy() if in_stock else np.ones(len(self.ids), dtype=bool)
+            if min_price is not None:
+                m &= self.prices >= min_price
+            if max_price is not None:
+                m &= self.prices <= max_price
+            if len(self._masks) >= self._MAX_MASKS:
+                self._masks.clear()
+            self._masks[key] = m
+        return m
 
 
 class EmbeddingIndexer:
     """A simple embedding indexer with a transformer fallback.
 
-    If sentence-transformers is not available, we fall back to TF-IDF vectors.
-    The index is kept in-memory and can be persisted as a simple JSON cache.
+    If sentence-transformers is not available, we fall back to TF-IDF vectors,
+    which stay in sparse CSR form. Vectors are L2-normalized once and searched
+    with the engine in ``search.py``. Transformer vectors are persisted as
+    float32 BLOBs in the ``embedding_cache`` table, keyed by (model, hash of
+    the embedded text) so builds only encode new or changed text and each
+    model keeps its own vectors, and as a memory-mapped matrix file under
+    ``persist_dir``; TF-IDF rows are persisted as a sparse ``.npz`` together
+    with the fitted vocabulary.
+
+    Catalog edits can be applied with :meth:`upsert_products`,
+    :meth:`remove_products` or :meth:`sync`, which only re-encode products
+    whose ``name`` + ``description`` text changed.
+
+    Query text is normalized (case, whitespace) and cached twice: text ->
+    query vector per encoder, and text -> top-k result per index version, so
+    repeated searches skip encoding and scoring entirely. Price and stock
+    filters are pushed into the scan as row masks (see :meth:`query_batch`).
+
+    With ``neighbor_k`` set, :meth:`materialize_neighbors` precomputes the
+    top neighbours of every product for the live snapshot (see
+    ``neighbors.py``); :meth:`query_by_products` answers from that table and
+    only runs a live kNN for products it does not cover.
     """
 
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', persist_dir: str = None):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', persist_dir: str = None,
+                 query_cache_size: int = 1024, query_cache_ttl: float | None = 300.0,
+                 index_type: str = 'exact', ivf_nlist: int = 0, ivf_nprobe: int = 8,
+                 neighbor_k: int = 0, quantize: str = 'none', quant_rescore: int = 4,
+                 model_quantize: str = 'none', encode_batch_size: int = 64,
+                 history_size: int = 25, recency_half_life: float = 5.0,
+                 shards: int = 0, shard_min_rows: int = 20000):
         self.model_name = model_name
+        # 'int8' runs the transformer with dynamically quantized Linear layers
+        self.model_quantize = (model_quantize or 'none').lower()
+        self.encode_batch_size = encode_batch_size
+        # Session events folded into a personalization profile, and the
+        # number of events after which an interaction counts half
+        self.history_size = history_size
+        self.recency_half_life = recency_half_life
+        # 'exact' (CosineIndex) or 'ivf' (approximate IVFIndex, dense vectors only)
+        self.index_type = (index_type or 'exact').lower()
+        self.ivf_nlist = ivf_nlist
+        self.ivf_nprobe = ivf_nprobe
+        # 'int8' scans quantized codes and rescores candidates exactly (exact index, dense only)
+        self.quantize = (quantize or 'none').lower()
+        self.quant_rescore = quant_rescore
+        # Worker processes the exact/int8 scan is split across (0 or 1: in-process)
+        self.shards = max(0, int(shards or 0))
+        self.shard_min_rows = max(1, int(shard_min_rows))
+        # Started on the first sharded build and reused by later snapshots
+        self._shard_pool: ShardPool | None = None
+        # Last fully built engine and the (ids, hashes) it was built for;
+        # edits patch it until :meth:`compact` builds the next one
+        self._base = None
+        self._engine_lock = threading.Lock()
+        self._compact_pending = False
         self.persist_dir = Path(persist_dir) if persist_dir else None
-        self._model = SentenceTransformer(model_name) if has_transformer else None
+        # Shared per process (see encoders.py), not loaded per indexer
+        self._model = get_model(model_name, SentenceTransformer, self.model_quantize) if _load_transformer() else None
+        _load_sklearn()
         self.vectorizer = TfidfVectorizer(stop_words='english')
-        self.nn = None
-        self.ids = []
-        self.embeddings = None
+        self._snap = None
+        self._write_lock = threading.RLock()
+        # Edits that arrive while a rebuild holds the write lock are queued
+        # here and applied by that rebuild (see :meth:`_edit`)
+        self._edit_lock = threading.Lock()
+        self._rebuilds = 0
+        self._queued_edits: List[tuple] = []
+        self._version = 0
+        # Bumped on every publish, including price/stock-only updates
+        self._attrs_version = 0
+        # Bumped whenever the TF-IDF vocabulary is refit or restored
+        self._encoder_epoch = 0
+        self._qvec_cache = LRUCache(query_cache_size, query_cache_ttl)
+        self._result_cache = LRUCache(query_cache_size, query_cache_ttl)
+        # Taste profile vectors, keyed by (profile key, index version)
+        self._profile_cache = LRUCache(query_cache_size, query_cache_ttl)
+        # Materialized neighbours; only used while its version is live
+        self.neighbor_k = max(0, int(neighbor_k or 0))
+        self._neighbors = None
+        self._neighbor_lock = threading.Lock()
+        self._neighbor_thread = None
+        self._neighbor_dirty = False
+
+    @property
+    def version(self) -> int:
+        """Version of the live snapshot; bumps on every rebuild or update."""
+        return self._snap.version if self._snap else 0
+
+    def query_cache_stats(self) -> dict:
+        return {'vectors': self._qvec_cache.stats(), 'results': self._result_cache.stats()}
+
+    @property
+    def ids(self) -> List[int]:
+        return self._snap.ids if self._snap else []
+
+    @property
+    def embeddings(self):
+        return self._snap.embeddings if self._snap else None
+
+    @property
+    def nn(self):
+        return self._snap.nn if self._snap else None
+
+    def _snapshot(self) -> _IndexSnapshot:
+        snap = self._snap
+        if snap is None:
+            self.build_index()
+            snap = self._snap
+        return snap
 
     def _texts_from_products(self, products: List[Product]) -> List[str]:
         return [f"{p.name} {p.description or ''}" for p in products]
 
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _encode(self, texts: List[str], vectorizer=None) -> np.ndarray:
+        """Embed ``texts`` with the model, or ``vectorizer`` (default: the live one), as a 2-D float32 array."""
+        if self._model is not None:
+            return l2_normalize(self._model.encode(texts, batch_size=self.encode_batch_size, show_progress_bar=False))
+        vec = vectorizer if vectorizer is not None else self.vectorizer
+        if has_sklearn:
+            return l2_normalize(vec.transform(texts))
+        return l2_normalize(vec.transform(texts).toarray())
+
+    def _fit_tfidf(self, texts: List[str]):
+        """Fit a fresh vectorizer on ``texts``; returns ``(matrix, vectorizer)``.
+
+        The live vectorizer is left alone until the result is published.
+        """
+        vec = TfidfVectorizer(stop_words='english')
+        if has_sklearn:
+            return l2_normalize(vec.fit_transform(texts)), vec
+        return l2_normalize(vec.fit_transform(texts).toarray()), vec
+
+    @staticmethod
+    def _catalog_digest(hashes: Dict[int, str]) -> str:
+        return hashlib.sha1(''.join(f'{pid}:{h};' for pid, h in sorted(hashes.items())).encode('utf-8')).hexdigest()
+
+    @property
+    def _tfidf_path(self) -> str | None:
+        if not (self.persist_dir and has_sklearn) or self._model is not None:
+            return None
+        return os.path.join(str(self.persist_dir), 'tfidf.npz')
+
+    def _load_tfidf(self, ids: List[int], hashes: Dict[int, str]):
+        """Restore ``(matrix, vectorizer)`` persisted for exactly this catalog text."""
+        loaded = read_sparse_file(self._tfidf_path)
+        if not loaded or loaded[0] != ids:
+            return None
+        _, matrix, arrays = loaded
+        if str(arrays.get('digest')) != self._catalog_digest(hashes):
+            return None
+        vec = TfidfVectorizer(stop_words='english')
+        vec.vocabulary_ = {str(t): int(i) for t, i in zip(arrays['terms'], arrays['term_index'])}
+        vec.idf_ = arrays['idf']
+        return matrix, vec
+
+    def _persist_tfidf(self, snap: _IndexSnapshot):
+        try:
+            vocab = snap.vectorizer.vocabulary_
+            write_sparse_file(
+                self._tfidf_path,
+                snap.embeddings,
+                snap.ids,
+                terms=np.array(list(vocab.keys()), dtype=str),
+                term_index=np.array(list(vocab.values()), dtype='<i8'),
+                idf=np.asarray(snap.vectorizer.idf_),
+                digest=np.array(self._catalog_digest(snap.hashes)),
+            )
+        except Exception:
+            pass
+
+    @property
+    def _ivf_path(self) -> str | None:
+        return matrix_file_path(self.persist_dir, 'ivf', self._cache_model, '.npz') if self.persist_dir else None
+
+    def _make_engine(self, embeddings, retrain: bool = False):
+        """Search engine for ``embeddings``: exact, int8-quantized or IVF as configured.
+
+        Exact and int8 scans are split across ``shards`` worker processes
+        (see ``shards.py``) when every shard gets at least ``shard_min_rows``.
+        The workers are started once and reused: each snapshot only sends
+        them its rows. They are stopped when sharding no longer applies.
+
+        IVF centroids are reused from the live snapshot or the persisted
+        quantizer unless ``retrain`` is set or the list count no longer fits
+        the catalog; freshly trained centroids are persisted.
+        """
+        n = embeddings.shape[0]
+        if n < 2:
+            return CosineIndex(embeddings)
+        if is_sparse(embeddings) or self.index_type != 'ivf':
+            shards = min(self.shards, n // self.shard_min_rows)
+            if shards > 1:
+                try:
+                    if self._shard_pool is None or self._shard_pool.closed or self._shard_pool.size != shards:
+                        self.close()
+                        self._shard_pool = ShardPool(shards)
+                    return ShardedIndex(embeddings, shards, engine=self.quantize, rescore=self.quant_rescore,
+                                        pool=self._shard_pool)
+                except Exception:
+                    pass  # e.g. process limits: scan in this process instead
+            # Snapshots still on the old pool fall back to in-process scans
+            self.close()
+            if self.quantize == 'int8' and not is_sparse(embeddings):
+                return QuantizedIndex(embeddings, rescore=self.quant_rescore)
+            return CosineIndex(embeddings)
+        dim = embeddings.shape[1]
+        target = self.ivf_nlist or default_nlist(n)
+        centroids = None
+        if not retrain:
+            prev = self._snap.nn if self._snap else None
+            if isinstance(prev, PatchedIndex):
+                prev = prev.base
+            if isinstance(prev, IVFIndex):
+                centroids = prev.centroids
+            elif self._ivf_path:
+                stored = read_arrays_file(self._ivf_path)
+                centroids = stored.get('centroids') if stored else None
+        if centroids is not None and (centroids.shape[1] != dim or not (target / 2 <= len(centroids) <= target * 2)):
+            centroids = None
+        engine = IVFIndex(embeddings, nlist=target, nprobe=self.ivf_nprobe, centroids=centroids)
+        if centroids is None and self._ivf_path:
+            try:
+                write_arrays_file(self._ivf_path, centroids=engine.centroids)
+            except Exception:
+                pass
+        return engine
+
+    def close(self):
+        """Stop the shard worker processes, if any (also done on garbage collection)."""
+        pool, self._shard_pool = self._shard_pool, None
+        if pool is not None:
+            pool.close()
+
+    def _publish(self, ids: List[int], embeddings, hashes: Dict[int, str], retrain: bool = False,
+                 vectorizer=None, attrs=None, patch: bool = False):
+        """Swap in a snapshot of ``ids``; ``attrs`` is ``(prices, stock)`` aligned with them.
+
+        With ``patch`` the last fully built engine is reused for the rows it
+        still covers (see :meth:`_patch_engine`) and :meth:`compact` is left
+        pending; otherwise the configured engine is built now, over the
+        shared matrix file when there is one (see :meth:`_map_matrix_file`).
+        """
+        if not ids:
+            nn, self._base = None, None
+        elif patch and self._base is not None:
+            nn = self._patch_engine(ids, embeddings, hashes)
+            self._compact_pending = True
+        else:
+            embeddings = self._map_matrix_file(ids, materialize_rows(embeddings), hashes)
+            # ``embeddings`` rows are unit length, so the engine uses them as-is
+            with self._engine_lock:
+                nn = self._make_engine(embeddings, retrain=retrain)
+            self._base = (nn, ids, hashes)
+            self._compact_pending = False
+        if vectorizer is not None:
+            self.vectorizer = vectorizer
+            self._encoder_epoch += 1
+        self._version += 1
+        self._attrs_version += 1
+        prices, stock = attrs if attrs is not None else (None, None)
+        self._snap = _IndexSnapshot(ids, embeddings, nn, hashes, self._version,
+                                    self.vectorizer, self._encoder_epoch,
+                                    prices, stock, self._attrs_version)
+
+    def _patch_engine(self, ids: List[int], embeddings, hashes: Dict[int, str]) -> PatchedIndex:
+        """The last fully built engine, patched with the rows of ``ids`` it does not cover."""
+        base, base_ids, base_hashes = self._base
+        pos = {pid: i for i, pid in enumerate(ids)}
+        rows = np.array([pos.get(pid, -1) if hashes.get(pid) == base_hashes.get(pid) else -1
+                         for pid in base_ids], dtype=np.intp)
+        covered = np.zeros(len(ids), dtype=bool)
+        covered[rows[rows >= 0]] = True
+        return PatchedIndex(base, rows, embeddings, np.flatnonzero(~covered))
+
+    @property
+    def compaction_pending(self) -> bool:
+        """True while edits are served by a patched engine and the index files lag behind."""
+        return self._compact_pending
+
+    def compact(self) -> bool:
+        """Build the configured engine and rewrite the index files after edits.
+
+        Edits only patch the engine and write their own ``embedding_cache``
+        rows; this does the rest for the live snapshot, off the request path.
+        The engine is built without the write lock and swapped in only if no
+        edit landed meanwhile (that edit leaves the compaction pending).
+        Returns True if a new engine was swapped in.
+        """
+        snap = self._snap
+        if snap is None or not self._compact_pending:
+            return False
+        embeddings = materialize_rows(snap.embeddings)
+        if snap.ids:
+            embeddings = self._map_matrix_file(snap.ids, embeddings, snap.hashes)
+        with self._engine_lock:
+            nn = self._make_engine(embeddings) if snap.ids else None
+        with self._write_lock:
+            cur = self._snap
+            if cur.version != snap.version:
+                return False
+            self._snap = _IndexSnapshot(cur.ids, embeddings, nn, cur.hashes, cur.version,
+                                        cur.vectorizer, cur.epoch, cur.prices, cur.stock, cur.attrs_version)
+            self._base = (nn, cur.ids, cur.hashes) if cur.ids else None
+            self._compact_pending = False
+        self._persist_files(cur)
+        return True
+
+    def _publish_attrs(self, snap: _IndexSnapshot, prices: np.ndarray, stock: np.ndarray):
+        """Swap in ``snap`` with new prices/stock; rows, engine and version are kept."""
+        self._attrs_version += 1
+        self._snap = _IndexSnapshot(snap.ids, snap.embeddings, snap.nn, snap.hashes, snap.version,
+                                    snap.vectorizer, snap.epoch, prices, stock, self._attrs_version)
+
+    @staticmethod
+    def _attributes(products: List[Product]):
+        """``(prices, stock)`` arrays for ``products``, in order."""
+        prices = np.fromiter((p.price or 0 for p in products), dtype=np.int64, count=len(products))
+        stock = np.fromiter((p.stock or 0 for p in products), dtype=np.int64, count=len(products))
+        return prices, stock
+
+    @property
+    def _cache_model(self) -> str:
+        """Model tag stored with cached vectors."""
+        if self._model is None:
+            return 'tfidf'
+        # Quantized inference drifts slightly, so its vectors are cached apart
+        return self.model_name if self.model_quantize == 'none' else f'{self.model_name}:{self.model_quantize}'
+
+    @property
+    def _uses_cache(self) -> bool:
+        # TF-IDF vectors are only meaningful with the vocabulary they were fit
+        # on, and fitting it is the whole cost, so only transformer vectors
+        # are persisted and warm-booted.
+        return self._model is not None
+
+    def _ensure_cache_table(self):
+        from sqlalchemy import text
+        cols = {row[1] for row in db.session.execute(text("PRAGMA table_info('embedding_cache')")).fetchall()}  # type: ignore
+        if cols and 'text_hash' not in cols:
+            # Older per-product layouts; it is only a cache, so start over
+            db.session.execute(text("DROP TABLE embedding_cache"))
+        db.session.execute(text("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                dtype TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """))
+
+    def _load_cached_vectors(self, hashes: Sequence[str], fetch_all: bool = False, dim: int | None = None):
+        """Cached vectors of the current model for ``hashes``, decoded in one pass.
+
+        Rows come back in the order of ``hashes`` as one ``unpack_matrix``
+        call. Only rows of width ``dim`` are used (default: the most common
+        width among the hits). With ``fetch_all`` every row of the model is
+        read in one query instead of ``IN`` batches, which also reports the
+        hashes no longer wanted.
+
+        Returns ``(pos, matrix, known)``: ``pos`` maps a hash to its row in
+        ``matrix``, ``known`` is every hash that was read.
+        """
+        from sqlalchemy import bindparam, text
+        self._ensure_cache_table()
+        params = {"model": self._cache_model, "dtype": VECTOR_DTYPE}
+        sql = "SELECT text_hash, dim, vector FROM embedding_cache WHERE model = :model AND dtype = :dtype"
+        hashes = list(hashes)
+        if fetch_all:
+            rows = db.session.execute(text(sql), params).fetchall()
+        else:
+            stmt = text(sql + " AND text_hash IN :hashes").bindparams(bindparam('hashes', expanding=True))
+            wanted, rows = list(dict.fromkeys(hashes)), []
+            for s in range(0, len(wanted), 500):
+                rows += db.session.execute(stmt, dict(params, hashes=wanted[s:s + 500])).fetchall()
+        found = {h: (int(d), blob) for h, d, blob in rows}
+        hits = [h for h in dict.fromkeys(hashes) if h in found]
+        if dim is None and hits:
+            widths = Counter(found[h][0] for h in hits)
+            dim = widths.most_common(1)[0][0]
+        hits = [h for h in hits if found[h][0] == dim]
+        matrix = unpack_matrix([found[h][1] for h in hits], dim or 0)
+        return {h: i for i, h in enumerate(hits)}, matrix, set(found)
+
+    def _persist_vectors(self, snap: _IndexSnapshot, changed: Iterable[int] | None = None, stale: Iterable[str] = ()):
+        """Cache ``changed`` rows (all rows if None) under their text hash and drop ``stale`` hashes."""
+        from sqlalchemy import text
+        self._ensure_cache_table()
+        ids = snap.ids if changed is None else [pid for pid in changed if pid in snap.pos]
+        rows = take_rows(snap.embeddings, [snap.pos[pid] for pid in ids]) if ids else np.zeros((0, 0))
+        blobs = pack_matrix(rows) if ids else []
+        dim = int(snap.embeddings.shape[1]) if ids else 0
+        if blobs:
+            db.session.execute(
+                text("REPLACE INTO embedding_cache(model, text_hash, dim, dtype, vector) VALUES (:model, :hash, :dim, :dtype, :vec)"),
+                [
+                    {"model": self._cache_model, "hash": snap.hashes[pid], "dim": dim, "dtype": VECTOR_DTYPE, "vec": blob}
+                    for pid, blob in zip(ids, blobs)
+                ],
+            )
+        # Hashes still embedded by another product stay cached
+        stale = set(stale) - set(snap.hashes.values())
+        if stale:
+            db.session.execute(
+                text("DELETE FROM embedding_cache WHERE model = :model AND text_hash = :hash"),
+                [{"model": self._cache_model, "hash": h} for h in stale],
+            )
+        db.session.commit()
+
+    @property
+    def _matrix_path(self) -> str | None:
+        return matrix_file_path(self.persist_dir, 'embeddings', self._cache_model) if self.persist_dir else None
+
+    def _map_matrix_file(self, ids: List[int], embeddings, hashes: Dict[int, str]):
+        """``embeddings`` written to the shared matrix file and mapped back from it.
+
+        Snapshots and engines then read the file's pages, shared with other
+        workers, instead of a private copy. Returns ``embeddings`` unchanged
+        for TF-IDF, when they are already mapped, or if the file cannot be
+        written or read back.
+        """
+        if not (self._uses_cache and self._matrix_path) or isinstance(embeddings, np.memmap):
+            return embeddings
+        digest = self._catalog_digest(hashes)
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            write_matrix_file(self._matrix_path, embeddings, ids, model=self._cache_model, digest=digest)
+        except Exception:
+            # Best effort (e.g. Windows refuses to replace a mapped file)
+            return embeddings
+        mapped = read_matrix_file(self._matrix_path)
+        # Another worker may have replaced the file since
+        if (mapped and mapped[0] == list(ids) and mapped[2].get('model') == self._cache_model
+                and mapped[2].get('digest') == digest):
+            return mapped[1]
+        return embeddings
+
+    def _persist_files(self, snap: _IndexSnapshot):
+        """Rewrite meta.json and the TF-IDF file for ``snap``.
+
+        The shared matrix file is written when the engine is built (see
+        :meth:`_map_matrix_file`).
+        """
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            with open(os.path.join(self.persist_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'ids': snap.ids}, f)
+        if self._tfidf_path and is_sparse(snap.embeddings):
+            self._persist_tfidf(snap)
+
+    def _persist(self, snap: _IndexSnapshot, changed: Iterable[int] | None = None, stale: Iterable[str] = (),
+                 files: bool = True):
+        """Cache ``changed`` vectors and, with ``files``, rewrite the index files (see :meth:`compact`)."""
+        if self._uses_cache:
+            try:
+                self._persist_vectors(snap, changed, stale)
+            except Exception:
+                try:
+                    db.session.rollback()
+                except Exception:
+                    pass
+        if files:
+            self._persist_files(snap)
+
     def build_index(self, force: bool = False):
+        """Build the index from the catalog; edits made meanwhile are applied after it (see :meth:`_edit`)."""
+        with self._rebuilding():
+            self._build_index(force)
+            if self.neighbor_k and self._neighbors_path and not force:
+                snap = self._snap
+                table = NeighborTable.load(self._neighbors_path, snap.ids, self._catalog_digest(snap.hashes),
+                                           snap.version, snap.hashes, snap.epoch)
+                if table is not None and table.k >= min(self.neighbor_k, len(snap.ids) - 1):
+                    self._neighbors = table
+
+    @property
+    def _neighbors_path(self) -> str | None:
+        return matrix_file_path(self.persist_dir, 'neighbors', self._cache_model, '.npz') if self.persist_dir else None
+
+    def neighbors_fresh(self) -> bool:
+        """True when the materialized table matches the live snapshot."""
+        table, snap = self._neighbors, self._snap
+        return table is not None and snap is not None and table.version == snap.version
+
+    def neighbor_status(self) -> dict:
+        table = self._neighbors
+        return {
+            'k': self.neighbor_k,
+            'rows': len(table) if table else 0,
+            'version': table.version if table else None,
+            'fresh': self.neighbors_fresh(),
+            'recomputed': table.recomputed if table else 0,
+            'running': bool(self._neighbor_thread and self._neighbor_thread.is_alive()),
+        }
+
+    def materialize_neighbors(self, k: int | None = None, full: bool = False) -> NeighborTable:
+        """Bring the neighbour table up to the live snapshot and persist it.
+
+        An existing table is refreshed (see :meth:`NeighborTable.refresh`),
+        so a catalog edit only recomputes the rows it touched; ``full``
+        recomputes every row. Runs without the write lock; if the snapshot
+        is replaced meanwhile the result is not installed and the next
+        refresh starts from the previous table.
+        """
+        snap = self._snapshot()
+        k = k or self.neighbor_k
+        prev = self._neighbors
+        if not snap.ids:
+            table = NeighborTable([], np.zeros((0, 0), dtype=np.int32), np.zeros((0, 0), dtype=np.float32),
+                                  snap.version, snap.hashes, snap.epoch)
+        elif prev is not None and prev.ids and not full:
+            table = prev.refresh(snap.nn, snap.embeddings, snap.ids, snap.hashes, k, snap.version, snap.epoch)
+        else:
+            rows, dists = compute_neighbors(snap.nn, snap.embeddings, k)
+            table = NeighborTable(snap.ids, rows, dists, snap.version, snap.hashes, snap.epoch)
+        if self._snap is snap:
+            self._neighbors = table
+            if self._neighbors_path and snap.ids:
+                try:
+                    table.save(self._neighbors_path, self._catalog_digest(snap.hashes))
+                except Exception:
+                    pass
+        return table
+
+    def materialize_neighbors_async(self):
+        """Refresh the neighbour table on a background thread.
+
+        Calls made while a refresh is running mark it dirty, so the thread
+        runs once more afterwards instead of starting a second one.
+        """
+        if not self.neighbor_k:
+            return
+        with self._neighbor_lock:
+            self._neighbor_dirty = True
+            if self._neighbor_thread and self._neighbor_thread.is_alive():
+                return
+            self._neighbor_thread = threading.Thread(target=self._neighbor_worker, name='neighbor-table', daemon=True)
+            self._neighbor_thread.start()
+
+    def _neighbor_worker(self):
+        while True:
+            with self._neighbor_lock:
+                if not self._neighbor_dirty:
+                    return
+                self._neighbor_dirty = False
+            try:
+                self.materialize_neighbors()
+            except Exception:
+                pass
+
+    def _encode_uncached(self, ids: List[int], texts: List[str], hashes: Dict[int, str],
+                         pos: Dict[str, int], cached: np.ndarray | None):
+        """Matrix for ``ids`` from ``cached`` rows (``pos``: hash -> row), encoding only the missing text.
+
+        Returns ``(embeddings, encoded_ids)``.
+        """
+        dst = [i for i, pid in enumerate(ids) if hashes[pid] in pos]
+        have = set(dst)
+        missing = [i for i in range(len(ids)) if i not in have]
+        fresh = self._encode([texts[i] for i in missing]) if missing else None
+        if dst and fresh is not None and fresh.shape[1] != cached.shape[1]:
+            # Cached rows of another width (e.g. a re-exported model): start over
+            return self._encode(texts), list(ids)
+        width = fresh.shape[1] if fresh is not None else cached.shape[1]
+        embeddings = np.empty((len(ids), width), dtype=np.float32)
+        if dst:
+            embeddings[dst] = cached[[pos[hashes[ids[i]]] for i in dst]]
+        if missing:
+            embeddings[missing] = fresh
+        return embeddings, [ids[i] for i in missing]
+
+    def _build_index(self, force: bool):
         products = Product.query.order_by(Product.id).all()
         texts = self._texts_from_products(products)
-        self.ids = [p.id for p in products]
-        # Try warm boot from DB cache if available and not forcing rebuild
-        if not force and self.ids:
+        ids = [p.id for p in products]
+        hashes = {pid: self._text_hash(t) for pid, t in zip(ids, texts)}
+        attrs = self._attributes(products)
+        if not ids:
+            self._publish([], None, {})
+            return
+        pos: Dict[str, int] = {}
+        cached, known = None, set()
+        if self._uses_cache and not force:
+            # Shared mmap file first (no decode, pages shared across workers),
+            # valid only for exactly this catalog text and model.
+            mapped = read_matrix_file(self._matrix_path) if self._matrix_path else None
+            if (mapped and mapped[0] == ids and mapped[2].get('model') == self._cache_model
+                    and mapped[2].get('digest') == self._catalog_digest(hashes)):
+                self._publish(ids, mapped[1], hashes, attrs=attrs)
+                return
             try:
-                from sqlalchemy import text
-                rows = db.session.execute(text("SELECT product_id, vector FROM embedding_cache WHERE product_id IN :ids"), {"ids": tuple(self.ids)}).fetchall()  # type: ignore
-                if rows and len(rows) == len(self.ids):
-                    # Ensure order aligns with self.ids
-                    vec_map = {int(r[0]): json.loads(r[1]) for r in rows}
-                    vecs = [vec_map[i] for i in self.ids if i in vec_map]
-                    if len(vecs) == len(self.ids):
-                        # Accept cached vectors
-                        if has_sklearn:
-                            self.embeddings = vecs
-                        else:
-                            class _A:
-                                def __init__(self, d):
-                                    self.data = d
-                            self.embeddings = _A(vecs)
-                        self.nn = NearestNeighbors(n_neighbors=10, metric='cosine')
-                        self.nn.fit(self.embeddings)
-                        return
+                pos, cached, known = self._load_cached_vectors([hashes[pid] for pid in ids], fetch_all=True)
             except Exception:
                 try:
                     db.session.rollback()
                 except Exception:
                     pass
-        if has_transformer and self._model:
-            self.embeddings = self._model.encode(texts, show_progress_bar=False)
+        if self._tfidf_path and not force:
+            restored = self._load_tfidf(ids, hashes)
+            if restored is not None:
+                self._publish(ids, restored[0], hashes, vectorizer=restored[1], attrs=attrs)
+                return
+        vectorizer = None
+        if self._model is not None:
+            embeddings, changed = self._encode_uncached(ids, texts, hashes, pos, cached)
+            stale = known - set(hashes.values())
         else:
-            # TF-IDF matrix
-            if has_sklearn:
-                self.embeddings = self.vectorizer.fit_transform(texts).toarray()
-            else:
-                # Keep fallback internal array wrapper for our simple NN
-                self.embeddings = self.vectorizer.fit_transform(texts)
-        # Fit nearest neighbors
-        self.nn = NearestNeighbors(n_neighbors=10, metric='cosine')
-        self.nn.fit(self.embeddings)
-        # Optionally persist small cache
-        if self.persist_dir:
-            os.makedirs(self.persist_dir, exist_ok=True)
-            cache = {'ids': self.ids}
-            with open(os.path.join(self.persist_dir, 'meta.json'), 'w', encoding='utf-8') as f:
-                json.dump(cache, f)
-        # Persist vectors to DB (embedding_cache table) for warm boot (if table exists)
+            # TF-IDF matrix (fits the vocabulary used by later transforms)
+            embeddings, vectorizer = self._fit_tfidf(texts)
+            changed, stale = None, ()
+        self._publish(ids, embeddings, hashes, retrain=force, vectorizer=vectorizer, attrs=attrs)
+        self._persist(self._snap, changed=changed, stale=stale)
+
+    def _encode_changed(self, changed: Dict[int, Tuple[str, str]], snap: _IndexSnapshot):
+        """Vectors for ``{pid: (text, hash)}``, reusing rows another worker already cached."""
+        texts = [t for t, _ in changed.values()]
+        if not self._uses_cache:
+            return self._encode(texts, snap.vectorizer)
         try:
-            from sqlalchemy import text
-            # Create table if missing (simple manual DDL to avoid migration complexity here)
-            db.session.execute(text("""
-                CREATE TABLE IF NOT EXISTS embedding_cache (
-                    product_id INTEGER PRIMARY KEY,
-                    vector TEXT NOT NULL
-                )
-            """))
-            # Upsert rows
-            for pid, vec in zip(self.ids, (self.embeddings if has_transformer or has_sklearn else self.embeddings.data)):
-                if not isinstance(vec, (list, tuple)):
-                    vec_list = list(vec)
-                else:
-                    vec_list = list(vec)
-                db.session.execute(text("REPLACE INTO embedding_cache(product_id, vector) VALUES (:pid, :vec)"), {"pid": pid, "vec": json.dumps(vec_list)})
-            db.session.commit()
+            pos, cached, _ = self._load_cached_vectors([h for _, h in changed.values()],
+                                                       dim=snap.embeddings.shape[1])
         except Exception:
             try:
                 db.session.rollback()
             except Exception:
                 pass
+            pos, cached = {}, None
+        return self._encode_uncached(list(changed), texts, {pid: h for pid, (_, h) in changed.items()},
+                                     pos, cached)[0]
 
-    def query_by_product(self, product_id: int, k: int = 5) -> List[Tuple[int, float]]:
-        if not self.nn:
-            self.build_index()
+    def _edit_items(self, products: Iterable[Product]) -> List[tuple]:
+        """``(id, text, price, stock)`` per product, read now so a queued edit keeps its values."""
+        products = list(products)
+        return [(p.id, text, p.price or 0, p.stock or 0)
+                for p, text in zip(products, self._texts_from_products(products))]
+
+    def _edit(self, apply, arg) -> int:
+        """Run ``apply(arg)`` under the write lock, or queue it while a rebuild holds the lock.
+
+        The rebuild applies queued edits in arrival order before releasing
+        the lock (see :meth:`_rebuilding`), so a catalog edit never waits for
+        a full build; it returns 0 when queued.
+        """
+        with self._edit_lock:
+            if self._rebuilds:
+                self._queued_edits.append((apply, arg))
+                return 0
+            # Taken before the edit lock is released, so a rebuild starting
+            # now is queued behind this edit rather than overtaking it
+            self._write_lock.acquire()
         try:
-            idx = self.ids.index(product_id)
-        except ValueError:
-            return []
-        # Normalize slice for whichever backend produced embeddings
-        if hasattr(self.embeddings, 'data') and not hasattr(self.embeddings, 'shape'):
-            # Fallback array wrapper exposes `.data`; build a tiny adapter for kneighbors
-            single = [self.embeddings.data[idx]]
-            class _One:
-                data = single
-            vec = _One()
-        else:
-            vec = self.embeddings[idx:idx + 1]
-            if isinstance(vec, list):  # Warm-cache gives plain lists; ensure 2D structure
-                vec = vec if vec and isinstance(vec[0], (list, tuple)) else [vec]
-        dists, inds = self.nn.kneighbors(vec, n_neighbors=min(k + 1, len(self.ids)))
-        results = []
-        for d, i in zip(dists[0], inds[0]):
-            pid = self.ids[int(i)]
-            if pid == product_id:
-                continue
-            results.append((pid, float(d)))
-            if len(results) >= k:
-                break
-        return results
-
-    def query(self, text: str, k: int = 5) -> List[Tuple[int, float]]:
-        if not self.nn:
-            self.build_index()
-        if has_transformer and self._model:
-            qvec = self._model.encode([text])
+            return apply(arg)
+        finally:
+            self._write_lock.release()
+
+    @contextmanager
+    def _rebuilding(self):
+        """Hold the write lock for a build or sync, queueing edits until it is done."""
+        with self._edit_lock:
+            self._rebuilds += 1
+        with self._write_lock:
+            try:
+                yield
+            finally:
+                self._apply_queued_edits()
+
+    def _apply_queued_edits(self):
+        while True:
+            with self._edit_lock:
+                edits, self._queued_edits = self._queued_edits, []
+                if not edits:
+                    self._rebuilds -= 1
+                    return
+            for apply, arg in edits:
+                try:
+                    apply(arg)
+                except Exception:
+                    try:
+                        db.session.rollback()
+                    except Exception:
+                        pass
+
+    def upsert_products(self, products: Iterable[Product]) -> int:
+        """Add or refresh ``products`` in a built index, returning how many were re-encoded.
+
+        Products whose text hash is unchanged are not re-encoded; if only
+        their price or stock changed, just the filter attributes are
+        republished. With the TF-IDF fallback the vocabulary stays as last
+        fitted, so words new to the catalog only count after a full
+        :meth:`build_index`. Only the re-encoded rows are stored (the
+        snapshot shares the last built matrix, see ``StackedRows``) and
+        written to ``embedding_cache``; the engine is patched and
+        :meth:`compact` rebuilds it and the index files later. During a
+        rebuild the edit is queued instead (see :meth:`_edit`).
+        """
+        return self._edit(self._upsert, self._edit_items(products))
+
+    def _upsert(self, items: List[tuple]) -> int:
+        snap = self._snap
+        if snap is None:
+            return 0
+        if not snap.ids:
+            # Nothing to extend (and no TF-IDF vocabulary yet): build fully
+            self._build_index(force=True)
+            return len(self.ids)
+        changed = {}
+        attrs = {}
+        for pid, text, price, stock in items:
+            h = self._text_hash(text)
+            if snap.hashes.get(pid) != h:
+                changed[pid] = (text, h)
+            attrs[pid] = (price, stock)
+        prices, stock = snap.prices.copy(), snap.stock.copy()
+        known = [pid for pid in attrs if pid in snap.pos]
+        if known:
+            rows = [snap.pos[pid] for pid in known]
+            prices[rows] = [attrs[pid][0] for pid in known]
+            stock[rows] = [attrs[pid][1] for pid in known]
+        if not changed:
+            if not (np.array_equal(prices, snap.prices) and np.array_equal(stock, snap.stock)):
+                self._publish_attrs(snap, prices, stock)
+            return 0
+        vecs = self._encode_changed(changed, snap)
+        keep = [i for i, pid in enumerate(snap.ids) if pid not in changed]
+        unsorted_ids = [snap.ids[i] for i in keep] + list(changed)
+        order = np.argsort(unsorted_ids, kind='stable')
+        ids = [unsorted_ids[i] for i in order]
+        # Rows of ``snap.embeddings`` and then ``vecs``, without copying the former
+        rows = np.concatenate([np.asarray(keep, dtype=np.intp), len(snap.ids) + np.arange(len(changed))])
+        embeddings = StackedRows.select(snap.embeddings, rows[order], vecs)
+        hashes = dict(snap.hashes)
+        hashes.update({pid: h for pid, (_, h) in changed.items()})
+        prices = np.concatenate([prices[keep], [attrs[pid][0] for pid in changed]])[order]
+        stock = np.concatenate([stock[keep], [attrs[pid][1] for pid in changed]])[order]
+        self._publish(ids, embeddings, hashes, attrs=(prices, stock), patch=True)
+        stale = {snap.hashes[pid] for pid in changed if pid in snap.hashes}
+        self._persist(self._snap, changed=list(changed), stale=stale, files=not self._compact_pending)
+        return len(changed)
+
+    def remove_products(self, product_ids: Iterable[int]) -> int:
+        """Drop ``product_ids`` from a built index, returning how many were present (queued like upserts)."""
+        return self._edit(self._remove, list(product_ids))
+
+    def _remove(self, product_ids: List[int]) -> int:
+        snap = self._snap
+        if snap is None:
+            return 0
+        gone = {pid for pid in product_ids if pid in snap.pos}
+        if not gone:
+            return 0
+        keep = [i for i, pid in enumerate(snap.ids) if pid not in gone]
+        ids = [snap.ids[i] for i in keep]
+        embeddings = StackedRows.select(snap.embeddings, keep) if keep else None
+        hashes = {pid: h for pid, h in snap.hashes.items() if pid not in gone}
+        self._publish(ids, embeddings, hashes, attrs=(snap.prices[keep], snap.stock[keep]), patch=True)
+        self._persist(self._snap, changed=[], stale={snap.hashes[pid] for pid in gone},
+                      files=not self._compact_pending)
+        return len(gone)
+
+    def sync(self) -> Tuple[int, int]:
+        """Reconcile a built index with the catalog; returns ``(re-encoded, removed)``."""
+        with self._rebuilding():
+            if self._snap is None:
+                self._build_index(force=False)
+                return len(self.ids), 0
+            products = Product.query.order_by(Product.id).all()
+            live = {p.id for p in products}
+            removed = self._remove([pid for pid in self.ids if pid not in live])
+            return self._upsert(self._edit_items(products)), removed
+
+    def query_by_product(self, product_id: int, k: int = 5) -> List[Tuple[int, float]]:
+        return self.query_by_products([product_id], k=k).get(product_id, [])
+
+    def query_by_products(self, product_ids: Iterable[int], k: int = 5) -> Dict[int, List[Tuple[int, float]]]:
+        """Neighbours of several products, scored in one batched pass.
+
+        Returns ``{product_id: [(neighbour_id, distance), ...]}``; products
+        missing from the index map to an empty list.
+        """
+        snap = self._snapshot()
+        product_ids = list(dict.fromkeys(product_ids))
+        out: Dict[int, List[Tuple[int, float]]] = {pid: [] for pid in product_ids}
+        known = [pid for pid in product_ids if pid in snap.pos]
+        table = self._neighbors
+        if known and table is not None:
+            # A table from an older snapshot still answers for products whose
+            # entries no edit has touched; the rest run live until it is refreshed
+            hashes = None if table.version == snap.version else snap.hashes
+            if hashes is not None and table.epoch != snap.epoch:
+                table = None
+        if known and table is not None:
+            live = []
+            for pid in known:
+                hit = table.lookup(pid, k, hashes)
+                if hit is None:
+                    live.append(pid)
+                else:
+                    out[pid] = hit
+            known = live
+        if not known:
+            return out
+        rows = take_rows(snap.embeddings, [snap.pos[pid] for pid in known])
+        dists, inds = snap.nn.kneighbors(rows, n_neighbors=min(k + 1, len(snap.ids)))
+        for product_id, drow, irow in zip(known, dists, inds):
+            results = out[product_id]
+            for d, i in zip(drow, irow):
+                pid = snap.ids[int(i)]
+                if pid == product_id:
+                    continue
+                results.append((pid, float(d)))
+                if len(results) >= k:
+                    break
+        return out
+
+    def query(self, text: str, k: int = 5, min_price: int | None = None, max_price: int | None = None,
+              in_stock: bool = False) -> List[Tuple[int, float]]:
+        """Top-k ``(product_id, distance)`` for ``text``; see :meth:`query_batch` for the filters."""
+        return self.query_batch([text], k=k, min_price=min_price, max_price=max_price, in_stock=in_stock)[0]
+
+    @staticmethod
+    def _normalize_query(text: str) -> str:
+        return ' '.join(str(text).lower().split())
+
+    def _encode_queries(self, texts: List[str], snap: _IndexSnapshot):
+        """Query vectors for normalized ``texts``, encoding only cache misses in one batch."""
+        epoch = (self._cache_model, snap.epoch)
+        vecs = [self._qvec_cache.get((epoch, t)) for t in texts]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        if missing:
+            fresh = self._encode([texts[i] for i in missing], snap.vectorizer)
+            for j, i in enumerate(missing):
+                vecs[i] = take_rows(fresh, [j])
+                self._qvec_cache.put((epoch, texts[i]), vecs[i])
+        return vecs[0] if len(vecs) == 1 else vstack_rows(*vecs)
+
+    def query_batch(self, texts: List[str], k: int = 5, min_price: int | None = None,
+                    max_price: int | None = None, in_stock: bool = False) -> List[List[Tuple[int, float]]]:
+        """Top-k ``(product_id, distance)`` lists for each text, encoded and scored together.
+
+        ``min_price``/``max_price`` (inclusive) and ``in_stock`` (stock > 0)
+        are applied as a row mask before the top-k selection, so up to ``k``
+        matching products come back without over-fetching.
+        """
+        snap = self._snapshot()
+        if not snap.ids or not texts:
+            return [[] for _ in texts]
+        mask = snap.mask(min_price, max_price, in_stock)
+        if mask is not None and not mask.any():
+            return [[] for _ in texts]
+        norm = [self._normalize_query(t) for t in texts]
+        if mask is None:
+            keys = [(self._cache_model, snap.version, t, k) for t in norm]
         else:
-            qvec = self.vectorizer.transform([text]) if not has_sklearn else self.vectorizer.transform([text]).toarray()
-        dists, inds = self.nn.kneighbors(qvec, n_neighbors=min(k, len(self.ids)))
-        results = [(self.ids[int(i)], float(d)) for d, i in zip(dists[0], inds[0])]
-        return results
+            filters = (min_price, max_price, bool(in_stock))
+            keys = [(self._cache_model, snap.version, snap.attrs_version, t, k, filters) for t in norm]
+        out = [self._result_cache.get(key) for key in keys]
+        todo = [i for i, r in enumerate(out) if r is None]
+        if todo:
+            qvecs = self._encode_queries([norm[i] for i in todo], snap)
+            dists, inds = snap.nn.kneighbors(qvecs, n_neighbors=min(k, len(snap.ids)), mask=mask)
+            for i, drow, irow in zip(todo, dists, inds):
+                out[i] = tuple((snap.ids[int(j)], float(d)) for d, j in zip(drow, irow))
+                self._result_cache.put(keys[i], out[i])
+        return [list(r) for r in out]
 
-    def personalized(self, session_id: str, k: int = 8) -> List[int]:
-        """Return personalized product IDs using recent event interactions + embeddings similarity aggregation."""
-        # Get recent product views/adds
-        recent = Event.query.filter(Event.session_id == session_id).order_by(Event.created_at.desc()).limit(25).all()
-        base_ids = [e.product_id for e in recent if e.product_id]
-        if not base_ids:
+    def history_weights(self, product_ids: Sequence[int]) -> Dict[int, float]:
+        """Recency-decayed weight per distinct product in ``product_ids`` (most recent first).
+
+        The i-th event counts ``0.5 ** (i / recency_half_life)``; repeats add up.
+        """
+        weights: Dict[int, float] = {}
+        for i, pid in enumerate(product_ids):
+            weights[pid] = weights.get(pid, 0.0) + 0.5 ** (i / self.recency_half_life)
+        return weights
+
+    def recommend_from_history(self, product_ids: Sequence[int], k: int = 8) -> List[int]:
+        """Products closest to the recency-weighted profile of ``product_ids``.
+
+        The history is folded into one profile vector and scored in a single
+        kNN pass, so cost does not grow with the number of events; products
+        in the history are masked out of the result.
+        """
+        return self.recommend_from_weights(self.history_weights(product_ids), k=k)
+
+    def recommend_from_weights(self, weights: Dict[int, float], k: int = 8, cache_key=None) -> List[int]:
+        """Top-k products for a ``{product_id: weight}`` taste profile, excluding its products.
+
+        With ``cache_key`` (e.g. owner and profile revision) the profile
+        vector is memoized for the live index version.
+        """
+        snap = self._snapshot()
+        weights = {pid: w for pid, w in weights.items() if pid in snap.pos}
+        if not weights:
             return []
-        scores = {}
-        for pid in base_ids:
-            for rec_id, dist in self.query_by_product(pid, k=5):
-                scores[rec_id] = scores.get(rec_id, 0.0) + (1.0 - dist)
-        # Remove already seen
-        for pid in base_ids:
-            scores.pop(pid, None)
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return [pid for pid,_ in ranked[:k]]
+        rows = [snap.pos[pid] for pid in weights]
+        key = (cache_key, snap.version) if cache_key is not None else None
+        profile = self._profile_cache.get(key) if key else None
+        if profile is None:
+            w = np.fromiter(weights.values(), dtype=np.float32, count=len(weights))
+            profile = np.asarray(take_rows(snap.embeddings, rows).T @ w).reshape(1, -1)
+            if key:
+                self._profile_cache.put(key, profile)
+        _, inds = snap.nn.kneighbors(profile, n_neighbors=min(k + len(rows), len(snap.ids)))
+        inds = inds[0]
+        inds = inds[~np.isin(inds, rows)][:k]
+        return [snap.ids[int(i)] for i in inds]
+
+    def personalized(self, session_id: str, k: int = 8) -> List[int]:
+        """Return personalized product IDs for the session's recent events (see :meth:`recommend_from_history`)."""
+        recent = (
+            db.session.query(Event.product_id)
+            .filter(Event.session_id == session_id, Event.product_id.isnot(None))
+            .order_by(Event.created_at.desc(), Event.id.desc())
+            .limit(self.history_size)
+            .all()
+        )
+        return self.recommend_from_history([pid for (pid,) in recent], k=k)
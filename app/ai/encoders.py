@@ -0,0 +1,59 @@
+"""Process-wide registry of loaded sentence-transformer models.
+
+Loading a model reads hundreds of MB of weights, so each
+``(model name, quantization)`` pair is loaded once per process and the
+instance is shared by every indexer and request thread (inference does not
+mutate the model).
+
+``quantize='int8'`` applies PyTorch dynamic quantization to the ``Linear``
+layers after loading: weights are stored as int8 and activations are
+quantized on the fly, which speeds up CPU inference at the cost of a small
+drift in the embeddings (see ``benchmarks/bench_encoder.py``).
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List
+
+_lock = threading.Lock()
+_models: Dict[Hashable, Any] = {}
+_load_seconds: Dict[Hashable, float] = {}
+
+
+def quantize_dynamic_int8(model):
+    """Dynamically quantize ``model``'s ``Linear`` layers to int8 (CPU only), in place."""
+    import torch  # type: ignore
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def get_model(name: str, factory: Callable[..., Any], quantize: str = 'none'):
+    """Shared model instance for ``name``, loading it with ``factory`` on first use."""
+    quantize = (quantize or 'none').lower()
+    key = (factory, name, quantize)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                t0 = time.perf_counter()
+                if quantize == 'int8':
+                    model = quantize_dynamic_int8(factory(name, device='cpu'))
+                else:
+                    model = factory(name)
+                _models[key] = model
+                _load_seconds[key] = time.perf_counter() - t0
+    return model
+
+
+def model_stats() -> List[dict]:
+    with _lock:
+        return [
+            {'model': key[1], 'quantize': key[2], 'load_seconds': round(_load_seconds[key], 3)}
+            for key in _models
+        ]
+
+
+def clear_models():
+    """Forget loaded models (they are reloaded on next use)."""
+    with _lock:
+        _models.clear()
+        _load_seconds.clear()
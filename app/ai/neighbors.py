@@ -0,0 +1,176 @@
+"""Materialized product-to-product neighbour table.
+
+A product's content-based neighbours only change when the catalog does, so
+instead of a kNN query per page view the top ``k`` neighbours of every
+product are computed once, in batched passes over the search engine, and
+kept as two compact ``(n, k)`` arrays: neighbour row positions (int32) and
+cosine distances (float32). A lookup is then a dict hit plus a row slice.
+
+After a catalog edit :meth:`NeighborTable.refresh` carries the table over
+to the new snapshot: only edited products and the products that listed an
+edited or removed one are recomputed, and the edited products are merged
+into every other row they now beat.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .search import CosineIndex, take_rows
+from .store import read_arrays_file, write_arrays_file
+
+_BATCH = 1024
+
+
+def compute_neighbors(nn, embeddings, k: int, batch_size: int = _BATCH, positions=None):
+    """Top-``k`` neighbours (self excluded) for every row of ``embeddings``.
+
+    Returns ``(rows, dists)``, both ``(n, min(k, n - 1))``, best first. With
+    ``positions`` only those rows are computed (one output row each).
+    """
+    n = embeddings.shape[0]
+    k = max(0, min(k, n - 1))
+    positions = np.arange(n) if positions is None else np.asarray(positions, dtype=np.intp)
+    rows = np.empty((len(positions), k), dtype=np.int32)
+    dists = np.empty((len(positions), k), dtype=np.float32)
+    if not k:
+        return rows, dists
+    for s in range(0, len(positions), batch_size):
+        e = min(len(positions), s + batch_size)
+        batch = positions[s:e]
+        d, i = nn.kneighbors(take_rows(embeddings, batch.tolist()), n_neighbors=k + 1)
+        # Move the row itself (usually first, but ties may reorder) to the end
+        keep = np.argsort(i == batch[:, None], axis=1, kind='stable')[:, :k]
+        rows[s:e] = np.take_along_axis(i, keep, axis=1)
+        dists[s:e] = np.take_along_axis(d, keep, axis=1)
+    return rows, dists
+
+
+def _merge_rows(embeddings, rows, dists, positions, added, k: int, batch_size: int = _BATCH):
+    """Merge the ``added`` rows into the neighbour lists of ``positions``, in place.
+
+    Each list keeps its best ``k`` of its old entries and the added rows.
+    """
+    engine = CosineIndex(take_rows(embeddings, added.tolist()))
+    for s in range(0, len(positions), batch_size):
+        batch = positions[s:s + batch_size]
+        cand_d = np.hstack([dists[batch], 1.0 - engine.scores(take_rows(embeddings, batch.tolist()))])
+        cand_r = np.hstack([rows[batch], np.broadcast_to(added, (len(batch), len(added)))])
+        best = np.argsort(cand_d, axis=1, kind='stable')[:, :k]
+        rows[batch] = np.take_along_axis(cand_r, best, axis=1)
+        dists[batch] = np.take_along_axis(cand_d, best, axis=1)
+
+
+class NeighborTable:
+    """Precomputed neighbours for one index snapshot (``version``).
+
+    ``hashes`` (product id -> text hash) and ``epoch`` (encoder generation)
+    record which vectors the table was computed from, so it can be checked
+    against, and refreshed for, a later snapshot. ``recomputed`` counts the
+    rows whose neighbours were searched for this table.
+    """
+
+    def __init__(self, ids: Sequence[int], rows: np.ndarray, dists: np.ndarray, version: int = 0,
+                 hashes: Optional[Dict[int, str]] = None, epoch: int = 0):
+        self.ids = list(ids)
+        self.rows = rows
+        self.dists = dists
+        self.version = version
+        self.hashes = hashes
+        self.epoch = epoch
+        self.recomputed = len(self.ids)
+        self.pos = {pid: i for i, pid in enumerate(self.ids)}
+
+    @property
+    def k(self) -> int:
+        return self.rows.shape[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, product_id: int, k: int,
+               hashes: Optional[Dict[int, str]] = None) -> Optional[List[Tuple[int, float]]]:
+        """``[(neighbour_id, distance), ...]`` or None if not materialized for ``k``.
+
+        With ``hashes`` (a later snapshot's), an entry is also None when the
+        product or one of its neighbours was edited or removed since.
+        """
+        i = self.pos.get(product_id)
+        if i is None or (k > self.k and self.k < len(self.ids) - 1):
+            return None
+        ids = self.ids
+        hit = [(ids[r], float(d)) for r, d in zip(self.rows[i, :k].tolist(), self.dists[i, :k].tolist())]
+        if hashes is not None:
+            if self.hashes is None:
+                return None
+            for pid in [product_id] + [pid for pid, _ in hit]:
+                if hashes.get(pid) != self.hashes.get(pid):
+                    return None
+        return hit
+
+    def refresh(self, nn, embeddings, ids: Sequence[int], hashes: Dict[int, str], k: int,
+                version: int = 0, epoch: int = 0) -> 'NeighborTable':
+        """This table carried over to a later snapshot (``ids``, ``embeddings``, ``hashes``).
+
+        Rows of products whose text changed, that are new, or whose list
+        held a changed or removed product are recomputed with ``nn``; every
+        other row keeps its entries, with the changed products merged in
+        where they are now closer. Falls back to a full recompute when the
+        encoder or width changed, or when most rows would be recomputed anyway.
+        """
+        ids = list(ids)
+        n = len(ids)
+        width = max(0, min(k, n - 1))
+        if self.hashes is None or epoch != self.epoch or width != self.k or not width:
+            rows, dists = compute_neighbors(nn, embeddings, k)
+            return NeighborTable(ids, rows, dists, version, hashes, epoch)
+        new_pos = {pid: i for i, pid in enumerate(ids)}
+        # Old row -> new row, or -1 where the product was removed or edited
+        remap = np.array([new_pos.get(pid, -1) if hashes.get(pid) == self.hashes.get(pid) else -1
+                          for pid in self.ids] + [-1], dtype=np.int64)
+        old = np.array([self.pos.get(pid, -1) if remap[self.pos.get(pid, -1)] >= 0 else -1
+                        for pid in ids], dtype=np.int64)
+        changed = old < 0
+        rows = np.zeros((n, width), dtype=np.int32)
+        dists = np.zeros((n, width), dtype=np.float32)
+        kept = np.flatnonzero(~changed)
+        mapped = remap[self.rows[old[kept]]]
+        rows[kept] = mapped
+        dists[kept] = self.dists[old[kept]]
+        stale = changed.copy()
+        stale[kept] = (mapped < 0).any(axis=1)
+        if 2 * int(stale.sum()) > n:
+            rows, dists = compute_neighbors(nn, embeddings, k)
+            return NeighborTable(ids, rows, dists, version, hashes, epoch)
+        clean = np.flatnonzero(~stale)
+        added = np.flatnonzero(changed)
+        if len(clean) and len(added):
+            _merge_rows(embeddings, rows, dists, clean, added, width)
+        redo = np.flatnonzero(stale)
+        if len(redo):
+            rows[redo], dists[redo] = compute_neighbors(nn, embeddings, k, positions=redo)
+        table = NeighborTable(ids, rows, dists, version, hashes, epoch)
+        table.recomputed = len(redo)
+        return table
+
+    def save(self, path: str, digest: str):
+        write_arrays_file(
+            path,
+            ids=np.asarray(self.ids, dtype='<i8'),
+            rows=self.rows,
+            dists=self.dists,
+            digest=np.array(digest),
+        )
+
+    @classmethod
+    def load(cls, path: str, ids: Sequence[int], digest: str, version: int = 0,
+             hashes: Optional[Dict[int, str]] = None, epoch: int = 0) -> Optional['NeighborTable']:
+        """Table persisted for exactly this catalog (same ids and text digest), else None."""
+        arrays = read_arrays_file(path)
+        if not arrays:
+            return None
+        try:
+            if arrays['ids'].tolist() != list(ids) or str(arrays['digest']) != digest:
+                return None
+            return cls(ids, arrays['rows'], arrays['dists'], version, hashes, epoch)
+        except KeyError:
+            return None
@@ -0,0 +1,12 @@
+"""Start-method choice for the worker processes used by the AI indices.
+
+Shard workers (``shards.py``) and parallel vision builds (``vision.py``)
+both start their processes through :func:`mp_context`.
+"""
+import multiprocessing
+
+
+def mp_context():
+    """``fork`` where the platform has it (workers inherit loaded modules), else ``spawn``."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
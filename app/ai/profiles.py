@@ -0,0 +1,159 @@
+"""Per-user / per-session taste profiles, updated as events are logged.
+
+A profile is a compact map of product id -> recency-decayed interaction
+weight. Every logged interaction first decays the existing weights by
+``0.5 ** (1 / half_life)`` and then adds 1 to its product, so the stored
+weights equal :meth:`EmbeddingIndexer.history_weights` over the whole
+history without replaying any events. Only the ``max_items`` heaviest
+products are kept.
+
+Profiles are kept in product space rather than as an embedding vector, so
+they stay valid across model switches and TF-IDF refits; the indexer turns
+one into a profile vector (memoized per index version) for a single top-k
+scan. Anonymous session profiles are merged into the user's profile on
+login. Rows live in the ``taste_profile`` table (``TasteProfileRecord``).
+
+Updates are read-modify-write, so they are stored with a compare-and-set on
+the ``events`` count read: if another request updated the profile in
+between, nothing is written and the update is redone on the new row.
+"""
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from flask import Flask
+
+from ..extensions import db
+
+_ID_DTYPE = np.dtype('<i8')
+_WEIGHT_DTYPE = np.dtype('<f4')
+# Attempts at a conflict-free update before giving up
+_MAX_ATTEMPTS = 10
+
+
+def owner_key(user_id: Optional[int] = None, session_id: Optional[str] = None) -> Optional[str]:
+    """Profile key: the user when logged in, otherwise the session."""
+    if user_id is not None:
+        return f'user:{user_id}'
+    if session_id:
+        return f'session:{session_id}'
+    return None
+
+
+class TasteProfile:
+    def __init__(self, owner: str, weights: Dict[int, float] | None = None, events: int = 0):
+        self.owner = owner
+        self.weights = dict(weights or {})
+        self.events = events
+
+    def record(self, product_id: int, half_life: float, max_items: int):
+        """Decay the existing weights one step and count an interaction with ``product_id``."""
+        decay = 0.5 ** (1.0 / half_life)
+        self.weights = {pid: w * decay for pid, w in self.weights.items()}
+        self.weights[product_id] = self.weights.get(product_id, 0.0) + 1.0
+        self.events += 1
+        self._prune(max_items)
+
+    def merge(self, other: 'TasteProfile', max_items: int):
+        for pid, w in other.weights.items():
+            self.weights[pid] = self.weights.get(pid, 0.0) + w
+        self.events += other.events
+        self._prune(max_items)
+
+    def _prune(self, max_items: int):
+        if max_items and len(self.weights) > max_items:
+            keep = sorted(self.weights.items(), key=lambda x: x[1], reverse=True)[:max_items]
+            self.weights = dict(keep)
+
+
+def load_profile(owner: str) -> Optional[TasteProfile]:
+    from sqlalchemy import text
+    row = db.session.execute(
+        text("SELECT events, product_ids, weights FROM taste_profile WHERE owner = :owner"),
+        {"owner": owner},
+    ).fetchone()
+    if row is None:
+        return None
+    ids = np.frombuffer(row[1], dtype=_ID_DTYPE).tolist()
+    weights = np.frombuffer(row[2], dtype=_WEIGHT_DTYPE).tolist()
+    return TasteProfile(owner, dict(zip(ids, weights)), int(row[0]))
+
+
+def _store_if_unchanged(profile: TasteProfile, seen: Optional[int]) -> bool:
+    """Write ``profile`` only if its stored row still has ``seen`` events (None: no row yet)."""
+    from sqlalchemy import text
+    params = {
+        "owner": profile.owner,
+        "events": profile.events,
+        "ids": np.asarray(list(profile.weights), dtype=_ID_DTYPE).tobytes(),
+        "weights": np.asarray(list(profile.weights.values()), dtype=_WEIGHT_DTYPE).tobytes(),
+    }
+    if seen is None:
+        result = db.session.execute(
+            text("INSERT OR IGNORE INTO taste_profile(owner, events, product_ids, weights) "
+                 "VALUES (:owner, :events, :ids, :weights)"),
+            params,
+        )
+    else:
+        result = db.session.execute(
+            text("UPDATE taste_profile SET events = :events, product_ids = :ids, weights = :weights "
+                 "WHERE owner = :owner AND events = :seen"),
+            dict(params, seen=seen),
+        )
+    return result.rowcount == 1
+
+
+def _update_profile(owner: str, change: Callable[[TasteProfile], None]) -> TasteProfile:
+    """Apply ``change`` to ``owner``'s stored profile (uncommitted), redoing it on conflict."""
+    for _ in range(_MAX_ATTEMPTS):
+        profile = load_profile(owner)
+        seen = profile.events if profile is not None else None
+        profile = profile or TasteProfile(owner)
+        change(profile)
+        if _store_if_unchanged(profile, seen):
+            return profile
+    raise RuntimeError(f'taste profile {owner!r} kept changing during the update')
+
+
+def delete_profile(owner: str, commit: bool = True):
+    from sqlalchemy import text
+    db.session.execute(text("DELETE FROM taste_profile WHERE owner = :owner"), {"owner": owner})
+    if commit:
+        db.session.commit()
+
+
+def record_interaction(owner: str, product_id: int, half_life: float = 5.0, max_items: int = 50) -> TasteProfile:
+    """Fold one event into ``owner``'s stored profile and return it."""
+    profile = _update_profile(owner, lambda p: p.record(product_id, half_life, max_items))
+    db.session.commit()
+    return profile
+
+
+def merge_profiles(src: str, dst: str, max_items: int = 50) -> Optional[TasteProfile]:
+    """Add ``src``'s weights into ``dst`` and delete ``src``; returns the merged profile."""
+    source = load_profile(src)
+    if source is None:
+        return load_profile(dst)
+    target = _update_profile(dst, lambda p: p.merge(source, max_items))
+    delete_profile(src, commit=False)
+    db.session.commit()
+    return target
+
+
+def init_app(app: Flask):
+    """Merge the anonymous session profile into the user's on every login."""
+    from flask import session
+    from flask_login import user_logged_in  # type: ignore
+
+    def _merge_on_login(sender, user, **extra):
+        src = owner_key(session_id=session.get('sid'))
+        if not src:
+            return
+        try:
+            merge_profiles(src, owner_key(user_id=user.id), sender.config.get('PROFILE_MAX_ITEMS', 50))
+        except Exception:
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+
+    user_logged_in.connect(_merge_on_login, app, weak=False)
@@ -0,0 +1,91 @@
+"""Per-dimension int8 scalar quantization with exact rescoring.
+
+Each dimension is mapped linearly from its ``[min, max]`` range onto 256
+int8 levels, so the scanned matrix is 4x smaller than float32. A query is
+scored against the codes first; only the best ``k * rescore`` candidates are
+then rescored with the exact vectors, which may stay memory-mapped on disk
+since only those rows are ever read.
+"""
+import numpy as np
+
+from .search import is_sparse, l2_normalize, top_k
+
+_SCAN_CHUNK = 1024
+_MIN_CANDIDATES = 32
+
+
+class ScalarQuantizer:
+    """Per-dimension affine int8 codec: ``x ~= base + scale * code``."""
+
+    def __init__(self, scale: np.ndarray, base: np.ndarray):
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.base = np.asarray(base, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, matrix) -> 'ScalarQuantizer':
+        lo = np.asarray(matrix.min(axis=0), dtype=np.float32)
+        hi = np.asarray(matrix.max(axis=0), dtype=np.float32)
+        scale = (hi - lo) / 255.0
+        scale[scale == 0] = 1.0
+        # code -128 maps to ``lo`` and 127 to ``hi``
+        return cls(scale, lo + 128.0 * scale)
+
+    def encode(self, matrix) -> np.ndarray:
+        out = np.empty(matrix.shape, dtype=np.int8)
+        for s in range(0, matrix.shape[0], _SCAN_CHUNK):
+            block = np.asarray(matrix[s:s + _SCAN_CHUNK], dtype=np.float32)
+            out[s:s + len(block)] = np.clip(np.rint((block - self.base) / self.scale), -128, 127)
+        return out
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.base + self.scale * codes.astype(np.float32)
+
+
+class QuantizedIndex:
+    """Cosine index scanning int8 codes, with the same ``kneighbors`` API as ``CosineIndex``.
+
+    ``matrix`` rows must be unit length and dense; it is kept by reference
+    for rescoring, so pass a memmap to keep the float32 rows out of RAM.
+    """
+
+    def __init__(self, matrix, rescore: int = 4):
+        if is_sparse(matrix):
+            raise ValueError('QuantizedIndex needs a dense matrix')
+        self.matrix = matrix
+        self.rescore = max(1, int(rescore))
+        self.quantizer = ScalarQuantizer.fit(matrix)
+        self.codes = self.quantizer.encode(matrix)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the scan structure (codes plus codec)."""
+        return self.codes.nbytes + self.quantizer.scale.nbytes + self.quantizer.base.nbytes
+
+    def approx_scores(self, q: np.ndarray) -> np.ndarray:
+        """Approximate dot products of unit queries ``q`` against every row."""
+        qs = q * self.quantizer.scale
+        out = np.empty((q.shape[0], len(self)), dtype=np.float32)
+        for s in range(0, len(self), _SCAN_CHUNK):
+            block = self.codes[s:s + _SCAN_CHUNK]
+            out[:, s:s + len(block)] = qs @ block.astype(np.float32).T
+        out += (q @ self.quantizer.base)[:, None]
+        return out
+
+    def kneighbors(self, queries, n_neighbors: int = 10, mask: np.ndarray | None = None):
+        """Return ``(distances, indices)`` of shape ``(len(queries), k)``; see ``CosineIndex``."""
+        q = l2_normalize(queries)
+        if is_sparse(q):
+            q = q.toarray()
+        k = min(n_neighbors, len(self))
+        cand, _ = top_k(self.approx_scores(q), max(k * self.rescore, _MIN_CANDIDATES), mask)
+        k = min(k, cand.shape[1])
+        if not k:
+            return np.zeros(cand.shape, dtype=np.float32), cand
+        # Exact rescoring reads only the candidate rows (sorted for mmap locality)
+        cand = np.sort(cand, axis=1)
+        exact = np.einsum('qcd,qd->qc', np.asarray(self.matrix[cand.ravel()], dtype=np.float32).reshape(*cand.shape, -1), q)
+        best, sims = top_k(exact, k)
+        return 1.0 - sims, np.take_along_axis(cand, best, axis=1)
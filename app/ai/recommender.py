@@ -1,56 +1,80 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterable, Tuple
 from .embeddings import EmbeddingIndexer
 from ..models import Product, Event
 from ..extensions import db
 
 
+def _hydrate(ids_by_key: Dict[int, List[int]]) -> Dict[int, List[Product]]:
+    """Load every product referenced in ``ids_by_key`` with one query, preserving order."""
+    wanted = {i for ids in ids_by_key.values() for i in ids}
+    if not wanted:
+        return {key: [] for key in ids_by_key}
+    pmap = {p.id: p for p in Product.query.filter(Product.id.in_(wanted)).all()}
+    return {key: [pmap[i] for i in ids if i in pmap] for key, ids in ids_by_key.items()}
+
+
 class Recommender:
     def __init__(self, indexer: EmbeddingIndexer):
         self.indexer = indexer
 
     def recommend_for_product(self, product_id: int, k: int = 5) -> List[Product]:
-        pairs = self.indexer.query_by_product(product_id, k=k)
-        ids = [pid for pid, _ in pairs]
-        if not ids:
-            return []
-        products = Product.query.filter(Product.id.in_(ids)).all()
-        # Preserve order
-        prod_map = {p.id: p for p in products}
-        ordered = [prod_map.get(i) for i in ids if prod_map.get(i)]
-        return ordered
+        return self.recommend_for_products([product_id], k=k)[product_id]
+
+    def recommend_for_products(self, product_ids: Iterable[int], k: int = 5) -> Dict[int, List[Product]]:
+        """Content-based neighbours for many products: one kNN pass, one Product query."""
+        pairs = self.indexer.query_by_products(product_ids, k=k)
+        return _hydrate({pid: [i for i, _ in neigh] for pid, neigh in pairs.items()})
 
     def cooccurrence_for_product(self, product_id: int, k: int = 5) -> List[Tuple[int, float]]:
         """Simple co-occurrence based on session-level events: products appearing in the same session."""
-        # fetch sessions where product appeared
-        sess_rows = db.session.query(Event.session_id).filter(Event.product_id == product_id).distinct().all()
-        sess_ids = [r[0] for r in sess_rows if r[0]]
-        if not sess_ids:
-            return []
+        return self.cooccurrence_for_products([product_id], k=k)[product_id]
+
+    def cooccurrence_for_products(self, product_ids: Iterable[int], k: int = 5) -> Dict[int, List[Tuple[int, float]]]:
+        """Co-occurrence for several products using two queries in total."""
+        product_ids = list(dict.fromkeys(product_ids))
+        out: Dict[int, List[Tuple[int, float]]] = {pid: [] for pid in product_ids}
+        if not product_ids:
+            return out
+        # fetch sessions where each product appeared
+        sess_rows = db.session.query(Event.session_id, Event.product_id).filter(Event.product_id.in_(product_ids)).distinct().all()
+        bases_by_sess: Dict[str, List[int]] = {}
+        for sid, pid in sess_rows:
+            if sid:
+                bases_by_sess.setdefault(sid, []).append(int(pid))
+        if not bases_by_sess:
+            return out
         # count other products in these sessions
-        counts: Dict[int, int] = {}
-        q = db.session.query(Event.product_id).filter(Event.session_id.in_(sess_ids), Event.product_id.isnot(None))
-        for (pid,) in q.all():
-            if pid and pid != product_id:
-                counts[int(pid)] = counts.get(int(pid), 0) + 1
-        if not counts:
-            return []
-        ranked = sorted(counts.items(), key=lambda x: x[1], reverse=True)[:k]
-        # convert to (pid, score) with normalized score
-        maxc = float(ranked[0][1]) if ranked else 1.0
-        return [(pid, 1.0 - (c/maxc)) for pid, c in ranked]
+        counts: Dict[int, Dict[int, int]] = {pid: {} for pid in product_ids}
+        q = db.session.query(Event.session_id, Event.product_id).filter(Event.session_id.in_(list(bases_by_sess)), Event.product_id.isnot(None))
+        for sid, pid in q.all():
+            for base in bases_by_sess.get(sid, ()):
+                if pid and pid != base:
+                    c = counts[base]
+                    c[int(pid)] = c.get(int(pid), 0) + 1
+        for base, c in counts.items():
+            if not c:
+                continue
+            ranked = sorted(c.items(), key=lambda x: x[1], reverse=True)[:k]
+            # convert to (pid, score) with normalized score
+            maxc = float(ranked[0][1]) if ranked else 1.0
+            out[base] = [(pid, 1.0 - (n/maxc)) for pid, n in ranked]
+        return out
 
     def hybrid_for_product(self, product_id: int, k: int = 8) -> List[Product]:
-        emb = self.indexer.query_by_product(product_id, k=k)
-        coo = self.cooccurrence_for_product(product_id, k=k)
-        scores: Dict[int, float] = {}
-        for pid, dist in emb:
-            scores[pid] = scores.get(pid, 0.0) + (1.0 - dist) * 0.6
-        for pid, dist in coo:
-            scores[pid] = scores.get(pid, 0.0) + (1.0 - dist) * 0.4
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
-        ids = [pid for pid,_ in ranked]
-        if not ids:
-            return []
-        products = Product.query.filter(Product.id.in_(ids)).all()
-        pmap = {p.id: p for p in products}
-        return [pmap[i] for i in ids if i in pmap]
+        return self.hybrid_for_products([product_id], k=k)[product_id]
+
+    def hybrid_for_products(self, product_ids: Iterable[int], k: int = 8) -> Dict[int, List[Product]]:
+        """Hybrid ranking for several products with batched kNN, co-occurrence and hydration."""
+        product_ids = list(dict.fromkeys(product_ids))
+        emb_all = self.indexer.query_by_products(product_ids, k=k)
+        coo_all = self.cooccurrence_for_products(product_ids, k=k)
+        ranked_ids: Dict[int, List[int]] = {}
+        for product_id in product_ids:
+            scores: Dict[int, float] = {}
+            for pid, dist in emb_all.get(product_id, []):
+                scores[pid] = scores.get(pid, 0.0) + (1.0 - dist) * 0.6
+            for pid, dist in coo_all.get(product_id, []):
+                scores[pid] = scores.get(pid, 0.0) + (1.0 - dist) * 0.4
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+            ranked_ids[product_id] = [pid for pid, _ in ranked]
+        return _hydrate(ranked_ids)
@@ -0,0 +1,386 @@
+"""App-scoped registry of built AI indices.
+
+Building an index (loading the model, reading ``embedding_cache`` and fitting
+the neighbour search) costs far more than querying it, so each index is built
+once per app and then shared by every request thread. Indices are keyed by
+the settings that shape them, e.g. ``('text', EMBEDDING_MODEL, VECTOR_DB_PATH)``.
+
+Later rebuilds run on a background thread per index: the index assembles a
+new snapshot while the current one keeps answering queries, then swaps it
+in with one assignment, so readers never wait for a rebuild.
+
+Catalog edits patch a text index in place (see ``EmbeddingIndexer.compact``);
+rebuilding its engine and rewriting its files is queued on the same kind of
+background thread, after ``INDEX_COMPACT_DELAY`` seconds so a burst of edits
+is compacted once.
+
+Catalog writes also bump a shared version stamp (a row in the app DB).
+Every worker reads it at most once per ``INDEX_STAMP_INTERVAL`` seconds and,
+when it moved, syncs its own indices from the catalog and the persisted
+vector store in the background.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List
+
+from flask import Flask
+
+from ..extensions import db
+from .embeddings import EmbeddingIndexer
+from .vision import MAX_PIXELS, WORK_SIZE, VisionIndexer
+
+_EXTENSION_KEY = 'ai_index_registry'
+_registry_lock = threading.Lock()
+
+
+def index_name(key: Hashable) -> str:
+    """Short public name for a registry key: kind plus model or descriptor, never a path."""
+    if isinstance(key, tuple) and key:
+        if key[0] == 'text' and len(key) > 1:
+            return f'text:{key[1]}'
+        if key[0] == 'vision' and len(key) > 3:
+            return f'vision:{key[3]}'
+        return str(key[0])
+    return str(key)
+
+
+class IndexRegistry:
+    """Build-once cache of index objects with hit/build counters.
+
+    Lookups of an already built index take no lock. Builds are serialized per
+    key so concurrent first requests wait for a single build instead of each
+    starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._indices: Dict[Hashable, Any] = {}
+        self._jobs: Dict[Hashable, dict] = {}
+        self.hits = 0
+        self.builds = 0
+        # Shared catalog stamp last acted on, and when it was last read
+        self.stamp_seen = None
+        self.stamp_checked_at = 0.0
+        self._stamp_lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        idx = self._indices.get(key)
+        if idx is None:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                idx = self._indices.get(key)
+                if idx is None:
+                    idx = factory()
+                    with self._lock:
+                        self._indices[key] = idx
+                        self.builds += 1
+                    return idx
+        with self._lock:
+            self.hits += 1
+        return idx
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the index for ``key`` if it has been built, else None."""
+        return self._indices.get(key)
+
+    def built(self, kind: str) -> list:
+        """Built indices whose key starts with ``kind``."""
+        return [idx for _, idx in self.items(kind)]
+
+    def items(self, kind: str | None = None) -> list:
+        """``(key, index)`` pairs of built indices (all, or those whose key starts with ``kind``)."""
+        with self._lock:
+            return [(key, idx) for key, idx in self._indices.items()
+                    if kind is None or (isinstance(key, tuple) and key[0] == kind)]
+
+    def rebuild_async(self, key: Hashable, build: Callable[[], None]) -> dict:
+        """Run ``build`` for ``key`` on a background thread; returns the job status.
+
+        Requests made while a rebuild is running queue exactly one more run
+        instead of starting a second thread.
+        """
+        with self._lock:
+            job = self._jobs.setdefault(key, {'state': 'idle', 'runs': 0, 'last_seconds': None,
+                                              'last_error': None, 'finished_at': None})
+            job['pending'] = build
+            thread = job.get('thread')
+            if thread is None or not thread.is_alive():
+                job['state'] = 'queued'
+                job['thread'] = threading.Thread(target=self._rebuild_worker, args=(key,),
+                                                 name='index-rebuild', daemon=True)
+                job['thread'].start()
+            return self._job_status(job)
+
+    def _rebuild_worker(self, key: Hashable):
+        while True:
+            with self._lock:
+                job = self._jobs[key]
+                build, job['pending'] = job.get('pending'), None
+                if build is None:
+                    job['state'] = 'idle' if not job['last_error'] else 'failed'
+                    return
+                job['state'] = 'building'
+            t0 = time.perf_counter()
+            error = None
+            try:
+                build()
+            except Exception as exc:  # keep serving the previous snapshot
+                error = repr(exc)
+            with self._lock:
+                job['runs'] += 1
+                job['last_seconds'] = round(time.perf_counter() - t0, 3)
+                job['last_error'] = error
+                job['finished_at'] = time.time()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait for running rebuilds to finish; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in list(self._jobs.values()):
+            thread = job.get('thread')
+            if thread is not None:
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+                if thread.is_alive():
+                    return False
+        return True
+
+    @staticmethod
+    def _job_status(job: dict) -> dict:
+        return {k: v for k, v in job.items() if k not in ('thread', 'pending')}
+
+    def invalidate(self, kind: str | None = None):
+        """Drop built indices (all, or those whose key starts with ``kind``)."""
+        with self._lock:
+            for key in list(self._indices):
+                if kind is None or (isinstance(key, tuple) and key[0] == kind):
+                    del self._indices[key]
+
+    def stats(self) -> dict:
+        """Counters and per-index state for the public status endpoint.
+
+        Indices are listed by :func:`index_name` (keys hold filesystem paths)
+        and rebuild errors only as the ``failed`` state, not their text.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'builds': self.builds,
+                'indices': [index_name(k) for k in self._indices],
+                'snapshots': [
+                    {
+                        'index': index_name(k),
+                        'version': getattr(idx, 'version', None),
+                        'size': len(getattr(idx, 'ids', ()) or ()),
+                        'rebuild': ({n: v for n, v in self._job_status(self._jobs[k]).items() if n != 'last_error'}
+                                    if k in self._jobs else None),
+                    }
+                    for k, idx in self._indices.items()
+                ],
+            }
+
+
+def get_registry(app: Flask) -> IndexRegistry:
+    reg = app.extensions.get(_EXTENSION_KEY)
+    if reg is None:
+        with _registry_lock:
+            reg = app.extensions.setdefault(_EXTENSION_KEY, IndexRegistry())
+    return reg
+
+
+def get_text_indexer(app: Flask) -> EmbeddingIndexer:
+    """Shared, built text index for the app's EMBEDDING_MODEL/VECTOR_DB_PATH."""
+    cfg = app.config
+    key = ('text', cfg.get('EMBEDDING_MODEL'), cfg.get('VECTOR_DB_PATH'))
+
+    def _build():
+        _note_stamp(get_registry(app))
+        idx = EmbeddingIndexer(
+            model_name=cfg.get('EMBEDDING_MODEL'),
+            persist_dir=cfg.get('VECTOR_DB_PATH'),
+            query_cache_size=cfg.get('QUERY_CACHE_SIZE', 1024),
+            query_cache_ttl=cfg.get('QUERY_CACHE_TTL', 300.0),
+            index_type=cfg.get('VECTOR_INDEX', 'exact'),
+            ivf_nlist=cfg.get('IVF_NLIST', 0),
+            ivf_nprobe=cfg.get('IVF_NPROBE', 8),
+            neighbor_k=cfg.get('NEIGHBOR_K', 0),
+            quantize=cfg.get('VECTOR_QUANTIZE', 'none'),
+            quant_rescore=cfg.get('QUANT_RESCORE', 4),
+            shards=cfg.get('VECTOR_SHARDS', 0),
+            shard_min_rows=cfg.get('VECTOR_SHARD_MIN_ROWS', 20000),
+            model_quantize=cfg.get('EMBEDDING_QUANTIZE', 'none'),
+            encode_batch_size=cfg.get('ENCODE_BATCH_SIZE', 64),
+            history_size=cfg.get('PERSONALIZE_HISTORY', 25),
+            recency_half_life=cfg.get('PERSONALIZE_HALF_LIFE', 5.0),
+        )
+        idx.build_index()
+        if not idx.neighbors_fresh():
+            idx.materialize_neighbors_async()
+        return idx
+
+    idx = get_registry(app).get(key, _build)
+    check_catalog_stamp(app)
+    return idx
+
+
+def get_vision_indexer(app: Flask) -> VisionIndexer:
+    """Shared, built vision index for the app's static folder/VECTOR_DB_PATH."""
+    cfg = app.config
+    key = ('vision', app.static_folder, cfg.get('VECTOR_DB_PATH'), cfg.get('VISION_DESCRIPTOR', 'rgb768'))
+
+    def _build():
+        _note_stamp(get_registry(app))
+        idx = VisionIndexer(
+            static_folder=app.static_folder,
+            persist_dir=cfg.get('VECTOR_DB_PATH'),
+            descriptor=cfg.get('VISION_DESCRIPTOR', 'rgb768'),
+            work_size=cfg.get('VISION_WORK_SIZE', WORK_SIZE),
+            max_pixels=cfg.get('VISION_MAX_PIXELS', MAX_PIXELS),
+            workers=cfg.get('VISION_BUILD_WORKERS', 0),
+        )
+        idx.build_index()
+        return idx
+
+    idx = get_registry(app).get(key, _build)
+    check_catalog_stamp(app)
+    return idx
+
+
+# The stamp uses its own short transactions so it never commits (or rolls
+# back) work pending in the request's session.
+def _ensure_stamp_table(conn):
+    from sqlalchemy import text
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS ai_index_stamp (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """))
+
+
+def read_catalog_stamp() -> int:
+    from sqlalchemy import text
+    with db.engine.begin() as conn:
+        _ensure_stamp_table(conn)
+        row = conn.execute(text("SELECT version FROM ai_index_stamp WHERE name = 'catalog'")).fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_catalog_stamp() -> int:
+    """Tell every worker the catalog changed; returns the new stamp."""
+    from sqlalchemy import text
+    with db.engine.begin() as conn:
+        _ensure_stamp_table(conn)
+        conn.execute(text("INSERT OR IGNORE INTO ai_index_stamp(name, version) VALUES ('catalog', 0)"))
+        conn.execute(text("UPDATE ai_index_stamp SET version = version + 1 WHERE name = 'catalog'"))
+        row = conn.execute(text("SELECT version FROM ai_index_stamp WHERE name = 'catalog'")).fetchone()
+    return int(row[0])
+
+
+def _note_stamp(reg: IndexRegistry):
+    """Record the stamp an index is about to be built against (first build only)."""
+    if reg.stamp_seen is None:
+        try:
+            reg.stamp_seen = read_catalog_stamp()
+        except Exception:
+            pass
+
+
+def check_catalog_stamp(app: Flask, now: float | None = None) -> bool:
+    """Sync this worker's indices if another worker changed the catalog.
+
+    Reads the stamp at most once per ``INDEX_STAMP_INTERVAL`` seconds (0
+    disables the check) and never blocks on the sync itself. Returns True
+    when a sync was scheduled.
+    """
+    interval = float(app.config.get('INDEX_STAMP_INTERVAL', 5))
+    reg = get_registry(app)
+    now = time.monotonic() if now is None else now
+    if interval <= 0 or now - reg.stamp_checked_at < interval:
+        return False
+    if not reg._stamp_lock.acquire(blocking=False):
+        return False  # another request thread is checking
+    try:
+        reg.stamp_checked_at = now
+        try:
+            stamp = read_catalog_stamp()
+        except Exception:
+            return False
+        seen, reg.stamp_seen = reg.stamp_seen, stamp
+        if seen is None or stamp == seen:
+            return False
+        rebuild_indices(app, incremental=True)
+        return True
+    finally:
+        reg._stamp_lock.release()
+
+
+def rebuild_indices(app: Flask, kind: str | None = None, force: bool = False,
+                    incremental: bool = False) -> List[dict]:
+    """Rebuild built indices (all, or of ``kind``) in the background.
+
+    The current snapshots keep serving until each rebuild swaps in its
+    replacement. With ``incremental`` text indices only :meth:`sync` with
+    the catalog. Returns one status entry per scheduled index.
+    """
+    reg = get_registry(app)
+    out = []
+    for key, idx in reg.items(kind):
+        def _build(idx=idx, vision=key[0] == 'vision'):
+            with app.app_context():
+                if incremental and not vision:
+                    idx.sync()
+                else:
+                    # A forced vision build re-scans the catalog; unchanged images keep their features
+                    idx.build_index(force=force or vision)
+                if not vision:
+                    # Also folds in edits queued while the build held the index
+                    idx.compact()
+                if hasattr(idx, 'neighbors_fresh') and not idx.neighbors_fresh():
+                    idx.materialize_neighbors_async()
+        status = reg.rebuild_async(key, _build)
+        status['index'] = index_name(key)
+        out.append(status)
+    return out
+
+
+def compact_async(app: Flask, key: Hashable, idx: EmbeddingIndexer) -> dict:
+    """Compact ``idx`` in the background once edits have settled; returns the job status."""
+    delay = float(app.config.get('INDEX_COMPACT_DELAY', 2))
+
+    def _compact():
+        if delay > 0:
+            time.sleep(delay)
+        with app.app_context():
+            idx.compact()
+    return get_registry(app).rebuild_async(('compact', key), _compact)
+
+
+def apply_product_changes(app: Flask, upserted: Iterable = (), removed: Iterable[int] = ()):
+    """Push catalog edits into the app's built text indices.
+
+    Only products whose text changed are re-encoded and written to the
+    vector cache; the engine and index files are compacted, and the
+    neighbour table refreshed, in the background. Built vision indices are
+    rebuilt in the background while their previous snapshot keeps serving.
+    """
+    reg = get_registry(app)
+    upserted, removed = list(upserted), list(removed)
+    for key, idx in reg.items('text'):
+        if removed:
+            idx.remove_products(removed)
+        if upserted:
+            idx.upsert_products(upserted)
+        if idx.compaction_pending:
+            compact_async(app, key, idx)
+        if not idx.neighbors_fresh():
+            idx.materialize_neighbors_async()
+    rebuild_indices(app, 'vision')
+    try:
+        stamp = bump_catalog_stamp()
+        with reg._stamp_lock:
+            # This worker is already up to date with its own write
+            if reg.stamp_seen is not None and reg.stamp_seen == stamp - 1:
+                reg.stamp_seen = stamp
+    except Exception:
+        pass
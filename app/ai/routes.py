@@ -1,11 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app, abort, session
 from flask_login import login_required, current_user
-from .embeddings import EmbeddingIndexer
 from .recommender import Recommender
+from .registry import get_registry, get_text_indexer, get_vision_indexer, rebuild_indices
+from .encoders import model_stats
+from .profiles import load_profile, owner_key
 from .imagery import generate_image
+from .vision import MAX_PIXELS, WORK_SIZE, ImageTooLarge, load_image
 from ..models import Product
 import os
-from .vision import VisionIndexer
+import re
 import time
 import random
 import logging
@@ -14,21 +17,12 @@ ai_bp = Blueprint('ai', __name__)
 
 
 def _get_indexer():
-    cfg = current_app.config
-    idx = EmbeddingIndexer(
-        model_name=cfg.get('EMBEDDING_MODEL'),
-        persist_dir=cfg.get('VECTOR_DB_PATH'),
-    )
-    # build lazily
-    return idx
+    # Built once per app and shared between requests (see registry.py)
+    return get_text_indexer(current_app)
 
 
 def _get_vision_indexer():
-    cfg = current_app.config
-    return VisionIndexer(
-        static_folder=current_app.static_folder,
-        persist_dir=cfg.get('VECTOR_DB_PATH'),
-    )
+    return get_vision_indexer(current_app)
 
 
 def _audit_log(event: str, detail: dict):
@@ -59,6 +53,32 @@ def _rate_limit(key: str, limit: int = 60, window_sec: int = 300) -> bool:
     return allowed
 
 
+@ai_bp.route('/index_status', methods=['GET'])
+def index_status():
+    reg = get_registry(current_app)
+    data = reg.stats()
+    data['query_cache'] = [idx.query_cache_stats() for idx in reg.built('text')]
+    data['neighbors'] = [idx.neighbor_status() for idx in reg.built('text')]
+    data['models'] = model_stats()
+    return jsonify(data)
+
+
+@ai_bp.route('/rebuild_index', methods=['POST'])
+@login_required
+def rebuild_index():
+    """Admin-only: rebuild built indices in the background (current snapshots keep serving)."""
+    if not getattr(current_user, 'is_admin', False):
+        return abort(403)
+    data = request.get_json(silent=True) or request.form or {}
+    kind = data.get('kind') or request.args.get('kind')
+    if kind not in (None, '', 'text', 'vision'):
+        return jsonify({'error': 'kind must be text or vision'}), 400
+    force = str(data.get('force') or request.args.get('force') or '').lower() in {'1', 'true', 'yes'}
+    jobs = rebuild_indices(current_app, kind or None, force=force)
+    _audit_log('rebuild_index', {'user': getattr(current_user, 'id', None), 'kind': kind, 'force': force})
+    return jsonify({'scheduled': jobs}), 202
+
+
 @ai_bp.route('/recommend', methods=['GET'])
 def recommend():
     ip = request.headers.get('X-Forwarded-For', request.remote_addr)
@@ -145,6 +165,102 @@ def recommend_hybrid():
     return jsonify({'items': items})
 
 
+def _json_object() -> dict:
+    """The JSON request body as a dict (``{}`` if absent); ValueError for arrays or scalars."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError('JSON body must be an object')
+    return data
+
+
+def _search_filters() -> dict:
+    """``min_price``/``max_price``/``in_stock`` from the JSON body or query args."""
+    data = _json_object()
+    filters = {}
+    for name in ('min_price', 'max_price'):
+        raw = data.get(name, request.args.get(name))
+        if raw not in (None, ''):
+            try:
+                filters[name] = int(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f'invalid {name}')
+    flag = data.get('in_stock', request.args.get('in_stock'))
+    if flag is not None:
+        filters['in_stock'] = str(flag).lower() in ('1', 'true', 'yes', 'on')
+    return filters
+
+
+# An amount in a chat message. Bare numbers only count as prices when a
+# keyword sits right before them ('budget 100', 'di bawah 75.000'); otherwise
+# they need 'rp' or a unit, so '45 cm' or 'terpopuler 2024' are not budgets.
+_AMOUNT_RE = re.compile(
+    r'(?P<kw>\b(?:budget|bujet|harga(?:nya)?|bawah|atas|kisaran|maksimal|maks|max|minimal|min|mulai'
+    r'|sampai|hingga|dari)\b\s*(?:di\s+|:\s*)?)?'
+    r'(?P<rp>\brp\.?\s*)?(?P<num>\d+(?:[.,]\d+)*)(?:\s*(?P<unit>rb|ribu|k|jt|juta)\b)?'
+)
+# Joins the two ends of a range: '50-100rb', '50 sampai 100 ribu'
+_RANGE_RE = re.compile(r'\s*(?:-|–|sampai|hingga|s/d)\s*$')
+_PRICE_RE = re.compile(
+    r'\b(?:harga\w*|murah|mahal|budget|bujet|kisaran|berapa|bawah|atas|rp)\b|\d\s*(?:rb|ribu|k|jt|juta)\b'
+)
+# Words that make a single amount a lower bound ('di atas 50rb', not 'batas')
+_LOWER_BOUND_RE = re.compile(r'\b(?:atas|lebih\s+dari|minimal|mulai)\b')
+_UNITS = {'rb': 1_000, 'ribu': 1_000, 'k': 1_000, 'jt': 1_000_000, 'juta': 1_000_000}
+
+
+def _budget_filter(msg: str) -> dict:
+    """Price filter for a chat message such as 'budget 100 ribu' or '50-100rb'.
+
+    An amount needs 'rp', a unit (rb/ribu/k/jt/juta) or a price keyword
+    right before it; the low end of a range takes the unit of the high end
+    and a bare high end ('kisaran 100-200') the scale of the low end. One
+    amount is an upper bound unless preceded by 'atas'/'lebih dari'/
+    'minimal'/'mulai'; two amounts are a range. Bare amounts below 1000
+    are read as thousands of rupiah (single digits are ignored). Returns
+    ``{}`` when no amount is found.
+    """
+    m = msg.lower()
+    matches = list(_AMOUNT_RE.finditer(m))
+    amounts = []
+    prev = None  # (match, scale) of the last amount taken
+    for i, match in enumerate(matches):
+        num, unit = match.group('num'), match.group('unit')
+        nxt = matches[i + 1] if i + 1 < len(matches) else None
+        if not unit and nxt is not None and nxt.group('unit'):
+            if _RANGE_RE.match(m[match.end():nxt.start('rp') if nxt.group('rp') else nxt.start('num')]):
+                unit = nxt.group('unit')
+        if unit:
+            scale = _UNITS[unit]
+            value = float(num.replace(',', '.')) * scale
+        elif match.group('rp') or match.group('kw'):
+            value = float(re.sub('[.,]', '', num))
+            if value < 10:
+                # 'harga 2 gelang': a quantity, not a price
+                continue
+            scale = 1000 if value < 1000 else 1
+            value *= scale
+        elif (prev is not None and prev[0] is matches[i - 1]
+              and _RANGE_RE.match(m[prev[0].end():match.start('num')])):
+            # High end of a range: same scale as the low end
+            scale = prev[1]
+            value = float(re.sub('[.,]', '', num)) * scale
+        else:
+            continue
+        prev = (match, scale)
+        amounts.append((match.start('num'), int(value)))
+    if not amounts:
+        return {}
+    if len(amounts) >= 2:
+        lo, hi = sorted(v for _, v in amounts[:2])
+        return {'min_price': lo, 'max_price': hi}
+    start, value = amounts[0]
+    if _LOWER_BOUND_RE.search(m[:start]):
+        return {'min_price': value}
+    return {'max_price': value}
+
+
 @ai_bp.route('/search', methods=['GET'])
 def search():
     ip = request.headers.get('X-Forwarded-For', request.remote_addr)
@@ -153,8 +269,12 @@ def search():
     q = request.args.get('q')
     if not q:
         return jsonify({'error': 'q required'}), 400
+    try:
+        filters = _search_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     idx = _get_indexer()
-    pairs = idx.query(q, k=10)
+    pairs = idx.query(q, k=10, **filters)
     ids = [pid for pid, _ in pairs]
     products = Product.query.filter(Product.id.in_(ids)).all()
     prod_map = {p.id: p for p in products}
@@ -172,6 +292,102 @@ def search():
     return jsonify({'items': items})
 
 
+def _item(p):
+    return {'id': p.id, 'name': p.name, 'price': p.price, 'image': p.image}
+
+
+def _batch_values(name: str):
+    """Read a batch parameter from a JSON list or a comma-separated query arg."""
+    data = _json_object()
+    values = data.get(name)
+    if values is None:
+        raw = request.args.get(name, '')
+        values = [v for v in raw.split(',') if v.strip()] if raw else []
+    if not isinstance(values, list):
+        raise ValueError(f'{name} must be a list')
+    if len(values) > int(current_app.config.get('AI_BATCH_MAX', 50)):
+        raise ValueError(f'too many {name}')
+    return values
+
+
+def _batch_product_ids():
+    try:
+        # int() raises TypeError for null or nested lists
+        return [int(v) for v in _batch_values('product_ids')]
+    except TypeError:
+        raise ValueError('invalid product_ids')
+
+
+def _batch_queries():
+    queries = _batch_values('queries')
+    # Same rule as /search's ``q``: text, not null/numbers/lists, and not blank
+    if any(not isinstance(q, str) or not q.strip() for q in queries):
+        raise ValueError('queries must be non-empty strings')
+    return queries
+
+
+@ai_bp.route('/search_batch', methods=['GET', 'POST'])
+def search_batch():
+    ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    if not _rate_limit(f"searchb:{ip}"):
+        return jsonify({'error': 'rate limit exceeded'}), 429
+    try:
+        queries = _batch_queries()
+        filters = _search_filters()
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not queries:
+        return jsonify({'error': 'queries required'}), 400
+    idx = _get_indexer()
+    all_pairs = idx.query_batch(queries, k=10, **filters)
+    ids_by_q = {i: [pid for pid, _ in pairs] for i, pairs in enumerate(all_pairs)}
+    wanted = {pid for ids in ids_by_q.values() for pid in ids}
+    products = Product.query.filter(Product.id.in_(wanted)).all() if wanted else []
+    pmap = {p.id: p for p in products}
+    results = [
+        {'q': q, 'items': [_item(pmap[pid]) for pid in ids_by_q[i] if pid in pmap]}
+        for i, q in enumerate(queries)
+    ]
+    _audit_log('search_batch', {'n': len(queries), 'ip': ip})
+    return jsonify({'results': results})
+
+
+@ai_bp.route('/recommend_batch', methods=['GET', 'POST'])
+def recommend_batch():
+    ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    if not _rate_limit(f"recb:{ip}"):
+        return jsonify({'error': 'rate limit exceeded'}), 429
+    try:
+        pids = _batch_product_ids()
+    except (TypeError, ValueError):
+        return jsonify({'error': 'invalid product_ids'}), 400
+    if not pids:
+        return jsonify({'error': 'product_ids required'}), 400
+    idx = _get_indexer()
+    recs = Recommender(idx).recommend_for_products(pids, k=5)
+    results = [{'product_id': pid, 'items': [_item(p) for p in recs.get(pid, [])]} for pid in pids]
+    _audit_log('recommend_batch', {'n': len(pids), 'ip': ip})
+    return jsonify({'results': results})
+
+
+@ai_bp.route('/recommend_hybrid_batch', methods=['GET', 'POST'])
+def recommend_hybrid_batch():
+    ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    if not _rate_limit(f"rechb:{ip}"):
+        return jsonify({'error': 'rate limit exceeded'}), 429
+    try:
+        pids = _batch_product_ids()
+    except (TypeError, ValueError):
+        return jsonify({'error': 'invalid product_ids'}), 400
+    if not pids:
+        return jsonify({'error': 'product_ids required'}), 400
+    idx = _get_indexer()
+    recs = Recommender(idx).hybrid_for_products(pids, k=8)
+    results = [{'product_id': pid, 'items': [_item(p) for p in recs.get(pid, [])]} for pid in pids]
+    _audit_log('recommend_hybrid_batch', {'n': len(pids), 'ip': ip})
+    return jsonify({'results': results})
+
+
 @ai_bp.route('/generate_image', methods=['POST'])
 @login_required
 def generate_image_endpoint():
@@ -212,8 +428,11 @@ def chat():
     Response JSON:
         { "reply": "string", "suggestions": [ {id,name,price,image} ] }
     """
-    data = request.get_json(silent=True) or {}
-    msg = (data.get('message') or '').strip()
+    try:
+        data = _json_object()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    msg = str(data.get('message') or '').strip()
     if not msg:
         return jsonify({"error": "message required"}), 400
 
@@ -222,9 +441,14 @@ def chat():
     history.append({"role": "user", "content": msg})
     history = history[-10:]
 
-    # Use embedding indexer to retrieve relevant products
+    # Use embedding indexer to retrieve relevant products; a budget in the
+    # message is pushed into the search so all suggestions fit it
     idx = _get_indexer()
-    pairs = idx.query(msg, k=5)
+    budget = _budget_filter(msg) if _PRICE_RE.search(msg.lower()) else {}
+    pairs = idx.query(msg, k=5, in_stock=bool(budget), **budget) if budget else []
+    if not pairs:
+        # Nothing fits the budget (or it was misread): suggest without filters
+        pairs = idx.query(msg, k=5)
     ids = [pid for pid, _ in pairs]
     products = Product.query.filter(Product.id.in_(ids)).all() if ids else []
     prod_map = {p.id: p for p in products}
@@ -533,9 +757,13 @@ def visual_search():
     if 'image' not in request.files:
         return jsonify({'error': 'image file required'}), 400
     f = request.files['image']
+    cfg = current_app.config
     try:
-        from PIL import Image  # lazy import
-        img = Image.open(f.stream).convert('RGB')
+        # Decoded at a small working size; the pixel guard runs on the header alone
+        img = load_image(f.stream, work_size=cfg.get('VISION_WORK_SIZE', WORK_SIZE),
+                         max_pixels=cfg.get('VISION_MAX_PIXELS', MAX_PIXELS))
+    except ImageTooLarge:
+        return jsonify({'error': 'image too large'}), 413
     except Exception:
         return jsonify({'error': 'invalid image'}), 400
 
@@ -566,10 +794,19 @@ def recommend_for_user():
     if not _rate_limit(f"recu:{ip}"):
         return jsonify({'error': 'rate limit exceeded'}), 429
     sid = session.get('sid')
-    if not sid:
+    uid = current_user.id if current_user.is_authenticated else None
+    owner = owner_key(uid, sid)
+    if not owner:
         return jsonify({'items': []})
     idx = _get_indexer()
-    ids = idx.personalized(sid, k=8)
+    profile = load_profile(owner)
+    if profile and profile.weights:
+        ids = idx.recommend_from_weights(profile.weights, k=8, cache_key=(owner, profile.events))
+    elif sid:
+        # Sessions whose events predate taste profiles
+        ids = idx.personalized(sid, k=8)
+    else:
+        ids = []
     if not ids:
         return jsonify({'items': []})
     products = Product.query.filter(Product.id.in_(ids)).all()
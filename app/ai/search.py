@@ -0,0 +1,231 @@
+"""Exact cosine top-k search over an in-memory (or memory-mapped) matrix.
+
+Rows are L2-normalized once when the index is built, so scoring a query is a
+single matrix-vector product (one GEMM for a batch of queries) and cosine
+distance is ``1 - dot``. The k best rows are picked with ``argpartition``
+(linear time) and only those k are sorted.
+
+A boolean row mask (e.g. price range or in-stock, see
+``EmbeddingIndexer.query``) is applied to the scores before selection, so
+filtered searches still return the k best matching rows.
+
+Matrices may also be SciPy CSR (TF-IDF rows are almost all zeros); they stay
+sparse and are scored with a sparse product.
+"""
+import sys
+
+import numpy as np
+
+
+def _sparse_module():
+    """``scipy.sparse`` once something (scikit-learn, a sparse file) imported it, else None.
+
+    Nothing can be a CSR matrix before that, so the (slow) import is never
+    paid just to find out that a matrix is dense.
+    """
+    return sys.modules.get('scipy.sparse')
+
+
+def is_sparse(matrix) -> bool:
+    if isinstance(matrix, StackedRows):
+        matrix = matrix.base
+    sp = _sparse_module()
+    return sp is not None and sp.issparse(matrix)
+
+
+def take_rows(matrix, rows):
+    """Rows of a dense or CSR matrix (or :class:`StackedRows`), as the same kind of matrix."""
+    if isinstance(matrix, StackedRows):
+        return matrix.take(rows)
+    if is_sparse(matrix):
+        return matrix.tocsr()[rows]
+    return np.ascontiguousarray(np.asarray(matrix)[rows], dtype=np.float32)
+
+
+def vstack_rows(*mats):
+    """Stack dense or CSR matrices vertically (CSR if any input is sparse)."""
+    if any(is_sparse(m) for m in mats):
+        return _sparse_module().vstack(mats, format='csr', dtype=np.float32)
+    return np.vstack(mats).astype(np.float32, copy=False)
+
+
+def materialize_rows(matrix):
+    """``matrix`` as one dense or CSR matrix (a :class:`StackedRows` is gathered)."""
+    if isinstance(matrix, StackedRows):
+        return matrix.take(np.arange(matrix.shape[0]))
+    return matrix
+
+
+class StackedRows:
+    """Rows picked from ``base`` and a few ``extra`` rows, without copying ``base``.
+
+    Row ``i`` is ``base[src[i]]``, or row ``src[i] - len(base)`` of
+    ``extra``. Catalog edits publish one of these, so the snapshot keeps
+    sharing the last fully built matrix (often a memory map) and only holds
+    the re-encoded rows; :func:`take_rows` reads from it and
+    :func:`materialize_rows` gathers it once the engine is rebuilt.
+    """
+
+    def __init__(self, base, extra, src):
+        self.base = base
+        self.extra = extra
+        self.src = np.asarray(src, dtype=np.intp)
+        self.shape = (len(self.src), base.shape[1])
+
+    @classmethod
+    def select(cls, matrix, rows, extra=None) -> 'StackedRows':
+        """Rows ``rows`` of ``matrix`` with ``extra`` stacked below it.
+
+        A ``StackedRows`` input shares its base; only its extra rows and
+        ``extra`` are stacked, so the cost grows with the edits, not the
+        catalog.
+        """
+        if isinstance(matrix, cls):
+            base, more, src = matrix.base, matrix.extra, matrix.src
+        else:
+            base, more, src = matrix, None, np.arange(matrix.shape[0])
+        if extra is not None and extra.shape[0]:
+            start = base.shape[0] + (more.shape[0] if more is not None else 0)
+            src = np.concatenate([src, start + np.arange(extra.shape[0])])
+            more = extra if more is None else vstack_rows(more, extra)
+        return cls(base, more, src[np.asarray(rows, dtype=np.intp)])
+
+    def take(self, rows):
+        """Rows ``rows``, as the same kind of matrix as ``base``."""
+        src = self.src[np.asarray(rows, dtype=np.intp)]
+        n = self.base.shape[0]
+        old = src < n
+        if old.all():
+            return take_rows(self.base, src.tolist())
+        if not old.any():
+            return take_rows(self.extra, (src - n).tolist())
+        parts = vstack_rows(take_rows(self.base, src[old].tolist()), take_rows(self.extra, (src[~old] - n).tolist()))
+        where = np.empty(len(src), dtype=np.intp)
+        where[old] = np.arange(int(old.sum()))
+        where[~old] = int(old.sum()) + np.arange(int((~old).sum()))
+        return take_rows(parts, where.tolist())
+
+
+def l2_normalize(matrix):
+    """Return ``matrix`` as float32 with unit-length rows (zero rows stay zero).
+
+    CSR input stays CSR.
+    """
+    if is_sparse(matrix):
+        sp = _sparse_module()
+        m = sp.csr_matrix(matrix, dtype=np.float32)
+        norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms) @ m, dtype=np.float32)
+    m = np.asarray(matrix, dtype=np.float32)
+    if m.ndim == 1:
+        m = m.reshape(1, -1)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def top_k(scores: np.ndarray, k: int, mask: np.ndarray | None = None):
+    """Indices and values of the ``k`` largest entries per row, best first.
+
+    ``mask`` (one bool per column) restricts the selection to the ``True``
+    columns, so fewer than ``k`` come back only if fewer are allowed;
+    excluded entries of ``scores`` are overwritten in place.
+    """
+    n = scores.shape[1]
+    k = min(k, n)
+    if mask is not None:
+        scores[:, ~mask] = -np.inf
+        k = min(k, int(np.count_nonzero(mask)))
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.intp), empty.astype(scores.dtype)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    inds = np.take_along_axis(part, order, axis=1)
+    return inds, np.take_along_axis(part_scores, order, axis=1)
+
+
+class CosineIndex:
+    """Brute-force cosine index with a ``NearestNeighbors``-style API.
+
+    ``matrix`` rows must already be unit length (see :func:`l2_normalize`);
+    it is used as-is, so a read-only memmap stays shared rather than copied
+    and a CSR matrix stays sparse.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix if is_sparse(matrix) else np.asarray(matrix, dtype=np.float32)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, queries) -> np.ndarray:
+        """Cosine similarity of each query (row) against every indexed row."""
+        q = l2_normalize(queries)
+        if is_sparse(self.matrix):
+            s = self.matrix @ q.T
+            s = s.toarray() if is_sparse(s) else np.asarray(s)
+            return np.ascontiguousarray(s.T)
+        if is_sparse(q):
+            q = q.toarray()
+        return q @ self.matrix.T
+
+    def kneighbors(self, queries, n_neighbors: int = 10, mask: np.ndarray | None = None):
+        """Return ``(distances, indices)`` of shape ``(len(queries), k)``.
+
+        With ``mask`` only rows where it is ``True`` are candidates.
+        """
+        inds, sims = top_k(self.scores(queries), n_neighbors, mask)
+        return 1.0 - sims, inds
+
+
+class PatchedIndex:
+    """A built engine plus rows edited since, with the ``kneighbors`` API.
+
+    Catalog edits publish one of these instead of rebuilding the configured
+    engine (IVF lists, int8 codes, shard workers) right away. ``base``
+    answers for its rows that are still current; ``rows`` maps each of them
+    to its position in the new ``matrix`` (-1 once edited or removed). The
+    ``added`` rows of ``matrix`` (new or edited since) are scanned exactly
+    and the two top-k lists merged.
+    """
+
+    def __init__(self, base, rows, matrix, added):
+        self.base = base
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.added = np.asarray(added, dtype=np.intp)
+        self.delta = CosineIndex(take_rows(matrix, self.added.tolist())) if len(self.added) else None
+        self._n = matrix.shape[0]
+        self._live = self.rows >= 0
+
+    def __len__(self):
+        return self._n
+
+    def kneighbors(self, queries, n_neighbors: int = 10, mask: np.ndarray | None = None):
+        """Return ``(distances, indices)`` of shape ``(len(queries), k)``; see ``CosineIndex``."""
+        if mask is None:
+            base_mask = None if self._live.all() else self._live
+        else:
+            mask = np.asarray(mask, dtype=bool)
+            base_mask = self._live & mask[np.maximum(self.rows, 0)]
+        dists, inds = [], []
+        if base_mask is None or base_mask.any():
+            d, i = self.base.kneighbors(queries, n_neighbors=n_neighbors, mask=base_mask)
+            dists.append(np.asarray(d, dtype=np.float32))
+            inds.append(self.rows[np.asarray(i, dtype=np.intp)])
+        part = None if mask is None else mask[self.added]
+        if self.delta is not None and (part is None or part.any()):
+            d, i = self.delta.kneighbors(queries, n_neighbors=n_neighbors, mask=part)
+            dists.append(np.asarray(d, dtype=np.float32))
+            inds.append(self.added[np.asarray(i, dtype=np.intp)])
+        if not dists:
+            return (np.zeros((queries.shape[0], 0), dtype=np.float32),
+                    np.zeros((queries.shape[0], 0), dtype=np.intp))
+        dists, inds = np.hstack(dists), np.hstack(inds)
+        best, neg = top_k(-dists, n_neighbors)
+        return -neg, np.take_along_axis(inds, best, axis=1)
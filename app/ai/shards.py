@@ -0,0 +1,177 @@
+"""Sharded scatter-gather search across local worker processes.
+
+One process scanning the whole matrix uses one core per query. A
+``ShardedIndex`` splits the rows into contiguous shards and gives each to
+its own worker process, which keeps a local engine (exact or int8) over its
+slice. A query batch is sent to every shard at once, each returns its local
+top-k, and the coordinator merges them into the global top-k, so throughput
+grows with the number of cores on large catalogs.
+
+The workers live in a ``ShardPool`` that outlives any one snapshot: they
+are started once and each new snapshot's rows are sent to them as a new
+*generation*, so rebuilds don't fork. A worker keeps the two newest
+generations, so queries still running on the previous snapshot finish
+while the next one loads; a query whose generation is already gone (or
+whose pool was closed) is answered by an exact scan in this process.
+"""
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .pools import mp_context
+from .quant import QuantizedIndex
+from .search import CosineIndex, is_sparse, top_k
+
+# Generation -> engine, in each worker process (see ``_load_shard``)
+_SHARDS: Dict[int, object] = {}
+# Generations a worker keeps: the live snapshot's and the one before it
+_KEEP_GENERATIONS = 2
+
+
+def _init_worker():
+    try:  # One BLAS thread per worker: the shards are the parallelism
+        from threadpoolctl import threadpool_limits  # type: ignore
+        threadpool_limits(1)
+    except Exception:
+        pass
+
+
+def _load_shard(generation: int, matrix, engine: str, rescore: int) -> int:
+    if engine == 'int8' and not is_sparse(matrix):
+        _SHARDS[generation] = QuantizedIndex(matrix, rescore=rescore)
+    else:
+        _SHARDS[generation] = CosineIndex(matrix)
+    for old in sorted(_SHARDS)[:-_KEEP_GENERATIONS]:
+        del _SHARDS[old]
+    return len(_SHARDS[generation])
+
+
+def _shard_search(generation: int, queries, k: int, mask: Optional[np.ndarray]):
+    return _SHARDS[generation].kneighbors(queries, n_neighbors=k, mask=mask)
+
+
+def _shutdown(executors: List[ProcessPoolExecutor]):
+    for ex in executors:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+def shard_bounds(n: int, shards: int) -> List[tuple]:
+    """``[(start, end), ...]`` splitting ``n`` rows into ``shards`` near-equal ranges."""
+    edges = np.linspace(0, n, max(1, min(shards, n)) + 1).astype(int)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+class ShardPool:
+    """``size`` long-lived single-worker processes that hold successive shard generations."""
+
+    def __init__(self, size: int):
+        ctx = mp_context()
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_init_worker)
+            for _ in range(max(1, size))
+        ]
+        self._finalizer = weakref.finalize(self, _shutdown, self._executors)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._executors)
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def load(self, matrix, bounds: List[tuple], engine: str, rescore: int) -> int:
+        """Send ``matrix[s:e]`` for each of ``bounds`` to its worker; returns the new generation."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        futures = [ex.submit(_load_shard, generation, matrix[s:e], engine, rescore)
+                   for (s, e), ex in zip(bounds, self._executors)]
+        if [f.result() for f in futures] != [e - s for s, e in bounds]:
+            raise RuntimeError('shard workers did not load their rows')
+        return generation
+
+    def search(self, shard: int, generation: int, queries, k: int, mask: Optional[np.ndarray]):
+        return self._executors[shard].submit(_shard_search, generation, queries, k, mask)
+
+    def close(self):
+        """Stop the worker processes (also done on garbage collection)."""
+        self._finalizer()
+
+
+class ShardedIndex:
+    """Scatter-gather index over ``shards`` worker processes, with the ``kneighbors`` API.
+
+    ``matrix`` rows must be unit length (dense or CSR); ``engine`` is the
+    per-shard engine, ``'exact'`` or ``'int8'`` (dense only). Pass a shared
+    ``pool`` to load into its workers; otherwise the index starts (and on
+    :meth:`close` stops) its own.
+    """
+
+    def __init__(self, matrix, shards: int = 2, engine: str = 'exact', rescore: int = 4,
+                 pool: Optional[ShardPool] = None):
+        n = matrix.shape[0]
+        if is_sparse(matrix):
+            matrix = matrix.tocsr()
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else ShardPool(shards)
+        self.bounds = shard_bounds(n, min(shards, self.pool.size))
+        self._n = n
+        # Kept (not copied) for the in-process fallback
+        self._matrix = matrix
+        self._local = None
+        try:
+            self.generation = self.pool.load(matrix, self.bounds, engine, rescore)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def shards(self) -> int:
+        return len(self.bounds)
+
+    def __len__(self):
+        return self._n
+
+    def close(self):
+        """Stop the worker processes if this index started them."""
+        if self._owns_pool:
+            self.pool.close()
+
+    def _fallback(self, queries, n_neighbors, mask):
+        if self._local is None:
+            self._local = CosineIndex(self._matrix)
+        return self._local.kneighbors(queries, n_neighbors=n_neighbors,
+                                      mask=None if mask is None else mask.copy())
+
+    def kneighbors(self, queries, n_neighbors: int = 10, mask: Optional[np.ndarray] = None):
+        """Return ``(distances, indices)`` of shape ``(len(queries), k)``; see ``CosineIndex``."""
+        if self.pool.closed:
+            return self._fallback(queries, n_neighbors, mask)
+        futures = []
+        try:
+            for shard, (s, e) in enumerate(self.bounds):
+                part = None if mask is None else np.ascontiguousarray(mask[s:e])
+                if part is not None and not part.any():
+                    continue
+                futures.append((s, self.pool.search(shard, self.generation, queries, n_neighbors, part)))
+            if not futures:
+                return (np.zeros((queries.shape[0], 0), dtype=np.float32),
+                        np.zeros((queries.shape[0], 0), dtype=np.intp))
+            dists, inds = [], []
+            for s, fut in futures:
+                d, i = fut.result()
+                dists.append(np.asarray(d, dtype=np.float32))
+                inds.append(np.asarray(i, dtype=np.intp) + s)
+        except Exception:
+            # Pool closed or this generation already dropped by a newer snapshot
+            return self._fallback(queries, n_neighbors, mask)
+        dists, inds = np.hstack(dists), np.hstack(inds)
+        # Merge the local top-k lists: best (smallest distance) first
+        best, neg = top_k(-dists, n_neighbors)
+        return -neg, np.take_along_axis(inds, best, axis=1)
@@ -0,0 +1,224 @@
+"""Binary encodings for persisted embedding vectors.
+
+Vectors are stored as packed little-endian float32 bytes, one BLOB per row,
+tagged with their dimension, dtype and the model that produced them. A batch
+of rows decodes with a single ``frombuffer`` into one contiguous matrix, with
+no per-element parsing.
+
+Whole matrices can also be written as a memory-mapped file under
+``VECTOR_DB_PATH`` so every worker process shares the same page-cache pages.
+The layout is a magic string, a length-prefixed JSON header and 64-byte
+aligned row-major float32 data; ids live in a ``.ids`` sidecar that starts
+with the same random stamp as the header, so a reader racing a writer can
+tell the two files apart and treat the pair as a miss.
+
+The same file can instead hold a CSR matrix (``layout: csr`` in the
+header): ``indptr``, ``indices`` and ``data`` are stored as consecutive
+aligned sections and mapped individually, which keeps mostly-empty rows
+(e.g. colour histograms) small on disk.
+
+Sparse (TF-IDF) matrices are written as a single ``.npz`` holding the CSR
+arrays, the ids and whatever the caller needs to rebuild its vectorizer.
+"""
+import json
+import os
+import re
+import struct
+import tempfile
+import uuid
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTOR_DTYPE = 'float32'
+_NP_DTYPE = np.dtype('<f4')
+
+
+def pack_matrix(matrix) -> List[bytes]:
+    """Encode each row of a 2-D array-like as float32 bytes."""
+    m = np.ascontiguousarray(matrix, dtype=_NP_DTYPE)
+    if m.ndim == 1:
+        m = m.reshape(1, -1)
+    return [row.tobytes() for row in m]
+
+
+def unpack_matrix(blobs: Sequence[bytes], dim: int) -> np.ndarray:
+    """Decode float32 row BLOBs into one contiguous ``(len(blobs), dim)`` array."""
+    if not blobs:
+        return np.zeros((0, dim), dtype=np.float32)
+    buf = b''.join(blobs)
+    return np.frombuffer(buf, dtype=_NP_DTYPE).reshape(len(blobs), dim)
+
+
+_MAGIC = b'CWVEC001'
+_ALIGN = 64
+
+
+def matrix_file_path(persist_dir, prefix: str, model: str, ext: str = '.vec') -> str:
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model or 'default')
+    return os.path.join(str(persist_dir), f'{prefix}-{slug}{ext}')
+
+
+def _atomic_write(path: str, chunks: Iterable[bytes]):
+    """Write to a temp file in the same directory, then rename over ``path``."""
+    d = os.path.dirname(path) or '.'
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _csr_sections(m, idx: str):
+    """``[(name, array), ...]`` of a CSR matrix in file order."""
+    return [
+        ('indptr', np.ascontiguousarray(m.indptr, dtype=idx)),
+        ('indices', np.ascontiguousarray(m.indices, dtype=idx)),
+        ('data', np.ascontiguousarray(m.data, dtype=_NP_DTYPE)),
+    ]
+
+
+def write_matrix_file(path: str, matrix, ids: Sequence[int], **meta):
+    """Atomically persist ``matrix`` (rows aligned with ``ids``) for mmap loading.
+
+    A SciPy sparse ``matrix`` is written in the CSR layout.
+    """
+    stamp = uuid.uuid4().hex
+    if hasattr(matrix, 'tocsr'):
+        m = matrix.tocsr()
+        # What SciPy would pick, so mapped index arrays are used without a copy
+        idx = '<i4' if m.nnz < 2 ** 31 else '<i8'
+        sections = _csr_sections(m, idx)
+        header = dict(meta, layout='csr', nnz=int(m.nnz), index_dtype=idx)
+    else:
+        m = np.ascontiguousarray(matrix, dtype=_NP_DTYPE)
+        if m.ndim != 2:
+            raise ValueError('matrix must be 2-D')
+        sections = [('data', m)]
+        header = dict(meta)
+    if m.shape[0] != len(ids):
+        raise ValueError('matrix rows must align with ids')
+    header.update(rows=int(m.shape[0]), dim=int(m.shape[1]), dtype=VECTOR_DTYPE, stamp=stamp)
+    hbytes = json.dumps(header).encode('utf-8')
+    prefix = _MAGIC + struct.pack('<I', len(hbytes)) + hbytes
+    chunks = [prefix, b'\0' * ((-len(prefix)) % _ALIGN)]
+    for _, arr in sections:
+        chunks.append(arr.tobytes())
+        chunks.append(b'\0' * ((-arr.nbytes) % _ALIGN))
+    _atomic_write(path + '.ids', [bytes.fromhex(stamp), np.asarray(ids, dtype='<i8').tobytes()])
+    _atomic_write(path, chunks)
+
+
+def _map_csr(f, offset: int, header: dict):
+    import scipy.sparse as sp  # type: ignore
+    rows, nnz, idx = int(header['rows']), int(header['nnz']), header['index_dtype']
+    if idx not in ('<i4', '<i8'):
+        raise ValueError('bad index dtype')
+    arrays = {}
+    for name, dtype, count in (('indptr', idx, rows + 1), ('indices', idx, nnz), ('data', _NP_DTYPE, nnz)):
+        dtype = np.dtype(dtype)
+        arrays[name] = (np.memmap(f, dtype=dtype, mode='r', offset=offset, shape=(count,))
+                        if count else np.zeros(0, dtype=dtype))
+        offset += count * dtype.itemsize
+        offset += (-offset) % _ALIGN
+    indptr = arrays['indptr']
+    if indptr[0] != 0 or indptr[-1] != nnz or np.any(np.diff(indptr) < 0):
+        raise ValueError('corrupt CSR index')
+    return sp.csr_matrix((arrays['data'], arrays['indices'], indptr),
+                         shape=(rows, int(header['dim'])), copy=False)
+
+
+def read_matrix_file(path: str) -> Optional[Tuple[List[int], np.ndarray, dict]]:
+    """Map a file written by :func:`write_matrix_file` read-only.
+
+    Returns ``(ids, matrix, header)`` or None if the files are missing,
+    malformed, or from two different writes. CSR files come back as a
+    ``csr_matrix`` over mapped arrays.
+    """
+    try:
+        # Map from the same open file the header came from, so a concurrent
+        # rename cannot pair this header with another write's data.
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                return None
+            (hlen,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(hlen).decode('utf-8'))
+            offset = len(_MAGIC) + 4 + hlen
+            offset += (-offset) % _ALIGN
+            with open(path + '.ids', 'rb') as idf:
+                stamp = idf.read(16).hex()
+                ids = np.frombuffer(idf.read(), dtype='<i8').tolist()
+            rows, dim = int(header['rows']), int(header['dim'])
+            if stamp != header['stamp'] or len(ids) != rows or header.get('dtype') != VECTOR_DTYPE:
+                return None
+            if header.get('layout') == 'csr':
+                return ids, _map_csr(f, offset, header), header
+            if rows == 0:
+                return ids, np.zeros((0, dim), dtype=np.float32), header
+            matrix = np.memmap(f, dtype=_NP_DTYPE, mode='r', offset=offset, shape=(rows, dim))
+        return ids, matrix, header
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+def write_arrays_file(path: str, **arrays):
+    """Atomically write named NumPy arrays as an ``.npz`` file."""
+    import io
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    _atomic_write(path, [buf.getvalue()])
+
+
+def read_arrays_file(path: str) -> Optional[dict]:
+    """Arrays from :func:`write_arrays_file`, or None if missing or unreadable."""
+    try:
+        with np.load(path, allow_pickle=False) as f:
+            return {k: f[k] for k in f.files}
+    except (OSError, ValueError):
+        return None
+
+
+def write_sparse_file(path: str, matrix, ids: Sequence[int], **arrays):
+    """Atomically persist a CSR ``matrix`` (rows aligned with ``ids``) plus extra arrays as ``.npz``."""
+    m = matrix.tocsr()
+    if m.shape[0] != len(ids):
+        raise ValueError('matrix rows must align with ids')
+    write_arrays_file(
+        path,
+        data=m.data.astype(_NP_DTYPE, copy=False),
+        indices=m.indices,
+        indptr=m.indptr,
+        shape=np.asarray(m.shape, dtype='<i8'),
+        ids=np.asarray(ids, dtype='<i8'),
+        **arrays,
+    )
+
+
+def read_sparse_file(path: str):
+    """Load a file written by :func:`write_sparse_file`.
+
+    Returns ``(ids, csr_matrix, arrays)`` or None if it is missing or unreadable.
+    """
+    import scipy.sparse as sp  # type: ignore
+    arrays = read_arrays_file(path)
+    if arrays is None:
+        return None
+    try:
+        shape = tuple(int(x) for x in arrays.pop('shape'))
+        m = sp.csr_matrix((arrays.pop('data'), arrays.pop('indices'), arrays.pop('indptr')), shape=shape)
+        ids = arrays.pop('ids').tolist()
+    except (KeyError, ValueError):
+        return None
+    if len(ids) != shape[0]:
+        return None
+    return ids, m, arrays
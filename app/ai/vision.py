@@ -1,37 +1,187 @@
 import os
 import json
-from typing import List, Tuple
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 from PIL import Image  # type: ignore
 
 from ..models import Product
+from .descriptors import get_descriptor, rgb_histogram
+from .pools import mp_context
+from .search import is_sparse, top_k
+from .store import matrix_file_path, read_arrays_file, read_matrix_file, write_arrays_file, write_matrix_file
+
+# Histograms with fewer non-zero bins than this are stored as CSR
+_SPARSE_MAX_DENSITY = 0.5
+
+# The default descriptor, kept under its old name
+_hist_feature = rgb_histogram
+
+# Images are decoded down to about this many pixels on the longest side
+# before feature extraction; colour histograms don't need more.
+WORK_SIZE = 256
+# Larger images are refused before any pixel data is decoded
+MAX_PIXELS = 50_000_000
+# Modes ``Image.reduce`` handles directly; palette images (averaging indices
+# is meaningless) and alpha modes (premultiplied at full size) convert first
+_REDUCE_MODES = ('L', 'RGB', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F')
+
+
+# Builds with fewer images than this to describe stay in-process
+_PARALLEL_MIN = 32
+
+
+class ImageTooLarge(ValueError):
+    """The image header declares more than the allowed number of pixels."""
+
+
+def load_image(fp, work_size: int = WORK_SIZE, max_pixels: int = MAX_PIXELS) -> Image.Image:
+    """Open ``fp`` (a path or file object) as RGB at roughly ``work_size`` px.
+
+    Only the header is read before the ``max_pixels`` check (Pillow's own
+    decompression-bomb limit is reported as :class:`ImageTooLarge` too).
+    JPEGs are then decoded in draft mode, which scales by 1/2, 1/4 or 1/8
+    inside the decoder so the full-size buffer is never allocated; other
+    formats are shrunk with ``Image.reduce`` (a box filter by an integer
+    factor), before the RGB conversion for greyscale and other plain modes.
+    Either way the result is between ``work_size`` and about twice that on
+    its longest side; ``0`` disables the reduction.
+    """
+    try:
+        img = Image.open(fp)
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLarge(str(exc)) from exc
+    w, h = img.size
+    if max_pixels and w * h > max_pixels:
+        img.close()
+        raise ImageTooLarge(f'{w}x{h} image exceeds {max_pixels} pixels')
+    if work_size:
+        img.draft('RGB', (work_size, work_size))
+    factor = max(img.size) // work_size if work_size else 1
+    if factor > 1 and img.mode in _REDUCE_MODES:
+        # Shrink first so the conversion only touches the reduced pixels
+        img, factor = img.reduce(factor), 1
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if factor > 1:
+        img = img.reduce(factor)
+    img.load()  # decode now, so corrupt data fails here rather than in the descriptor
+    return img
+
+
+def _describe(job) -> Optional[np.ndarray]:
+    """Feature of one image file, or None if it can't be read (runs in build workers)."""
+    path, descriptor, work_size, max_pixels = job
+    try:
+        with load_image(path, work_size, max_pixels) as im:
+            return get_descriptor(descriptor)(im)
+    except Exception:
+        return None
 
 
-def _hist_feature(img: Image.Image) -> List[float]:
-    """Compute a simple normalized RGB histogram feature (768 dims)."""
-    img = img.convert('RGB')
-    hist = img.histogram()  # 256*3 bins
-    # Normalize L2
-    s = sum(float(x) * float(x) for x in hist) or 1.0
-    import math
-    norm = math.sqrt(s)
-    return [float(x) / norm for x in hist]
+def _source_key(image_name: str, path: str) -> Optional[str]:
+    """``name:size:mtime_ns`` of a product image, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f'{image_name}:{st.st_size}:{st.st_mtime_ns}'
 
 
-def _l2(a: List[float], b: List[float]) -> float:
-    return sum((x - y) * (x - y) for x, y in zip(a, b)) ** 0.5
+def _sources_digest(sources: Sequence[str]) -> str:
+    return hashlib.sha1('\n'.join(sources).encode('utf-8')).hexdigest()
+
+
+def nearest_l2(features: np.ndarray, sq_norms: np.ndarray, queries: np.ndarray, k: int):
+    """Euclidean top-``k`` rows of ``features`` per query row, closest first.
+
+    Uses ``|f - q|^2 = |f|^2 + |q|^2 - 2 f.q`` with the row norms
+    precomputed, so a query is one matrix-vector product plus an
+    ``argpartition``. ``features`` may be a CSR matrix. Returns
+    ``(distances, indices)``.
+    """
+    q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    dots = np.asarray(features @ q.T).T if is_sparse(features) else q @ features.T
+    d2 = sq_norms[None, :] - 2.0 * dots
+    d2 += np.einsum('ij,ij->i', q, q)[:, None]
+    inds, neg = top_k(-d2, k)
+    return np.sqrt(np.maximum(-neg, 0.0)), inds
+
+
+class _VisionSnapshot:
+    """Immutable ids + ``(n, dim)`` float32 feature matrix, swapped in with one assignment.
+
+    The matrix is dense, or CSR when it was loaded from a sparse feature file.
+    """
+
+    def __init__(self, ids: List[int], features, version: int = 0, sources: Optional[List[str]] = None):
+        self.ids = ids
+        # Source key per row (see ``_source_key``); None if unknown, e.g. legacy JSON
+        self.sources = sources
+        if is_sparse(features):
+            self.sq_norms = np.asarray(features.multiply(features).sum(axis=1), dtype=np.float32).ravel()
+        else:
+            features = np.ascontiguousarray(features, dtype=np.float32)
+            if features.ndim != 2:
+                features = features.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+            self.sq_norms = np.einsum('ij,ij->i', features, features)
+        self.features = features
+        self.version = version
 
 
 class VisionIndexer:
     """Very lightweight visual search using RGB histograms.
 
-    This avoids heavy dependencies and works entirely with Pillow.
+    This avoids heavy dependencies and works entirely with Pillow and
+    NumPy: features live in one contiguous float32 matrix and a query is
+    scored against all of them in a single vectorized pass. Builds
+    assemble a new snapshot and swap it in at the end, so queries keep
+    using the previous one while a rebuild runs.
+
+    The colour descriptor is pluggable (``descriptor``, see
+    ``descriptors.py``). Features persist as a binary, memory-mapped file
+    per descriptor (see ``store.py``) tagged with its version; mostly-empty
+    histograms are written in the CSR layout. A legacy
+    ``vision_features.json`` (RGB histograms) is read once and converted.
+
+    Product images and query uploads are both decoded through
+    :func:`load_image` at ``work_size``, so they are described at the same
+    scale and a huge image costs about as much as a small one.
+
+    Each row remembers its image's name, size and mtime, stored next to
+    the feature file. A build (``force`` included) only describes images
+    whose key changed, so adding a product costs one decode; when there
+    are many, they are spread over ``workers`` processes (0: one per CPU).
     """
 
-    def __init__(self, static_folder: str, persist_dir: str | None = None):
+    def __init__(self, static_folder: str, persist_dir: str | None = None, descriptor: str = 'rgb768',
+                 work_size: int = WORK_SIZE, max_pixels: int = MAX_PIXELS, workers: int = 0):
         self.static_folder = static_folder
         self.persist_dir = persist_dir
-        self.ids: List[int] = []
-        self.features: List[List[float]] = []
+        self.descriptor = get_descriptor(descriptor)
+        self.work_size = work_size
+        self.max_pixels = max_pixels
+        self.workers = workers or os.cpu_count() or 1
+        self._snap = _VisionSnapshot([], [])
+        self._build_lock = threading.Lock()
+
+    @property
+    def ids(self) -> List[int]:
+        return self._snap.ids
+
+    @property
+    def features(self) -> np.ndarray:
+        return self._snap.features
+
+    @property
+    def version(self) -> int:
+        return self._snap.version
+
+    def _publish(self, ids: List[int], features, sources: Optional[List[str]] = None):
+        self._snap = _VisionSnapshot(ids, features, self._snap.version + 1, sources)
 
     def _product_image_path(self, image_name: str) -> str:
         return os.path.join(
@@ -40,56 +190,144 @@ class VisionIndexer:
             image_name)
 
     def build_index(self, force: bool = False):
+        with self._build_lock:
+            self._build_index(force)
+
+    @property
+    def _feature_path(self) -> str | None:
+        if not self.persist_dir:
+            return None
+        return matrix_file_path(self.persist_dir, 'vision-features', self.descriptor.name)
+
+    @property
+    def _sources_path(self) -> str | None:
+        if not self.persist_dir:
+            return None
+        return matrix_file_path(self.persist_dir, 'vision-sources', self.descriptor.name, ext='.npz')
+
+    def _load_features(self):
+        """``(ids, matrix, sources)`` from the feature file (or legacy JSON), else None.
+
+        ``sources`` is None when the per-row image keys are missing or don't
+        belong to this feature file.
+        """
+        loaded = read_matrix_file(self._feature_path)
+        if loaded:
+            ids, matrix, header = loaded
+            if (header.get('feature') == self.descriptor.name
+                    and header.get('feature_version') == self.descriptor.version and ids):
+                sources = None
+                if header.get('work_size') == self.work_size:
+                    arrays = read_arrays_file(self._sources_path) or {}
+                    keys = arrays.get('sources')
+                    if keys is not None and len(keys) == len(ids):
+                        keys = keys.tolist()
+                        if _sources_digest(keys) == header.get('sources'):
+                            sources = keys
+                return ids, matrix, sources
+        legacy = os.path.join(self.persist_dir, 'vision_features.json')
+        if self.descriptor.name == 'rgb768' and os.path.isfile(legacy):
+            try:
+                with open(legacy, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                ids, feats = data.get('ids', []), data.get('features', [])
+                if ids and feats:
+                    matrix = np.asarray(feats, dtype=np.float32)
+                    self._persist_features(ids, matrix)
+                    return ids, matrix, None
+            except Exception:
+                pass
+        return None
+
+    def _persist_features(self, ids: List[int], matrix: np.ndarray, sources: Optional[List[str]] = None):
+        if not self._feature_path:
+            return
+        try:
+            meta = {}
+            if sources is not None:
+                # Written first; the digest in the feature header ties the pair together
+                write_arrays_file(self._sources_path, sources=np.asarray(sources, dtype=str))
+                meta = {'sources': _sources_digest(sources), 'work_size': self.work_size}
+            if matrix.size and np.count_nonzero(matrix) < _SPARSE_MAX_DENSITY * matrix.size:
+                import scipy.sparse as sp  # type: ignore
+                matrix = sp.csr_matrix(matrix)
+            write_matrix_file(self._feature_path, matrix, ids, feature=self.descriptor.name,
+                              feature_version=self.descriptor.version, **meta)
+        except Exception:
+            pass
+
+    def _catalog_images(self) -> List[Tuple[int, str]]:
+        """``(product id, image name)`` of every product with an image, by id."""
+        return [(p.id, p.image) for p in Product.query.order_by(Product.id).all() if p.image]
+
+    def _describe_all(self, paths: List[str]) -> List[Optional[np.ndarray]]:
+        """Features of ``paths`` (None where unreadable), in a process pool when worthwhile."""
+        jobs = [(path, self.descriptor.name, self.work_size, self.max_pixels) for path in paths]
+        workers = min(self.workers, len(jobs))
+        if workers < 2 or len(jobs) < _PARALLEL_MIN:
+            return [_describe(job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context()) as ex:
+            return list(ex.map(_describe, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    def _build_index(self, force: bool):
         # Try load cache first
-        cache_path = None
         if self.persist_dir:
             os.makedirs(self.persist_dir, exist_ok=True)
-            cache_path = os.path.join(self.persist_dir, 'vision_features.json')
-            if not force and os.path.isfile(cache_path):
-                try:
-                    with open(cache_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    self.ids = data.get('ids', [])
-                    self.features = data.get('features', [])
-                    if self.ids and self.features:
-                        return
-                except Exception:
-                    pass
-
-        # Build fresh
+            if not force:
+                loaded = self._load_features()
+                if loaded:
+                    self._publish(*loaded)
+                    return
+
+        # Rows whose image is unchanged are reused from the live snapshot,
+        # or else from the feature file
+        prev = self._snap
+        if prev.sources is None and self.persist_dir:
+            loaded = self._load_features()
+            if loaded and loaded[2] is not None:
+                prev = _VisionSnapshot(loaded[0], loaded[1], sources=loaded[2])
+        cached: Dict[str, int] = {key: row for row, key in enumerate(prev.sources or [])}
+
         ids: List[int] = []
-        feats: List[List[float]] = []
-        for p in Product.query.order_by(Product.id).all():
-            if not p.image:
+        sources: List[str] = []
+        paths: List[str] = []
+        for pid, image in self._catalog_images():
+            path = self._product_image_path(image)
+            key = _source_key(image, path)
+            if key is None:
                 continue
-            path = self._product_image_path(p.image)
-            if not os.path.isfile(path):
-                continue
-            try:
-                with Image.open(path) as im:
-                    f = _hist_feature(im)
-                ids.append(p.id)
-                feats.append(f)
-            except Exception:
-                continue
-        self.ids = ids
-        self.features = feats
+            ids.append(pid)
+            sources.append(key)
+            paths.append(path)
 
-        # Save cache
-        if cache_path:
-            try:
-                with open(cache_path, 'w', encoding='utf-8') as f:
-                    json.dump({'ids': ids, 'features': feats}, f)
-            except Exception:
-                pass
+        dim = self.descriptor.dim
+        matrix = np.zeros((len(ids), dim), dtype=np.float32)
+        reuse = [(i, cached[key]) for i, key in enumerate(sources) if key in cached]
+        if reuse:
+            dst, src = (np.asarray(x, dtype=np.int64) for x in zip(*reuse))
+            rows = prev.features[src]
+            matrix[dst] = rows.toarray() if is_sparse(rows) else rows
+        reused = {i for i, _ in reuse}
+        todo = [i for i in range(len(ids)) if i not in reused]
+        keep = np.ones(len(ids), dtype=bool)
+        for i, f in zip(todo, self._describe_all([paths[i] for i in todo])):
+            if f is None:
+                keep[i] = False
+            else:
+                matrix[i] = f
+        if not keep.all():
+            matrix = matrix[keep]
+            ids = [pid for pid, k in zip(ids, keep) if k]
+            sources = [key for key, k in zip(sources, keep) if k]
+        self._publish(ids, matrix, sources)
+        self._persist_features(ids, matrix, sources)
 
     def query_image(self, img: Image.Image,
                     k: int = 8) -> List[Tuple[int, float]]:
         if not self.ids:
             self.build_index()
-        if not self.ids:
+        snap = self._snap
+        if not snap.ids:
             return []
-        q = _hist_feature(img)
-        scored = [(pid, _l2(q, f)) for pid, f in zip(self.ids, self.features)]
-        scored.sort(key=lambda x: x[1])
-        return scored[:k]
+        dists, inds = nearest_l2(snap.features, snap.sq_norms, self.descriptor(img), k)
+        return [(snap.ids[int(i)], float(d)) for d, i in zip(dists[0], inds[0])]
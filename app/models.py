@@ -50,3 +50,12 @@ class Event(db.Model):
 
     def __repr__(self):
         return f"<Event {self.event_type} u={self.user_id} s={self.session_id} p={self.product_id}>"
+
+
+class TasteProfileRecord(db.Model):
+    """Stored taste profile (see ``app/ai/profiles.py``): product ids and weights as packed arrays."""
+    __tablename__ = 'taste_profile'
+    owner = db.Column(db.String(100), primary_key=True)  # 'user:<id>' or 'session:<sid>'
+    events = db.Column(db.Integer, nullable=False)
+    product_ids = db.Column(db.LargeBinary, nullable=False)  # little-endian int64
+    weights = db.Column(db.LargeBinary, nullable=False)  # little-endian float32
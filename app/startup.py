@@ -0,0 +1,24 @@
+"""Cold-start timing for ``create_app``.
+
+``create_app`` calls :meth:`StartupTimer.mark` after each phase (config,
+extensions, blueprints, database, ...); the report is kept in
+``app.extensions['startup']``. ``benchmarks/bench_startup.py`` combines it
+with per-module import times so startup regressions are easy to spot.
+"""
+import time
+from typing import Dict, List
+
+
+class StartupTimer:
+    def __init__(self):
+        self._start = self._last = time.perf_counter()
+        self.phases: List[Dict[str, float]] = []
+
+    def mark(self, phase: str):
+        """Record the time since the previous mark as ``phase``."""
+        now = time.perf_counter()
+        self.phases.append({'phase': phase, 'seconds': round(now - self._last, 4)})
+        self._last = now
+
+    def report(self) -> dict:
+        return {'total_seconds': round(self._last - self._start, 4), 'phases': list(self.phases)}
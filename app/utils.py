@@ -79,6 +79,7 @@ def seed_db_from_json():
         return
     with open(data_path, 'r', encoding='utf-8') as f:
         items = json.load(f)
+    merged = []
     for it in items:
         prod = Product(
             id=int(it.get('id')) if it.get('id') else None,
@@ -88,8 +89,15 @@ def seed_db_from_json():
             image=it.get('image', ''),
             stock=int(it.get('stock', 0)),
         )
-        db.session.merge(prod)
+        merged.append(db.session.merge(prod))
     db.session.commit()
+    # Keep already built AI indices in step (only changed text is re-encoded)
+    try:
+        from flask import current_app
+        from .ai.registry import apply_product_changes
+        apply_product_changes(current_app, upserted=merged)
+    except Exception:
+        pass
     # Attempt to generate webp thumbnails for seeded images (best effort)
     try:
         for it in items:
@@ -108,10 +116,19 @@ def _ensure_session_id():
     return sid
 
 
+def _current_user_id():
+    try:
+        from flask_login import current_user  # type: ignore
+        return current_user.id if current_user.is_authenticated else None
+    except Exception:
+        return None
+
+
 def log_event(event_type: str, product_id: int | None = None):
     try:
         sid = _ensure_session_id()
-        ev = Event(session_id=sid, product_id=product_id, event_type=event_type, created_at=datetime.utcnow())
+        uid = _current_user_id()
+        ev = Event(session_id=sid, user_id=uid, product_id=product_id, event_type=event_type, created_at=datetime.utcnow())
         db.session.add(ev)
         db.session.commit()
     except Exception:
@@ -119,3 +136,21 @@ def log_event(event_type: str, product_id: int | None = None):
             db.session.rollback()
         except Exception:
             pass
+        return
+    if product_id is None:
+        return
+    # Keep the running taste profile in step with the event log
+    try:
+        from flask import current_app
+        from .ai.profiles import owner_key, record_interaction
+        record_interaction(
+            owner_key(uid, sid),
+            product_id,
+            half_life=current_app.config.get('PERSONALIZE_HALF_LIFE', 5.0),
+            max_items=current_app.config.get('PROFILE_MAX_ITEMS', 50),
+        )
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
@@ -0,0 +1,63 @@
+"""Recall@k vs latency: IVF-flat (app/ai/ann.py) against exact search.
+
+Generates clustered unit vectors (a Gaussian mixture, closer to real text
+embeddings than uniform noise), trains one IVF index and sweeps ``nprobe``.
+
+Usage:
+    python benchmarks/bench_ann.py --n 200000 --dim 384 --nprobe 1,4,8,16,32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.ann import IVFIndex, default_nlist  # noqa: E402
+from app.ai.search import CosineIndex, l2_normalize  # noqa: E402
+
+
+def _clustered(n, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return l2_normalize(centers[labels] + 1.5 * rng.standard_normal((n, dim), dtype=np.float32))
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=200000)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--nlist', type=int, default=0)
+    ap.add_argument('--nprobe', default='1,2,4,8,16,32')
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    mat = _clustered(args.n + args.queries, args.dim, 1000, rng)
+    mat, queries = mat[:args.n], mat[args.n:]
+
+    exact = CosineIndex(mat)
+    (_, truth), exact_s = _timed(lambda: exact.kneighbors(queries, args.k))
+    nlist = args.nlist or default_nlist(args.n)
+    ivf, train_s = _timed(lambda: IVFIndex(mat, nlist=nlist))
+
+    print(f"n={args.n} dim={args.dim} k={args.k} nlist={nlist} (train {train_s:.1f}s)")
+    print(f"{'index':<14}{'recall@k':>10}{'ms/query':>10}")
+    print(f"{'exact':<14}{1.0:>10.3f}{exact_s * 1000 / args.queries:>10.3f}")
+    for nprobe in [int(x) for x in args.nprobe.split(',')]:
+        ivf.nprobe = nprobe
+        (_, got), s = _timed(lambda: ivf.kneighbors(queries, args.k))
+        recall = np.mean([len(set(t) & set(g)) / args.k for t, g in zip(truth, got)])
+        print(f"{'ivf nprobe=' + str(nprobe):<14}{recall:>10.3f}{s * 1000 / args.queries:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Warm-boot benchmark: JSON-text vs float32-BLOB rows in ``embedding_cache``.
+
+Writes N random vectors into a throwaway SQLite file in both layouts, then
+times the read + decode step of a warm boot. The BLOB side runs the
+indexer's own code (``_load_cached_vectors`` then ``_encode_uncached`` with
+every row cached); the JSON side is the layout it replaced.
+
+Usage:
+    python benchmarks/bench_embedding_cache.py --n 20000 --dim 384
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+_TMP = tempfile.TemporaryDirectory()
+# The app binds its database at import, so point it at a throwaway file first
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP.name, 'bench.db')
+from app import app, db  # noqa: E402
+from app.ai.embeddings import EmbeddingIndexer  # noqa: E402
+from app.ai.store import VECTOR_DTYPE, pack_matrix  # noqa: E402
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=20000)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    mat = np.random.default_rng(0).standard_normal((args.n, args.dim)).astype(np.float32)
+    ids = list(range(1, args.n + 1))
+
+    texts = [f'product {i}' for i in ids]
+    hashes = {pid: EmbeddingIndexer._text_hash(t) for pid, t in zip(ids, texts)}
+
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer.__new__(EmbeddingIndexer)  # no model load; only the cache code is used
+        idx._model = None
+        idx._ensure_cache_table()
+        con = sqlite3.connect(os.path.join(_TMP.name, 'bench.db'))
+        con.execute("CREATE TABLE json_cache (product_id INTEGER PRIMARY KEY, vector TEXT NOT NULL)")
+
+        t0 = time.perf_counter()
+        for pid, row in zip(ids, mat):
+            con.execute("REPLACE INTO json_cache VALUES (?, ?)", (pid, json.dumps(row.tolist())))
+        con.commit()
+        json_write = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        con.executemany(
+            "REPLACE INTO embedding_cache(model, text_hash, dim, dtype, vector) VALUES (?, ?, ?, ?, ?)",
+            [(idx._cache_model, hashes[pid], args.dim, VECTOR_DTYPE, blob) for pid, blob in zip(ids, pack_matrix(mat))],
+        )
+        con.commit()
+        blob_write = time.perf_counter() - t0
+
+        def read_json():
+            rows = con.execute("SELECT product_id, vector FROM json_cache ORDER BY product_id").fetchall()
+            vec_map = {int(r[0]): json.loads(r[1]) for r in rows}
+            return np.asarray([vec_map[i] for i in ids], dtype=np.float32)
+
+        def read_blob():
+            pos, cached, _ = idx._load_cached_vectors([hashes[pid] for pid in ids], fetch_all=True)
+            embeddings, encoded = idx._encode_uncached(ids, texts, hashes, pos, cached)
+            assert not encoded
+            return embeddings
+
+        assert np.allclose(read_json(), read_blob())
+        json_read = _best_of(read_json, args.repeat)
+        blob_read = _best_of(read_blob, args.repeat)
+        json_bytes = con.execute("SELECT SUM(LENGTH(vector)) FROM json_cache").fetchone()[0]
+        blob_bytes = con.execute("SELECT SUM(LENGTH(vector)) FROM embedding_cache").fetchone()[0]
+        con.close()
+
+    print(f"n={args.n} dim={args.dim}")
+    print(f"{'format':<8}{'write s':>10}{'warm boot s':>14}{'payload MB':>12}")
+    print(f"{'json':<8}{json_write:>10.3f}{json_read:>14.3f}{json_bytes / 1e6:>12.1f}")
+    print(f"{'blob':<8}{blob_write:>10.3f}{blob_read:>14.3f}{blob_bytes / 1e6:>12.1f}")
+    print(f"warm boot speedup: {json_read / blob_read:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Load time, encode throughput and embedding drift: fp32 vs dynamic int8.
+
+Needs sentence-transformers (and torch). Texts are synthetic product
+descriptions; pass --products to use data/products.json instead.
+
+Usage:
+    python benchmarks/bench_encoder.py --model all-MiniLM-L6-v2 --n 2000 --batch 64
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai import encoders  # noqa: E402
+from app.ai.search import CosineIndex, l2_normalize  # noqa: E402
+
+_COLORS = ['merah', 'biru', 'hijau', 'kuning', 'ungu', 'hitam', 'putih', 'emas', 'perak', 'pink']
+_ITEMS = ['gelang', 'kalung', 'anting', 'cincin', 'bracelet', 'necklace', 'beads', 'charm']
+_WORDS = ['handmade', 'manik', 'rajut', 'elegan', 'minimalis', 'premium', 'gift', 'woven', 'pastel', 'vintage']
+
+
+def _texts(n, rng, products):
+    if products:
+        path = os.path.join(os.path.dirname(__file__), '..', 'data', 'products.json')
+        with open(path, encoding='utf-8') as f:
+            base = [f"{p.get('name', '')} {p.get('description', '')}" for p in json.load(f)]
+        return [base[i % len(base)] for i in range(n)]
+    return [
+        f"{rng.choice(_ITEMS)} {rng.choice(_COLORS)} " + ' '.join(rng.choice(_WORDS, size=rng.integers(4, 16)))
+        for _ in range(n)
+    ]
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--model', default='all-MiniLM-L6-v2')
+    ap.add_argument('--n', type=int, default=2000)
+    ap.add_argument('--batch', type=int, default=64)
+    ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--products', action='store_true')
+    args = ap.parse_args()
+
+    from sentence_transformers import SentenceTransformer  # type: ignore
+
+    texts = _texts(args.n, np.random.default_rng(0), args.products)
+    results = {}
+    for mode in ('none', 'int8'):
+        model, load_s = _timed(lambda: encoders.get_model(args.model, SentenceTransformer, mode))
+        _, cached_s = _timed(lambda: encoders.get_model(args.model, SentenceTransformer, mode))
+        model.encode(texts[:args.batch], batch_size=args.batch, show_progress_bar=False)  # warm-up
+        emb, enc_s = _timed(lambda: model.encode(texts, batch_size=args.batch, show_progress_bar=False))
+        results[mode] = l2_normalize(emb)
+        print(f"{mode:<5} load {load_s:6.2f}s  cached lookup {cached_s * 1e6:6.1f}us  "
+              f"encode {args.n / enc_s:8.1f} texts/s")
+
+    fp32, int8 = results['none'], results['int8']
+    cos = np.sum(fp32 * int8, axis=1)
+    _, truth = CosineIndex(fp32).kneighbors(fp32[:200], args.k + 1)
+    _, got = CosineIndex(int8).kneighbors(int8[:200], args.k + 1)
+    overlap = np.mean([len(set(t[1:]) & set(g[1:])) / args.k for t, g in zip(truth, got)])
+    print(f"drift: cosine(fp32, int8) mean {cos.mean():.4f} min {cos.min():.4f}; "
+          f"neighbour overlap@{args.k} {overlap:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Memory, latency and recall@k: int8 scan + rescoring vs float32 exact search.
+
+The float32 rows are written to a memory-mapped matrix file (as the text
+index does after every build and compaction) so the quantized index only
+reads candidate rows from it. ``held MB`` is what the engine keeps in
+private memory: the int8 codes, plus the float32 rows when it is built over
+an in-memory matrix instead of the mapped file.
+
+Usage:
+    python benchmarks/bench_quant.py --n 200000 --dim 384 --rescore 1,2,4,8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.quant import QuantizedIndex  # noqa: E402
+from app.ai.search import CosineIndex, l2_normalize, top_k  # noqa: E402
+from app.ai.store import read_matrix_file, write_matrix_file  # noqa: E402
+
+
+def _clustered(n, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return l2_normalize(centers[labels] + 1.5 * rng.standard_normal((n, dim), dtype=np.float32))
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def _held(engine) -> int:
+    rows = 0 if isinstance(engine.matrix, np.memmap) else engine.matrix.nbytes
+    return engine.nbytes + rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=200000)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--batch', type=int, default=1, help='queries per kneighbors call')
+    ap.add_argument('--rescore', default='1,2,4,8')
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    mat = _clustered(args.n + args.queries, args.dim, 1000, rng)
+    mat, queries = mat[:args.n], mat[args.n:]
+
+    def run(engine):
+        out = []
+        for s in range(0, args.queries, args.batch):
+            out.append(engine.kneighbors(queries[s:s + args.batch], args.k)[1])
+        return np.vstack(out)
+
+    exact = CosineIndex(mat)
+    truth, exact_s = _timed(lambda: run(exact))
+    print(f"n={args.n} dim={args.dim} k={args.k} batch={args.batch}")
+    print(f"{'index':<16}{'scan MB':>9}{'held MB':>9}{'recall@k':>10}{'ms/query':>10}")
+    print(f"{'float32':<16}{mat.nbytes / 2**20:>9.1f}{mat.nbytes / 2**20:>9.1f}{1.0:>10.3f}"
+          f"{exact_s * 1000 / args.queries:>10.3f}")
+    private = QuantizedIndex(mat)
+    print(f"{'int8 in-memory':<16}{private.nbytes / 2**20:>9.1f}{_held(private) / 2**20:>9.1f}{'-':>10}{'-':>10}")
+    del private
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.vec')
+        write_matrix_file(path, mat, range(args.n))
+        mapped = read_matrix_file(path)[1]
+        engine, build_s = _timed(lambda: QuantizedIndex(mapped))
+        # First pass alone: ranking by the int8 scores, no rescoring
+        got = top_k(engine.approx_scores(queries), args.k)[0]
+        recall = np.mean([len(set(t) & set(g)) / args.k for t, g in zip(truth, got)])
+        mb = f"{engine.nbytes / 2**20:>9.1f}{_held(engine) / 2**20:>9.1f}"
+        print(f"{'int8 no rescore':<16}{mb}{recall:>10.3f}{'-':>10}")
+        for rescore in [int(x) for x in args.rescore.split(',')]:
+            engine.rescore = rescore
+            got, s = _timed(lambda: run(engine))
+            recall = np.mean([len(set(t) & set(g)) / args.k for t, g in zip(truth, got)])
+            print(f"{'int8 rescore=' + str(rescore):<16}{mb}{recall:>10.3f}{s * 1000 / args.queries:>10.3f}")
+        print(f"(int8 build {build_s:.2f}s)")
+        del engine, mapped
+
+
+if __name__ == '__main__':
+    main()
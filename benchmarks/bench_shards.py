@@ -0,0 +1,77 @@
+"""Throughput (QPS) of scatter-gather search versus shard count.
+
+Several client threads issue queries concurrently (as request threads
+would); each query goes to every shard worker process and the local top-k
+lists are merged. ``shards=0`` is the in-process ``CosineIndex`` baseline.
+Scaling is bounded by the number of physical cores on the machine.
+
+Usage:
+    python benchmarks/bench_shards.py --n 500000 --dim 384 --shards 0,1,2,4,8
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.search import CosineIndex, l2_normalize  # noqa: E402
+from app.ai.shards import ShardedIndex  # noqa: E402
+
+
+def _qps(engine, queries, k, batch, clients, seconds):
+    """Queries per second with ``clients`` threads hammering ``engine``."""
+    done = [0] * clients
+    stop = time.perf_counter() + seconds
+
+    def client(c):
+        i = c * batch
+        while time.perf_counter() < stop:
+            s = i % (len(queries) - batch + 1)
+            engine.kneighbors(queries[s:s + batch], k)
+            done[c] += batch
+            i += batch * clients
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=500000)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--batch', type=int, default=1, help='queries per kneighbors call')
+    ap.add_argument('--clients', type=int, default=8, help='concurrent client threads')
+    ap.add_argument('--seconds', type=float, default=5.0)
+    ap.add_argument('--shards', default='0,1,2,4,8')
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    mat = l2_normalize(rng.standard_normal((args.n, args.dim), dtype=np.float32))
+    queries = l2_normalize(rng.standard_normal((512, args.dim), dtype=np.float32))
+
+    print(f"n={args.n} dim={args.dim} k={args.k} batch={args.batch} clients={args.clients} cpus={os.cpu_count()}")
+    print(f"{'shards':<8}{'start s':>9}{'QPS':>10}{'speedup':>9}")
+    base = None
+    for shards in [int(s) for s in args.shards.split(',')]:
+        t0 = time.perf_counter()
+        engine = ShardedIndex(mat, shards=shards) if shards else CosineIndex(mat)
+        start = time.perf_counter() - t0
+        qps = _qps(engine, queries, args.k, args.batch, args.clients, args.seconds)
+        base = base or qps
+        label = str(shards) if shards else 'local'
+        print(f"{label:<8}{start:>9.2f}{qps:>10.1f}{qps / base:>8.2f}x")
+        if shards:
+            engine.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Cold-start report: import time per module and ``create_app`` phases.
+
+Runs ``import app`` (which builds the module-level app) in a fresh
+interpreter with ``-X importtime`` and prints the slowest imports, time per
+top-level package and the phases recorded by ``app/startup.py``. Exits
+non-zero if the boot exceeds ``--budget`` seconds or pulls in a module
+listed in ``--forbid`` (the AI stack must load on first use, not at boot),
+so it can guard cold start in CI.
+
+Usage:
+    python benchmarks/bench_startup.py --top 15 --budget 2.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_CHILD = (
+    "import json, sys, app; "
+    "print(json.dumps({'startup': app.app.extensions.get('startup') if app.app else None, "
+    "'modules': sorted(sys.modules)}))"
+)
+
+
+def _parse_importtime(stderr: str):
+    """``[(module, self_us, cumulative_us, depth), ...]`` from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), depth))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--top', type=int, default=15, help='slowest modules to list')
+    ap.add_argument('--budget', type=float, default=0.0, help='fail above this many seconds (0: no limit)')
+    ap.add_argument('--forbid', default='torch,sentence_transformers,sklearn,scipy.sparse',
+                    help='modules that must not be imported at boot')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _CHILD], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        sys.stderr.write(proc.stderr[-2000:])
+        sys.exit(proc.returncode)
+    rows = _parse_importtime(proc.stderr)
+    child = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"wall {wall:.3f}s (interpreter + imports + create_app)")
+    print(f"\n{'slowest imports (cumulative)':<48}{'ms':>9}")
+    for name, _, cum, _ in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{name:<48}{cum / 1000:>9.1f}")
+
+    packages = {}
+    for name, self_us, _, _ in rows:
+        top = name.split('.')[0]
+        packages[top] = packages.get(top, 0) + self_us
+    print(f"\n{'package (self time)':<48}{'ms':>9}")
+    for top, us in sorted(packages.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"{top:<48}{us / 1000:>9.1f}")
+
+    startup = child.get('startup') or {}
+    print(f"\n{'create_app phase':<48}{'ms':>9}")
+    for phase in startup.get('phases', []):
+        print(f"{phase['phase']:<48}{phase['seconds'] * 1000:>9.1f}")
+    print(f"{'total':<48}{startup.get('total_seconds', 0) * 1000:>9.1f}")
+
+    failed = False
+    loaded = set(child['modules'])
+    leaked = [m for m in args.forbid.split(',') if m and m in loaded]
+    if leaked:
+        print(f"\nFAIL: imported at boot: {', '.join(leaked)}")
+        failed = True
+    if args.budget and wall > args.budget:
+        print(f"\nFAIL: boot took {wall:.3f}s, budget {args.budget:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""TF-IDF index: sparse CSR vs the old densified matrix.
+
+Builds a synthetic catalog of short product texts, fits TF-IDF once and
+compares the matrix footprint and per-query search latency of keeping it
+sparse against calling ``.toarray()``.
+
+Usage:
+    python benchmarks/bench_tfidf_sparse.py --n 20000 --vocab 20000
+
+The dense side needs n * vocab * 4 bytes of RAM (about 1.6 GB at the defaults).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer  # type: ignore
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.search import CosineIndex, l2_normalize  # noqa: E402
+
+
+def _catalog(n, vocab, words, rng):
+    terms = np.array([f'w{i}' for i in range(vocab)])
+    # Zipf-ish term frequencies, like real product copy
+    p = 1.0 / np.arange(1, vocab + 1)
+    p /= p.sum()
+    return [' '.join(rng.choice(terms, size=words, p=p)) for _ in range(n)]
+
+
+def _ms_per_query(engine, queries, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(queries.shape[0]):
+            engine.kneighbors(queries[i:i + 1], 10)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0 / queries.shape[0]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=20000)
+    ap.add_argument('--vocab', type=int, default=20000)
+    ap.add_argument('--words', type=int, default=30)
+    ap.add_argument('--queries', type=int, default=20)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts = _catalog(args.n, args.vocab, args.words, rng)
+    vec = TfidfVectorizer()
+    sparse = l2_normalize(vec.fit_transform(texts))
+    queries = vec.transform(_catalog(args.queries, args.vocab, 3, rng))
+    sparse_bytes = sparse.data.nbytes + sparse.indices.nbytes + sparse.indptr.nbytes
+
+    sparse_ms = _ms_per_query(CosineIndex(sparse), queries, args.repeat)
+    dense = l2_normalize(sparse.toarray())
+    dense_ms = _ms_per_query(CosineIndex(dense), queries, args.repeat)
+
+    print(f"n={args.n} vocab={sparse.shape[1]} nnz={sparse.nnz}")
+    print(f"{'layout':<8}{'matrix MB':>12}{'ms/query':>10}")
+    print(f"{'dense':<8}{dense.nbytes / 1e6:>12.1f}{dense_ms:>10.3f}")
+    print(f"{'sparse':<8}{sparse_bytes / 1e6:>12.1f}{sparse_ms:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
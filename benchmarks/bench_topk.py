@@ -0,0 +1,83 @@
+"""Top-k cosine search: NumPy engine vs sklearn NearestNeighbors vs pure Python.
+
+Times one query (and a batch of queries for the NumPy engine) against N
+random unit vectors, reporting milliseconds per query.
+
+Usage:
+    python benchmarks/bench_topk.py --sizes 10000,100000,1000000 --dim 384
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.search import CosineIndex, l2_normalize  # noqa: E402
+
+
+def _python_knn(rows, q, k):
+    """The pre-NumPy fallback: per-row cosine in Python plus a full sort."""
+    dists = []
+    nq = math.sqrt(sum(x * x for x in q)) or 1e-9
+    for i, row in enumerate(rows):
+        dot = sum(x * y for x, y in zip(row, q))
+        nr = math.sqrt(sum(x * x for x in row)) or 1e-9
+        dists.append((1 - dot / (nr * nq), i))
+    dists.sort(key=lambda x: x[0])
+    return dists[:k]
+
+
+def _ms_per_query(fn, n_queries, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0 / n_queries
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='10000,100000,1000000')
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--batch', type=int, default=64)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--python-max', type=int, default=10000,
+                    help='largest N to run the pure-Python fallback on')
+    args = ap.parse_args()
+
+    try:
+        from sklearn.neighbors import NearestNeighbors  # type: ignore
+    except Exception:
+        NearestNeighbors = None
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>9}  {'backend':<26}{'ms/query':>10}")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        mat = l2_normalize(rng.standard_normal((n, args.dim), dtype=np.float32))
+        queries = rng.standard_normal((args.batch, args.dim), dtype=np.float32)
+        engine = CosineIndex(mat)
+        results = {
+            'numpy (single)': _ms_per_query(lambda: engine.kneighbors(queries[:1], args.k), 1, args.repeat),
+            f'numpy (batch {args.batch})': _ms_per_query(lambda: engine.kneighbors(queries, args.k), args.batch, args.repeat),
+        }
+        if NearestNeighbors is not None:
+            nn = NearestNeighbors(n_neighbors=args.k, metric='cosine').fit(mat)
+            results['sklearn NearestNeighbors'] = _ms_per_query(
+                lambda: nn.kneighbors(queries[:1], n_neighbors=args.k), 1, args.repeat)
+            _, ref = nn.kneighbors(queries[:1], n_neighbors=args.k)
+            _, got = engine.kneighbors(queries[:1], args.k)
+            assert set(ref[0]) == set(got[0])
+        if n <= args.python_max:
+            rows, q = mat.tolist(), queries[0].tolist()
+            results['pure python'] = _ms_per_query(lambda: _python_knn(rows, q, args.k), 1, 1)
+        for name, ms in results.items():
+            print(f"{n:>9}  {name:<26}{ms:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Visual search latency: vectorized L2 top-k vs the old per-product Python loop.
+
+Scores one query histogram against N synthetic 768-bin RGB histogram
+features (sparse-ish and L2-normalized, like ``_hist_feature`` output) and
+reports milliseconds per query. The Python baseline (``_l2`` per product
+plus a full sort) is only run up to ``--python-max`` rows.
+
+Usage:
+    python benchmarks/bench_vision.py --sizes 1000,100000,1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.vision import nearest_l2  # noqa: E402
+
+
+def _features(n, dim, rng, chunk=100000):
+    """Histogram-like rows: a few hundred non-zero bins each, unit length."""
+    out = np.zeros((n, dim), dtype=np.float32)
+    for s in range(0, n, chunk):
+        block = rng.random((min(chunk, n - s), dim), dtype=np.float32)
+        block[block < 0.7] = 0.0
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[s:s + len(block)] = block
+    return out
+
+
+def _python_knn(rows, q, k):
+    """The previous implementation: ``_l2`` per product and a full sort."""
+    scored = [(i, sum((x - y) * (x - y) for x, y in zip(q, f)) ** 0.5) for i, f in enumerate(rows)]
+    scored.sort(key=lambda x: x[1])
+    return scored[:k]
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='1000,100000,1000000')
+    ap.add_argument('--dim', type=int, default=768)
+    ap.add_argument('--k', type=int, default=12)
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--python-max', type=int, default=10000, help='largest N for the Python baseline')
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim} k={args.k}")
+    print(f"{'N':>10}{'matrix MB':>11}{'numpy ms':>10}{'python ms':>11}{'speedup':>9}")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        feats = _features(n, args.dim, rng)
+        sq = np.einsum('ij,ij->i', feats, feats)
+        q = _features(1, args.dim, rng)[0]
+        fast = _timed(lambda: nearest_l2(feats, sq, q, args.k), args.repeat)
+        slow_txt, speed_txt = '-', '-'
+        if n <= args.python_max:
+            rows, ql = feats.tolist(), q.tolist()
+            slow = _timed(lambda: _python_knn(rows, ql, args.k), 1)
+            slow_txt, speed_txt = f"{slow * 1000:.1f}", f"{slow / fast:.0f}x"
+        print(f"{n:>10}{feats.nbytes / 2**20:>11.1f}{fast * 1000:>10.2f}{slow_txt:>11}{speed_txt:>9}")
+        del feats
+
+
+if __name__ == '__main__':
+    main()
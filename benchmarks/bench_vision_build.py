@@ -0,0 +1,88 @@
+"""Vision index build time: serial vs process pool, and incremental rebuilds.
+
+Writes N synthetic product photos (JPEG, ``--size`` px) to a temporary
+static folder and times:
+
+- a cold build with 1 worker and with each of ``--workers``
+- a forced rebuild with nothing changed (every row reused)
+- a forced rebuild after adding one product image (one decode)
+
+The catalog is passed in directly, so no database is needed.
+
+Usage:
+    python benchmarks/bench_vision_build.py --n 2000 --workers 2,4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image  # type: ignore
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.vision import VisionIndexer  # noqa: E402
+
+
+def _write_image(path, size, rng):
+    """A vertical gradient between two random colours, with a little noise."""
+    y = np.linspace(0.0, 1.0, size, dtype=np.float32)[:, None, None]
+    a, b = rng.integers(0, 256, 3), rng.integers(0, 256, 3)
+    arr = a * (1 - y) + b * y + rng.normal(0, 8, (size, size, 3))
+    Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(path, quality=90)
+
+
+def _indexer(static, persist, catalog, workers, descriptor):
+    idx = VisionIndexer(static_folder=static, persist_dir=persist, descriptor=descriptor, workers=workers)
+    idx._catalog_images = lambda: sorted(catalog.items())
+    return idx
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=2000)
+    ap.add_argument('--size', type=int, default=800)
+    ap.add_argument('--workers', default='2,4')
+    ap.add_argument('--descriptor', default='rgb768')
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as d:
+        static = os.path.join(d, 'static')
+        images = os.path.join(static, 'images')
+        os.makedirs(images)
+        catalog = {}
+        for pid in range(1, args.n + 1):
+            catalog[pid] = f'bench_{pid}.jpg'
+            _write_image(os.path.join(images, catalog[pid]), args.size, rng)
+        print(f"n={args.n} size={args.size}px descriptor={args.descriptor} cpus={os.cpu_count()}")
+        print(f"{'build':<28}{'seconds':>9}{'images/s':>10}")
+        base = None
+        for workers in [1] + [int(x) for x in args.workers.split(',')]:
+            idx = _indexer(static, None, catalog, workers, args.descriptor)
+            t = _timed(idx.build_index)
+            base = base or t
+            print(f"{f'cold, {workers} worker(s)':<28}{t:>9.2f}{args.n / t:>10.0f}  ({base / t:.2f}x)")
+
+        persist = os.path.join(d, 'index')
+        idx = _indexer(static, persist, catalog, 1, args.descriptor)
+        idx.build_index()
+        t = _timed(lambda: idx.build_index(force=True))
+        print(f"{'rebuild, nothing changed':<28}{t:>9.3f}")
+        catalog[args.n + 1] = 'bench_new.jpg'
+        _write_image(os.path.join(images, 'bench_new.jpg'), args.size, rng)
+        t = _timed(lambda: idx.build_index(force=True))
+        print(f"{'rebuild, one image added':<28}{t:>9.3f}")
+        t = _timed(lambda: _indexer(static, persist, catalog, 1, args.descriptor).build_index(force=True))
+        print(f"{'rebuild, new process':<28}{t:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
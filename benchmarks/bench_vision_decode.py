@@ -0,0 +1,130 @@
+"""Visual search query decode: full-resolution vs bounded (``load_image``).
+
+For each upload size (megapixels) and format, encodes a synthetic photo
+(smooth gradients plus mild noise) and measures, in a fresh child process
+per case so peak memory is not polluted by earlier cases:
+
+- ``full``: the old path, ``Image.open(...).convert('RGB')`` then the descriptor
+- ``bounded``: ``load_image`` (pixel guard, JPEG draft / ``reduce`` to
+  ``--work-size``) then the descriptor
+
+Latency is the best of ``--repeat`` runs; peak is the growth of the
+process's peak RSS over the run (reset first via ``/proc/self/clear_refs``
+on Linux; elsewhere it only shows growth past the import-time peak).
+
+Usage:
+    python benchmarks/bench_vision_decode.py --mp 1,5,12,20 --formats JPEG,PNG
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image  # type: ignore
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.descriptors import get_descriptor  # noqa: E402
+from app.ai.vision import MAX_PIXELS, load_image  # noqa: E402
+
+
+def _photo(megapixels, rng):
+    """A 4:3 image of smooth colour gradients with a little sensor-like noise."""
+    h = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    w = int(h * 4 / 3)
+    y = np.linspace(0.0, 1.0, h, dtype=np.float32)[:, None]
+    x = np.linspace(0.0, 1.0, w, dtype=np.float32)[None, :]
+    arr = np.empty((h, w, 3), dtype=np.uint8)
+    for c, (a, b) in enumerate([(200, 60), (80, 120), (40, 180)]):
+        chan = a * (1 - x) + b * y + rng.normal(0, 6, (h, w)).astype(np.float32)
+        arr[:, :, c] = np.clip(chan, 0, 255)
+    return Image.fromarray(arr)
+
+
+def _status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+    raise KeyError(field)
+
+
+def _reset_peak():
+    """Current RSS in MB, with the peak (VmHWM) reset to it where Linux allows."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return _status_mb('VmRSS')
+    except OSError:
+        return _peak_mb()
+
+
+def _peak_mb():
+    try:
+        return _status_mb('VmHWM')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KiB on Linux
+
+
+def _worker(path, mode, work_size, descriptor, repeat):
+    with open(path, 'rb') as f:
+        data = f.read()
+    desc = get_descriptor(descriptor)
+    base = _reset_peak()
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        if mode == 'full':
+            img = Image.open(io.BytesIO(data)).convert('RGB')
+        else:
+            img = load_image(io.BytesIO(data), work_size=work_size, max_pixels=MAX_PIXELS)
+        desc(img)
+        best = min(best, time.perf_counter() - t0)
+        size = img.size
+        del img
+    print(json.dumps({'ms': best * 1000, 'peak_mb': _peak_mb() - base, 'size': size}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--mp', default='1,5,12,20', help='upload sizes in megapixels')
+    ap.add_argument('--formats', default='JPEG,PNG')
+    ap.add_argument('--work-size', type=int, default=256)
+    ap.add_argument('--descriptor', default='rgb768')
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--worker', nargs=2, metavar=('PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.worker:
+        return _worker(args.worker[0], args.worker[1], args.work_size, args.descriptor, args.repeat)
+
+    rng = np.random.default_rng(0)
+    print(f"descriptor={args.descriptor} work_size={args.work_size}")
+    print(f"{'MP':>5} {'format':<6}{'file MB':>9}{'full ms':>9}{'full MB':>9}"
+          f"{'bounded ms':>12}{'bounded MB':>12}{'decoded':>11}")
+    with tempfile.TemporaryDirectory() as d:
+        for mp in [float(x) for x in args.mp.split(',')]:
+            img = _photo(mp, rng)
+            for fmt in args.formats.split(','):
+                path = os.path.join(d, f'upload.{fmt.lower()}')
+                img.save(path, format=fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+                res = {}
+                for mode in ('full', 'bounded'):
+                    out = subprocess.run(
+                        [sys.executable, __file__, '--worker', path, mode, '--work-size', str(args.work_size),
+                         '--descriptor', args.descriptor, '--repeat', str(args.repeat)],
+                        check=True, capture_output=True, text=True)
+                    res[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+                w, h = res['bounded']['size']
+                print(f"{mp:>5g} {fmt:<6}{os.path.getsize(path) / 2**20:>9.1f}"
+                      f"{res['full']['ms']:>9.1f}{res['full']['peak_mb']:>9.1f}"
+                      f"{res['bounded']['ms']:>12.1f}{res['bounded']['peak_mb']:>12.1f}{f'{w}x{h}':>11}")
+            del img
+
+
+if __name__ == '__main__':
+    main()
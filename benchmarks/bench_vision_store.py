@@ -0,0 +1,81 @@
+"""Vision feature store: legacy JSON vs the binary memory-mapped file.
+
+Writes N synthetic 768-bin histograms (``--density`` is the fraction of
+non-zero bins; solid-colour product shots are well under 1%, photos tens of
+percent) as ``vision_features.json`` and as dense / CSR feature files, and
+reports size on disk, cold load time and the time of a first query.
+
+Usage:
+    python benchmarks/bench_vision_store.py --n 20000 --density 0.01,0.3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.store import read_matrix_file, write_matrix_file  # noqa: E402
+from app.ai.vision import _VisionSnapshot, nearest_l2  # noqa: E402
+
+
+def _features(n, dim, density, rng):
+    m = rng.random((n, dim), dtype=np.float32)
+    m[rng.random((n, dim)) >= density] = 0.0
+    m[np.arange(n), rng.integers(0, dim, size=n)] += 1.0  # no empty rows
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['ids'], np.asarray(data['features'], dtype=np.float32)
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=20000)
+    ap.add_argument('--dim', type=int, default=768)
+    ap.add_argument('--density', default='0.01,0.3')
+    args = ap.parse_args()
+
+    import scipy.sparse as sp  # noqa: F401  (imported up front, not inside the timings)
+    rng = np.random.default_rng(0)
+    ids = list(range(1, args.n + 1))
+    print(f"n={args.n} dim={args.dim}")
+    print(f"{'density':>8} {'format':<8}{'size MB':>9}{'load ms':>10}{'1st query ms':>14}")
+    with tempfile.TemporaryDirectory() as d:
+        for density in [float(x) for x in args.density.split(',')]:
+            feats = _features(args.n, args.dim, density, rng)
+            q = feats[0]
+            paths = {'json': os.path.join(d, 'vision_features.json'),
+                     'dense': os.path.join(d, 'dense.vec'), 'csr': os.path.join(d, 'csr.vec')}
+            with open(paths['json'], 'w', encoding='utf-8') as f:
+                json.dump({'ids': ids, 'features': feats.tolist()}, f)
+            write_matrix_file(paths['dense'], feats, ids)
+            write_matrix_file(paths['csr'], sp.csr_matrix(feats), ids)
+            for fmt, path in paths.items():
+                if fmt == 'json':
+                    (_, matrix), load = _timed(lambda: _load_json(path))
+                else:
+                    (_, matrix, _), load = _timed(lambda: read_matrix_file(path))
+                size = os.path.getsize(path) + (os.path.getsize(path + '.ids') if fmt != 'json' else 0)
+
+                def first_query():
+                    snap = _VisionSnapshot(ids, matrix)
+                    return nearest_l2(snap.features, snap.sq_norms, q, 12)
+                _, query = _timed(first_query)
+                print(f"{density:>8.3f} {fmt:<8}{size / 2**20:>9.2f}{load * 1000:>10.1f}{query * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
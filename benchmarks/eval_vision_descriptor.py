@@ -0,0 +1,104 @@
+"""Visual search descriptors: size, speed and retrieval quality.
+
+Computes every registered descriptor (``app/ai/descriptors.py``) over a set
+of raster images and reports, per descriptor:
+
+- dims and feature matrix size (dense float32, and CSR if it would be stored that way)
+- extraction time per image and query time (nearest_l2, k neighbours)
+- ``overlap@k``: mean share of the rgb768 top-k that the descriptor also returns
+- ``self@1`` under edits: how often a brightened / darkened / resized copy
+  of an image still finds the original as its nearest neighbour
+
+Defaults to the PNG/JPEG files under ``static/`` (SVG product art is not
+decodable by Pillow); point ``--images`` at a directory of product photos
+for a meaningful comparison.
+
+Usage:
+    python benchmarks/eval_vision_descriptor.py --images /path/to/photos --k 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import ImageEnhance  # type: ignore
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.ai.descriptors import DESCRIPTORS  # noqa: E402
+from app.ai.vision import _SPARSE_MAX_DENSITY, load_image, nearest_l2  # noqa: E402
+
+_EXTS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif')
+_EDITS = {
+    'bright+30%': lambda im: ImageEnhance.Brightness(im).enhance(1.3),
+    'dark-30%': lambda im: ImageEnhance.Brightness(im).enhance(0.7),
+    'resize50%': lambda im: im.resize((max(1, im.width // 2), max(1, im.height // 2))),
+}
+
+
+def _load_images(root, limit):
+    paths = []
+    for d, _, files in os.walk(root):
+        paths.extend(os.path.join(d, f) for f in files if f.lower().endswith(_EXTS))
+    images = []
+    for path in sorted(paths)[:limit]:
+        try:
+            # Decoded at the working size the index uses
+            images.append(load_image(path))
+        except Exception:
+            continue
+    return images
+
+
+def _stored_mb(matrix):
+    density = np.count_nonzero(matrix) / max(matrix.size, 1)
+    if density < _SPARSE_MAX_DENSITY:
+        # data + int32 indices + indptr
+        return (np.count_nonzero(matrix) * 8 + (len(matrix) + 1) * 4) / 2**20, 'csr'
+    return matrix.nbytes / 2**20, 'dense'
+
+
+def _knn(matrix, queries, k):
+    sq = np.einsum('ij,ij->i', matrix, matrix)
+    return nearest_l2(matrix, sq, queries, k)[1]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--images', default=os.path.join(os.path.dirname(__file__), '..', 'static'))
+    ap.add_argument('--limit', type=int, default=5000)
+    ap.add_argument('--k', type=int, default=8)
+    args = ap.parse_args()
+
+    images = _load_images(args.images, args.limit)
+    if len(images) < 2:
+        sys.exit(f'need at least 2 raster images under {args.images}')
+    k = min(args.k, len(images))
+    print(f"images={len(images)} k={k}")
+
+    results = {}
+    for name, desc in DESCRIPTORS.items():
+        t0 = time.perf_counter()
+        matrix = np.vstack([desc(im) for im in images])
+        extract = (time.perf_counter() - t0) / len(images)
+        t0 = time.perf_counter()
+        neighbours = _knn(matrix, matrix, k)
+        query = (time.perf_counter() - t0) / len(images)
+        self_hits = {}
+        for edit, fn in _EDITS.items():
+            edited = np.vstack([desc(fn(im)) for im in images])
+            self_hits[edit] = float(np.mean(_knn(matrix, edited, 1)[:, 0] == np.arange(len(images))))
+        results[name] = (desc.dim, _stored_mb(matrix), extract, query, neighbours, self_hits)
+
+    base = results['rgb768'][4]
+    edits = list(_EDITS)
+    print(f"{'descriptor':<11}{'dims':>6}{'store MB':>10}{'layout':>7}{'extract ms':>12}{'query ms':>10}"
+          f"{'overlap@k':>11}" + ''.join(f"{'self@1 ' + e:>20}" for e in edits))
+    for name, (dim, (mb, layout), extract, query, neighbours, self_hits) in results.items():
+        overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(neighbours, base)])
+        print(f"{name:<11}{dim:>6}{mb:>10.3f}{layout:>7}{extract * 1000:>12.2f}{query * 1000:>10.3f}"
+              f"{overlap:>11.2f}" + ''.join(f"{self_hits[e]:>20.2f}" for e in edits))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,10 +22,55 @@ class Config:
     AI_PROVIDER = os.environ.get('AI_PROVIDER', 'local')
     # For local embeddings we may use a model name if sentence-transformers is available
     EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    # 'int8' runs the model with dynamically quantized Linear layers on CPU
+    EMBEDDING_QUANTIZE = os.environ.get('EMBEDDING_QUANTIZE', 'none')
+    # Texts per model.encode batch when building the index
+    ENCODE_BATCH_SIZE = int(os.environ.get('ENCODE_BATCH_SIZE', 64))
     # Path to persist vector index / vector DB
     VECTOR_DB_PATH = os.environ.get('VECTOR_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'ai_index'))
+    # Colour descriptor for visual search: 'rgb768' (raw RGB histogram) or
+    # 'hsv' (48-dim HSV histogram + colour moments, see app/ai/descriptors.py)
+    VISION_DESCRIPTOR = os.environ.get('VISION_DESCRIPTOR', 'rgb768')
+    # Images are decoded down to about this many pixels on the longest side
+    # before visual search features are extracted (JPEG draft mode / reduce)
+    VISION_WORK_SIZE = int(os.environ.get('VISION_WORK_SIZE', 256))
+    # Visual search uploads (and product images) with more pixels are refused
+    VISION_MAX_PIXELS = int(os.environ.get('VISION_MAX_PIXELS', 50_000_000))
+    # Processes used to describe product images in vision builds (0 = one per CPU core)
+    VISION_BUILD_WORKERS = int(os.environ.get('VISION_BUILD_WORKERS', 0))
     # Image generation backend (e.g., 'local' for placeholder/local generation)
     IMAGE_BACKEND = os.environ.get('IMAGE_BACKEND', 'local')
+    # Text vector index: 'exact' brute force or 'ivf' (approximate, for large
+    # catalogs). IVF_NLIST=0 picks ~sqrt(catalog size); raise IVF_NPROBE for recall.
+    VECTOR_INDEX = os.environ.get('VECTOR_INDEX', 'exact')
+    IVF_NLIST = int(os.environ.get('IVF_NLIST', 0))
+    IVF_NPROBE = int(os.environ.get('IVF_NPROBE', 8))
+    # 'int8' scans per-dimension quantized vectors (4x less memory) and
+    # rescores the best k * QUANT_RESCORE candidates exactly; 'none' disables.
+    VECTOR_QUANTIZE = os.environ.get('VECTOR_QUANTIZE', 'none')
+    QUANT_RESCORE = int(os.environ.get('QUANT_RESCORE', 4))
+    # Split the exact/int8 scan across this many local worker processes
+    # (0 disables); only used when each shard gets VECTOR_SHARD_MIN_ROWS rows.
+    VECTOR_SHARDS = int(os.environ.get('VECTOR_SHARDS', 0))
+    VECTOR_SHARD_MIN_ROWS = int(os.environ.get('VECTOR_SHARD_MIN_ROWS', 20000))
+    # Neighbours precomputed per product for /recommend (0 disables the table)
+    NEIGHBOR_K = int(os.environ.get('NEIGHBOR_K', 20))
+    # Seconds between checks of the shared catalog stamp that tells each
+    # worker to sync its indices after another worker's edit (0 disables)
+    INDEX_STAMP_INTERVAL = float(os.environ.get('INDEX_STAMP_INTERVAL', 5))
+    # Seconds after a catalog edit before the text index engine and files are
+    # rebuilt in the background (edits meanwhile are served by a patched engine)
+    INDEX_COMPACT_DELAY = float(os.environ.get('INDEX_COMPACT_DELAY', 2))
+    # Query text -> vector / top-k result caches (entries per cache, TTL seconds)
+    QUERY_CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE', 1024))
+    QUERY_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 300))
+    # Personalization: recent session events used, and recency half-life in events
+    PERSONALIZE_HISTORY = int(os.environ.get('PERSONALIZE_HISTORY', 25))
+    PERSONALIZE_HALF_LIFE = float(os.environ.get('PERSONALIZE_HALF_LIFE', 5))
+    # Distinct products kept per stored taste profile
+    PROFILE_MAX_ITEMS = int(os.environ.get('PROFILE_MAX_ITEMS', 50))
+    # Max product ids / queries accepted by one batched AI request
+    AI_BATCH_MAX = int(os.environ.get('AI_BATCH_MAX', 50))
 
 
 class DevelopmentConfig(Config):
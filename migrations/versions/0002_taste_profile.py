@@ -0,0 +1,30 @@
+"""taste profile table
+
+Revision ID: 0002_taste_profile
+Revises: 0001_initial
+Create Date: 2026-10-17 00:00:00.000000
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision = '0002_taste_profile'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases that ran the app before this migration may already have it
+    if 'taste_profile' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('taste_profile',
+        sa.Column('owner', sa.String(length=100), primary_key=True),
+        sa.Column('events', sa.Integer(), nullable=False),
+        sa.Column('product_ids', sa.LargeBinary(), nullable=False),
+        sa.Column('weights', sa.LargeBinary(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('taste_profile')
@@ -48,15 +48,12 @@ def maybe_warm_ai(app) -> None:
         return
     try:
         with app.app_context():
-            # Warm text embeddings
+            # Warm text embeddings (built into the app's shared registry so
+            # the first requests reuse them instead of building their own)
             try:
-                from pathlib import Path
+                from app.ai.registry import get_text_indexer  # type: ignore
 
-                from app.ai.embeddings import EmbeddingIndexer  # type: ignore
-
-                persist_dir = Path("data") / "ai_index"
-                idx = EmbeddingIndexer(persist_dir=str(persist_dir))
-                idx.build_index(force=False)
+                idx = get_text_indexer(app)
                 logging.getLogger(__name__).info(
                     "Embedding index warmed: %d items",
                     len(idx.ids),
@@ -69,15 +66,9 @@ def maybe_warm_ai(app) -> None:
 
             # Warm vision features
             try:
-                from app.ai.vision import VisionIndexer  # type: ignore
+                from app.ai.registry import get_vision_indexer  # type: ignore
 
-                static_folder = app.static_folder or "static"
-                persist_dir = os.path.join("data", "ai_index")
-                vision = VisionIndexer(
-                    static_folder=static_folder,
-                    persist_dir=persist_dir,
-                )
-                vision.build_index(force=False)
+                vision = get_vision_indexer(app)
                 logging.getLogger(__name__).info(
                     "Vision index warmed: %d items",
                     len(vision.ids),
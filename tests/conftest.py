@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from app.ai import embeddings, encoders
+
+
+class FakeModel:
+    """Stand-in for ``SentenceTransformer``: small vectors that depend only on the text.
+
+    Records constructor calls in ``loads``, ``encode`` calls in ``calls`` and
+    every encoded text in ``seen``.
+    """
+
+    loads = []
+    seen = []
+    calls = 0
+
+    def __init__(self, name=None, **kw):
+        FakeModel.loads.append((name, kw))
+
+    def encode(self, texts, show_progress_bar=False, **kw):
+        FakeModel.calls += 1
+        FakeModel.seen.extend(texts)
+        return np.array([[len(t), 1.0, (sum(map(ord, t)) % 7) / 7.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Make ``EmbeddingIndexer`` load :class:`FakeModel` instead of a real transformer."""
+    monkeypatch.setattr(embeddings, 'has_transformer', True)
+    monkeypatch.setattr(embeddings, 'SentenceTransformer', FakeModel)
+    FakeModel.loads, FakeModel.seen, FakeModel.calls = [], [], 0
+    encoders.clear_models()
+    yield FakeModel
+    encoders.clear_models()
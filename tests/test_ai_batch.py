@@ -0,0 +1,56 @@
+from app import app, db
+from app.models import Product
+
+
+def _seed():
+    db.create_all()
+    if not Product.query.get(1):
+        db.session.add_all([
+            Product(id=1, name='Blue Bracelet', price=100, description='Handmade blue bracelet'),
+            Product(id=2, name='Red Necklace', price=200, description='Stylish red necklace'),
+        ])
+        db.session.commit()
+
+
+def test_recommend_batch_matches_single_requests():
+    with app.app_context():
+        _seed()
+    client = app.test_client()
+    resp = client.post('/api/ai/recommend_batch', json={'product_ids': [1, 2, 999999]})
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['product_id'] for r in results] == [1, 2, 999999]
+    assert results[2]['items'] == []
+    single = client.get('/api/ai/recommend?product_id=1').get_json()['items']
+    assert results[0]['items'] == single
+
+    resp = client.get('/api/ai/recommend_hybrid_batch?product_ids=1,2')
+    assert resp.status_code == 200
+    assert len(resp.get_json()['results']) == 2
+
+
+def test_search_batch_and_limits():
+    with app.app_context():
+        _seed()
+    client = app.test_client()
+    resp = client.post('/api/ai/search_batch', json={'queries': ['blue', 'necklace']})
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['q'] for r in results] == ['blue', 'necklace']
+    assert results[0]['items'] == client.get('/api/ai/search?q=blue').get_json()['items']
+
+    too_many = list(range(app.config['AI_BATCH_MAX'] + 1))
+    assert client.post('/api/ai/recommend_batch', json={'product_ids': too_many}).status_code == 400
+    assert client.post('/api/ai/search_batch', json={}).status_code == 400
+
+
+def test_batch_endpoints_reject_malformed_bodies():
+    client = app.test_client()
+    for body in (['a', 'b'], 'bracelet', {'queries': 'bracelet'}, {'queries': ['x'], 'min_price': [1]},
+                 {'queries': [None]}, {'queries': [['x']]}, {'queries': [5]}, {'queries': ['x', '']},
+                 {'queries': ['  ']}):
+        assert client.post('/api/ai/search_batch', json=body).status_code == 400
+    for url in ('/api/ai/recommend_batch', '/api/ai/recommend_hybrid_batch'):
+        for body in ({'product_ids': [1, None]}, {'product_ids': [[1]]}, {'product_ids': ['x']}, [1, 2]):
+            assert client.post(url, json=body).status_code == 400
+    assert client.post('/api/ai/chat', json=['hi']).status_code == 400
@@ -0,0 +1,112 @@
+import threading
+from app import app
+from app.ai.registry import IndexRegistry, get_registry, get_text_indexer
+
+
+def test_registry_builds_once_under_concurrency():
+    reg = IndexRegistry()
+    built = []
+
+    def factory():
+        built.append(1)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(reg.get(('text', 'm', 'p'), factory))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+    assert all(r is results[0] for r in results)
+    assert reg.builds == 1 and reg.hits == 7
+
+    reg.invalidate('text')
+    reg.get(('text', 'm', 'p'), factory)
+    assert reg.builds == 2
+
+
+def test_text_indexer_shared_between_requests():
+    with app.app_context():
+        a = get_text_indexer(app)
+        b = get_text_indexer(app)
+        assert a is b
+    client = app.test_client()
+    resp = client.get('/api/ai/index_status')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['builds'] >= 1 and data['hits'] >= 1
+    # No filesystem paths or error text on the unauthenticated endpoint
+    assert app.config['VECTOR_DB_PATH'] not in resp.get_data(as_text=True)
+    assert any(name.startswith('text:') for name in data['indices'])
+    assert all('last_error' not in (s['rebuild'] or {}) for s in data['snapshots'])
+    assert get_registry(app).stats()['builds'] == data['builds']
+
+
+def test_background_rebuild_keeps_serving_old_snapshot():
+    from app.ai.embeddings import EmbeddingIndexer
+    reg = IndexRegistry()
+    with app.app_context():
+        idx = EmbeddingIndexer()
+        idx.build_index(force=True)
+    key = ('text', 'm', 'p')
+    reg.get(key, lambda: idx)
+    before = idx.version
+    expected = idx.query('bracelet', k=3)
+
+    started, release = threading.Event(), threading.Event()
+    fit = idx._fit_tfidf
+
+    def slow_fit(texts):
+        started.set()
+        release.wait(5)
+        return fit(texts)
+
+    idx._fit_tfidf = slow_fit
+
+    def build():
+        with app.app_context():
+            idx.build_index(force=True)
+
+    assert reg.rebuild_async(key, build)['state'] == 'queued'
+    assert started.wait(5)
+    # Readers are served from the live snapshot while the rebuild is blocked
+    assert idx.version == before
+    assert idx.query('bracelet', k=3) == expected
+    assert reg.rebuild_async(key, build)['state'] == 'building'  # queued once more, no new thread
+    release.set()
+    assert reg.wait_idle(10)
+    status = reg.stats()['snapshots'][0]
+    assert status['version'] == before + 2
+    assert status['rebuild']['runs'] == 2 and status['rebuild']['state'] == 'idle'
+
+
+def test_rebuild_endpoint_is_admin_only():
+    client = app.test_client()
+    # Fresh app context so no user logged in by another test is seen
+    with app.app_context():
+        assert client.post('/api/ai/rebuild_index').status_code in (302, 401, 403)
+
+
+def test_catalog_stamp_syncs_other_workers():
+    from app import create_app, db
+    from app.ai.registry import apply_product_changes, check_catalog_stamp
+    from app.models import Product
+    other = create_app()  # a second worker process sharing the database
+    with other.app_context():
+        idx = get_text_indexer(other)
+        assert check_catalog_stamp(other, now=1e9) is False  # nothing changed yet
+    with app.app_context():
+        db.session.add(Product(id=777001, name='Stamp Sync Anklet', price=5, description='anklet'))
+        db.session.commit()
+        apply_product_changes(app, upserted=[Product.query.get(777001)])
+    try:
+        assert 777001 not in idx.ids
+        with other.app_context():
+            assert check_catalog_stamp(other, now=2e9) is True
+            assert get_registry(other).wait_idle(10)
+        assert 777001 in idx.ids
+    finally:
+        with app.app_context():
+            db.session.delete(Product.query.get(777001))
+            db.session.commit()
@@ -0,0 +1,34 @@
+import numpy as np
+from app import app, db
+from app.ai import embeddings
+from app.ai.ann import IVFIndex
+from app.ai.search import CosineIndex, l2_normalize
+
+
+def test_ivf_full_probe_is_exact_and_partial_probe_recalls():
+    rng = np.random.default_rng(5)
+    mat = l2_normalize(rng.standard_normal((600, 12)))
+    queries = rng.standard_normal((20, 12))
+    _, truth = CosineIndex(mat).kneighbors(queries, 5)
+    ivf = IVFIndex(mat, nlist=16, nprobe=16)
+    _, got = ivf.kneighbors(queries, 5)
+    np.testing.assert_array_equal(got, truth)
+    ivf.nprobe = 4
+    _, got = ivf.kneighbors(queries, 5)
+    recall = np.mean([len(set(t) & set(g)) / 5 for t, g in zip(truth, got)])
+    assert recall > 0.5
+    # Fewer candidates than k in the probed lists falls back to a full scan
+    ivf.nprobe = 1
+    _, got = ivf.kneighbors(queries[:1], 200)
+    assert got.shape == (1, 200) and len(set(got[0])) == 200
+
+
+def test_indexer_uses_ivf_for_dense_vectors(tmp_path, fake_model):
+    with app.app_context():
+        db.create_all()
+        idx = embeddings.EmbeddingIndexer(model_name='fake-model', persist_dir=str(tmp_path),
+                                          index_type='ivf', ivf_nlist=2, ivf_nprobe=2)
+        idx.build_index(force=True)
+        assert isinstance(idx.nn, IVFIndex)
+        pid = idx.ids[0]
+        assert all(i != pid for i, _ in idx.query_by_product(pid, k=3))
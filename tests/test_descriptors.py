@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance  # type: ignore
+
+from app.ai.descriptors import DESCRIPTORS, get_descriptor
+from app.ai.vision import VisionIndexer
+
+
+def _striped(colours, size=32):
+    img = Image.new('RGB', (size, size))
+    band = size // len(colours)
+    for i, c in enumerate(colours):
+        img.paste(c, (0, i * band, size, (i + 1) * band))
+    return img
+
+
+def test_descriptors_have_declared_dim():
+    img = _striped([(200, 30, 30), (30, 30, 200)])
+    for desc in DESCRIPTORS.values():
+        f = desc(img)
+        assert f.shape == (desc.dim,) and f.dtype == np.float32
+    assert get_descriptor('hsv').dim < get_descriptor('rgb768').dim // 10
+    with pytest.raises(ValueError):
+        get_descriptor('sift')
+
+
+def _shaded(colour, rng, size=48):
+    """A product-shot-like image: one colour under a lighting gradient plus noise."""
+    light = np.linspace(0.6, 1.2, size, dtype=np.float32)[:, None, None]
+    arr = np.asarray(colour, dtype=np.float32) * light + rng.normal(0, 12, (size, size, 3))
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+
+def test_hsv_is_more_brightness_tolerant_than_rgb():
+    rng = np.random.default_rng(0)
+    img, other = _shaded((180, 40, 40), rng), _shaded((40, 60, 180), rng)
+    darker = ImageEnhance.Brightness(img).enhance(0.7)
+    ratios = {}
+    for name in ('rgb768', 'hsv'):
+        desc = get_descriptor(name)
+        ratios[name] = np.linalg.norm(desc(img) - desc(darker)) / np.linalg.norm(desc(img) - desc(other))
+    assert ratios['hsv'] < 0.2 < ratios['rgb768']
+
+
+def test_indexer_uses_configured_descriptor(tmp_path):
+    idx = VisionIndexer(static_folder=None, persist_dir=str(tmp_path), descriptor='hsv')
+    colours = {1: (200, 0, 0), 2: (0, 0, 200), 3: (0, 200, 0)}
+    feats = np.vstack([idx.descriptor(Image.new('RGB', (16, 16), c)) for c in colours.values()])
+    idx._persist_features(list(colours), feats)
+    assert (tmp_path / 'vision-features-hsv.vec').is_file()
+    # an rgb768 indexer over the same directory does not pick up hsv vectors
+    assert VisionIndexer(static_folder=None, persist_dir=str(tmp_path))._load_features() is None
+
+    idx._publish(*idx._load_features())
+    assert idx.features.shape == (3, idx.descriptor.dim)
+    hits = idx.query_image(Image.new('RGB', (16, 16), (0, 0, 150)), k=2)
+    assert hits[0][0] == 2
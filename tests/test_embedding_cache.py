@@ -0,0 +1,117 @@
+import os
+import numpy as np
+from app import app, db
+from app.ai import embeddings
+from app.ai.search import is_sparse
+from app.ai.store import matrix_file_path, pack_matrix, read_matrix_file, unpack_matrix, write_matrix_file
+
+
+def test_pack_unpack_roundtrip():
+    mat = np.random.default_rng(1).standard_normal((5, 7))
+    out = unpack_matrix(pack_matrix(mat), 7)
+    assert out.shape == (5, 7) and out.dtype == np.float32
+    assert out.flags['C_CONTIGUOUS']
+    np.testing.assert_allclose(out, mat.astype(np.float32))
+
+
+def test_blob_cache_warm_boot(fake_model):
+    with app.app_context():
+        db.create_all()
+        first = embeddings.EmbeddingIndexer(model_name='fake-model')
+        first.build_index(force=True)
+        calls = fake_model.calls
+        second = embeddings.EmbeddingIndexer(model_name='fake-model')
+        second.build_index()
+        assert fake_model.calls == calls
+        np.testing.assert_allclose(second.embeddings, first.embeddings)
+
+
+def test_matrix_file_mmap_roundtrip(tmp_path):
+    path = matrix_file_path(tmp_path, 'embeddings', 'org/model')
+    mat = np.random.default_rng(2).standard_normal((4, 3))
+    write_matrix_file(path, mat, [10, 11, 12, 13], model='org/model')
+    ids, loaded, header = read_matrix_file(path)
+    assert ids == [10, 11, 12, 13] and header['model'] == 'org/model'
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_allclose(loaded, mat.astype(np.float32))
+    # An ids sidecar from a different write is treated as a miss
+    other = str(tmp_path / 'other.vec')
+    write_matrix_file(other, mat, [1, 2, 3, 4])
+    os.replace(other + '.ids', path + '.ids')
+    assert read_matrix_file(path) is None
+
+
+def test_indexer_warm_boots_from_mmap(tmp_path, fake_model):
+    with app.app_context():
+        db.create_all()
+        first = embeddings.EmbeddingIndexer(model_name='fake-model', persist_dir=str(tmp_path))
+        first.build_index(force=True)
+        calls = fake_model.calls
+        second = embeddings.EmbeddingIndexer(model_name='fake-model', persist_dir=str(tmp_path))
+        second.build_index()
+        assert fake_model.calls == calls
+        assert isinstance(second.embeddings, np.memmap)
+        np.testing.assert_allclose(np.linalg.norm(second.embeddings, axis=1), 1.0, rtol=1e-5)
+
+
+def test_tfidf_stays_sparse_and_warm_boots(tmp_path):
+    with app.app_context():
+        db.create_all()
+        first = embeddings.EmbeddingIndexer(persist_dir=str(tmp_path))
+        first.build_index(force=True)
+        assert is_sparse(first.embeddings)
+        second = embeddings.EmbeddingIndexer(persist_dir=str(tmp_path))
+
+        def _no_fit(texts):
+            raise AssertionError('vocabulary should come from tfidf.npz')
+
+        second._fit_tfidf = _no_fit
+        second.build_index()
+        assert is_sparse(second.embeddings)
+        assert second.query('bracelet', k=3) == first.query('bracelet', k=3)
+
+
+def test_cache_keyed_by_model_and_text(tmp_path, fake_model):
+    from app.models import Product
+    with app.app_context():
+        db.create_all()
+        embeddings.EmbeddingIndexer(model_name='model-a', persist_dir=str(tmp_path)).build_index(force=True)
+        p = Product.query.order_by(Product.id).first()
+        old_description = p.description
+        p.description = (p.description or '') + ' berkilau'
+        db.session.commit()
+        try:
+            # Only the edited product is encoded; the mmap file is stale and skipped
+            fake_model.seen.clear()
+            idx = embeddings.EmbeddingIndexer(model_name='model-a', persist_dir=str(tmp_path))
+            idx.build_index()
+            assert fake_model.seen == [f"{p.name} {p.description}"]
+
+            # A different model gets its own vector set; model-a stays cached
+            fake_model.seen.clear()
+            embeddings.EmbeddingIndexer(model_name='model-b').build_index()
+            assert len(fake_model.seen) == len(idx.ids)
+            fake_model.seen.clear()
+            embeddings.EmbeddingIndexer(model_name='model-a').build_index()
+            assert fake_model.seen == []
+        finally:
+            p.description = old_description
+            db.session.commit()
+
+
+def test_builds_and_compaction_publish_the_mapped_file(tmp_path, fake_model):
+    from app.models import Product
+    with app.app_context():
+        db.create_all()
+        idx = embeddings.EmbeddingIndexer(model_name='fake-model', persist_dir=str(tmp_path))
+        idx.build_index(force=True)
+        assert isinstance(idx.embeddings, np.memmap)
+
+        # Not added to the session: only the index sees it
+        idx.upsert_products([Product(id=990001, name='Cincin uji', description='perak', price=1, stock=1)])
+        assert idx.compaction_pending and not isinstance(idx.embeddings, np.memmap)
+        assert idx.compact()
+        assert isinstance(idx.embeddings, np.memmap) and 990001 in idx.ids
+        ids, mapped, _ = read_matrix_file(matrix_file_path(tmp_path, 'embeddings', 'fake-model'))
+        assert ids == idx.ids
+        np.testing.assert_allclose(mapped, idx.embeddings)
@@ -0,0 +1,150 @@
+import json
+import threading
+
+import numpy as np
+from app import app, db
+from app.ai.embeddings import EmbeddingIndexer
+from app.ai.search import CosineIndex, PatchedIndex, StackedRows, l2_normalize, materialize_rows, take_rows
+from app.models import Product
+
+
+def test_upsert_and_remove_only_touch_changed_products():
+    with app.app_context():
+        db.create_all()
+        for pid in (401, 402):
+            p = Product.query.get(pid)
+            if p:
+                db.session.delete(p)
+        db.session.commit()
+        db.session.add(Product(id=401, name='Teal Ocean Bracelet', price=10, description='teal beads'))
+        db.session.commit()
+
+        idx = EmbeddingIndexer()
+        idx.build_index(force=True)
+        assert 401 in idx.ids and 402 not in idx.ids
+        size = len(idx.ids)
+
+        # Unchanged text is not re-encoded
+        assert idx.upsert_products(Product.query.all()) == 0
+
+        p2 = Product(id=402, name='Teal Ocean Necklace', price=20, description='teal beads')
+        db.session.add(p2)
+        db.session.commit()
+        assert idx.upsert_products([p2]) == 1
+        assert len(idx.ids) == size + 1 and idx.ids == sorted(idx.ids)
+        assert 402 in [pid for pid, _ in idx.query_by_product(401, k=size)]
+
+        db.session.delete(p2)
+        db.session.commit()
+        assert idx.sync() == (0, 1)
+        assert 402 not in idx.ids and idx.embeddings.shape[0] == size
+        db.session.delete(Product.query.get(401))
+        db.session.commit()
+
+
+def test_patched_index_matches_exact_scan():
+    rng = np.random.default_rng(4)
+    old = l2_normalize(rng.standard_normal((40, 8)))
+    # Rows 5 and 9 removed, row 12 edited, two rows added
+    keep = [i for i in range(40) if i not in (5, 9)]
+    new = np.vstack([old[keep], l2_normalize(rng.standard_normal((2, 8)))])
+    new[keep.index(12)] = l2_normalize(rng.standard_normal((1, 8)))[0]
+    rows = np.array([keep.index(i) if i in keep and i != 12 else -1 for i in range(40)])
+    added = [keep.index(12), 38, 39]
+    patched = PatchedIndex(CosineIndex(old), rows, new, added)
+    exact = CosineIndex(new)
+    queries = l2_normalize(rng.standard_normal((5, 8)))
+    mask = rng.random(len(new)) < 0.5
+    for m in (None, mask):
+        d, i = patched.kneighbors(queries, n_neighbors=6, mask=m)
+        d_ref, i_ref = exact.kneighbors(queries, n_neighbors=6, mask=None if m is None else m.copy())
+        np.testing.assert_array_equal(i, i_ref)
+        np.testing.assert_allclose(d, d_ref, atol=1e-5)
+
+
+def test_edits_defer_engine_and_file_rebuild_to_compact(tmp_path):
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer(persist_dir=str(tmp_path))
+        idx.build_index(force=True)
+        meta = tmp_path / 'meta.json'
+        written = meta.stat().st_mtime_ns
+        pid = idx.ids[0]
+
+        p = Product.query.get(pid)
+        p.description = 'completely different words'
+        assert idx.upsert_products([p]) == 1
+        assert idx.compaction_pending and isinstance(idx.nn, PatchedIndex)
+        assert meta.stat().st_mtime_ns == written
+        live = idx.query_by_product(idx.ids[1], k=len(idx.ids) - 1)
+        assert pid in [i for i, _ in live]
+
+        assert idx.compact()
+        assert not idx.compaction_pending and not isinstance(idx.nn, PatchedIndex)
+        assert json.loads(meta.read_text())['ids'] == idx.ids
+        # Same neighbours and distances (ties at distance 1 may come back in another order)
+        compacted = idx.query_by_product(idx.ids[1], k=len(idx.ids) - 1)
+        assert sorted(compacted) == sorted(live)
+        np.testing.assert_allclose([d for _, d in compacted], [d for _, d in live], atol=1e-6)
+        db.session.rollback()
+
+
+def test_stacked_rows_match_a_copied_matrix():
+    rng = np.random.default_rng(6)
+    base = rng.standard_normal((10, 4)).astype(np.float32)
+    first = rng.standard_normal((2, 4)).astype(np.float32)
+    second = rng.standard_normal((1, 4)).astype(np.float32)
+    # Drop row 3, append two rows, then drop the first appended one and append another
+    stacked = StackedRows.select(base, [0, 1, 2, 4, 5, 6, 7, 8, 9, 10, 11], first)
+    stacked = StackedRows.select(stacked, [0, 1, 2, 3, 4, 5, 6, 7, 8, 10, 11], second)
+    expected = np.vstack([base[[0, 1, 2, 4, 5, 6, 7, 8, 9]], first[1:], second])
+    assert stacked.base is base and stacked.shape == expected.shape
+    np.testing.assert_array_equal(materialize_rows(stacked), expected)
+    np.testing.assert_array_equal(take_rows(stacked, [10, 0, 9]), expected[[10, 0, 9]])
+
+
+def test_edits_share_the_built_matrix():
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer()
+        idx.build_index(force=True)
+        built = idx.embeddings
+        p = Product(id=990004, name='Leaf Brooch', description='green leaf patterns', price=3, stock=1)
+        assert idx.upsert_products([p]) == 1
+        assert isinstance(idx.embeddings, StackedRows) and idx.embeddings.base is built
+        assert idx.remove_products([idx.ids[0]]) == 1
+        assert idx.embeddings.base is built and idx.embeddings.shape[0] == len(idx.ids)
+        live = idx.query('green leaf', k=3)
+        assert 990004 in [pid for pid, _ in live]
+        assert idx.compact() and not isinstance(idx.embeddings, StackedRows)
+        np.testing.assert_allclose(sorted(idx.query('green leaf', k=3)), sorted(live), atol=1e-6)
+
+
+def test_edits_during_a_rebuild_are_queued():
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer()
+        idx.build_index(force=True)
+        building, release = threading.Event(), threading.Event()
+        full_build = idx._build_index
+
+        def slow_build(force):
+            building.set()
+            release.wait(5)
+            full_build(force)
+
+        def rebuild():
+            with app.app_context():
+                idx.build_index(force=True)
+
+        idx._build_index = slow_build
+        t = threading.Thread(target=rebuild)
+        t.start()
+        assert building.wait(5)
+        p = Product(id=990005, name='Star Earrings', description='crystal star motifs', price=4, stock=1)
+        # Returns at once instead of waiting for the rebuild's write lock
+        assert idx.upsert_products([p]) == 0
+        assert not release.is_set() and 990005 not in idx.ids
+        release.set()
+        t.join(5)
+        assert 990005 in idx.ids and 990005 in [pid for pid, _ in idx.query('crystal star', k=3)]
@@ -0,0 +1,21 @@
+from app import app, db
+from app.ai import embeddings, encoders
+
+
+def test_model_loaded_once_and_shared(fake_model):
+    with app.app_context():
+        db.create_all()
+        a = embeddings.EmbeddingIndexer(model_name='shared-model')
+        b = embeddings.EmbeddingIndexer(model_name='shared-model')
+    assert a._model is b._model
+    assert fake_model.loads == [('shared-model', {})]
+    assert [s['model'] for s in encoders.model_stats()] == ['shared-model']
+
+
+def test_int8_mode_is_separate_and_tags_cache(fake_model, monkeypatch):
+    monkeypatch.setattr(encoders, 'quantize_dynamic_int8', lambda m: m)
+    fp32 = embeddings.EmbeddingIndexer(model_name='m')
+    int8 = embeddings.EmbeddingIndexer(model_name='m', model_quantize='int8')
+    assert fp32._model is not int8._model
+    assert fake_model.loads == [('m', {}), ('m', {'device': 'cpu'})]
+    assert fp32._cache_model == 'm' and int8._cache_model == 'm:int8'
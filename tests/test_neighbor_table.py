@@ -0,0 +1,88 @@
+import numpy as np
+from app import app, db
+from app.ai.embeddings import EmbeddingIndexer
+from app.ai.neighbors import NeighborTable, compute_neighbors
+from app.ai.search import CosineIndex, l2_normalize
+from app.models import Product
+
+
+def test_compute_neighbors_matches_live_knn_without_self():
+    mat = l2_normalize(np.random.default_rng(6).standard_normal((50, 8)))
+    engine = CosineIndex(mat)
+    rows, dists = compute_neighbors(engine, mat, 5, batch_size=16)
+    assert rows.shape == (50, 5) and rows.dtype == np.int32
+    assert not (rows == np.arange(50)[:, None]).any()
+    d, i = engine.kneighbors(mat[7:8], 6)
+    np.testing.assert_array_equal(rows[7], i[0][1:])
+    np.testing.assert_allclose(dists[7], d[0][1:], atol=1e-6)
+
+
+def test_recommendations_served_from_table_until_catalog_changes(tmp_path):
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer(persist_dir=str(tmp_path), neighbor_k=4)
+        idx.build_index(force=True)
+        pid = idx.ids[0]
+        live = idx.query_by_product(pid, k=3)
+        idx.materialize_neighbors()
+        assert idx.neighbors_fresh()
+
+        engine = idx.nn
+        calls = []
+        orig = engine.kneighbors
+        engine.kneighbors = lambda *a, **kw: calls.append(1) or orig(*a, **kw)
+        assert idx.query_by_product(pid, k=3) == live
+        assert not calls
+        # k beyond the materialized width runs a live query
+        idx.query_by_product(pid, k=10)
+        assert calls
+
+        # A new indexer on the same catalog loads the persisted table
+        warm = EmbeddingIndexer(persist_dir=str(tmp_path), neighbor_k=4)
+        warm.build_index()
+        assert warm.neighbors_fresh()
+        assert warm.query_by_product(pid, k=3) == live
+
+        # After an update the edited product runs live until the table is refreshed
+        p = Product.query.get(pid)
+        p.description = (p.description or '') + ' extra words'
+        assert idx.upsert_products([p]) == 1
+        assert not idx.neighbors_fresh()
+        patched, patched_orig = idx.nn, idx.nn.kneighbors
+        patched.kneighbors = lambda *a, **kw: calls.append(1) or patched_orig(*a, **kw)
+        calls.clear()
+        assert [i for i, _ in idx.query_by_product(pid, k=3)]
+        assert calls
+        idx.materialize_neighbors()
+        assert idx.neighbors_fresh()
+        db.session.rollback()
+
+
+def test_refresh_matches_full_recompute():
+    rng = np.random.default_rng(8)
+    mat = l2_normalize(rng.standard_normal((60, 8)))
+    ids = list(range(100, 160))
+    hashes = {pid: 'h' for pid in ids}
+    rows, dists = compute_neighbors(CosineIndex(mat), mat, 5)
+    table = NeighborTable(ids, rows, dists, 1, hashes)
+
+    # Edit three products, drop two and add one
+    new_mat = mat.copy()
+    new_mat[[3, 20, 41]] = l2_normalize(rng.standard_normal((3, 8)))
+    keep = [i for i in range(60) if i not in (7, 33)]
+    new_ids = [ids[i] for i in keep] + [999]
+    new_mat = np.vstack([new_mat[keep], l2_normalize(rng.standard_normal((1, 8)))])
+    new_hashes = {pid: 'h' for pid in new_ids}
+    for i in (3, 20, 41):
+        new_hashes[ids[i]] = 'edited'
+
+    # Entries that no edit touched are still served from the old table
+    untouched = [pid for pid in new_ids if table.lookup(pid, 5, new_hashes) is not None]
+    assert untouched and ids[3] not in untouched and 999 not in untouched
+
+    engine = CosineIndex(new_mat)
+    fresh = table.refresh(engine, new_mat, new_ids, new_hashes, 5, version=2)
+    assert 0 < fresh.recomputed < len(new_ids)
+    rows, dists = compute_neighbors(engine, new_mat, 5)
+    np.testing.assert_allclose(fresh.dists, dists, atol=1e-5)
+    assert (fresh.rows == rows).mean() > 0.99
@@ -25,3 +25,22 @@ def test_personalized_recommendations(tmp_path):
     assert r.status_code == 200
     data = r.get_json()
     assert 'items' in data
+
+
+def test_history_is_one_weighted_query():
+    from app.ai.embeddings import EmbeddingIndexer
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer(recency_half_life=2.0)
+        idx.build_index(force=True)
+        a, b = idx.ids[0], idx.ids[1]
+        w = idx.history_weights([a, b, a])
+        assert w == {a: 1.0 + 0.5, b: 0.5 ** 0.5}
+
+        calls = []
+        orig = idx.nn.kneighbors
+        idx.nn.kneighbors = lambda *args, **kw: calls.append(1) or orig(*args, **kw)
+        recs = idx.recommend_from_history([a, b] * 40, k=3)
+        assert len(calls) == 1
+        assert len(recs) == 3 and a not in recs and b not in recs
+        assert idx.recommend_from_history([-1]) == []
@@ -0,0 +1,46 @@
+import numpy as np
+from app import app, db
+from app.ai import embeddings
+from app.ai.quant import QuantizedIndex, ScalarQuantizer
+from app.ai.search import CosineIndex, l2_normalize
+
+
+def test_scalar_quantizer_error_within_half_step():
+    mat = l2_normalize(np.random.default_rng(8).standard_normal((300, 24)))
+    q = ScalarQuantizer.fit(mat)
+    codes = q.encode(mat)
+    assert codes.dtype == np.int8 and codes.nbytes * 4 == mat.nbytes
+    assert (np.abs(q.decode(codes) - mat) <= q.scale / 2 + 1e-6).all()
+
+
+def test_quantized_index_rescoring_matches_exact():
+    rng = np.random.default_rng(9)
+    mat = l2_normalize(rng.standard_normal((2000, 32)))
+    queries = rng.standard_normal((10, 32))
+    d_exact, i_exact = CosineIndex(mat).kneighbors(queries, 5)
+    d, i = QuantizedIndex(mat, rescore=8).kneighbors(queries, 5)
+    np.testing.assert_array_equal(i, i_exact)
+    # Distances come from the exact vectors, not the codes
+    np.testing.assert_allclose(d, d_exact, atol=1e-5)
+
+
+def test_indexer_int8_option(fake_model):
+    with app.app_context():
+        db.create_all()
+        idx = embeddings.EmbeddingIndexer(model_name='fake-model', quantize='int8')
+        idx.build_index(force=True)
+        assert isinstance(idx.nn, QuantizedIndex)
+        assert idx.query('gelang', k=3)
+
+
+def test_int8_engine_rescores_from_the_mapped_file(tmp_path, fake_model):
+    from app.models import Product
+    with app.app_context():
+        db.create_all()
+        idx = embeddings.EmbeddingIndexer(model_name='fake-model', quantize='int8', persist_dir=str(tmp_path))
+        idx.build_index(force=True)
+        assert isinstance(idx.nn, QuantizedIndex) and isinstance(idx.nn.matrix, np.memmap)
+
+        idx.upsert_products([Product(id=990002, name='Kalung uji', description='emas', price=1, stock=1)])
+        assert idx.compact()
+        assert isinstance(idx.nn, QuantizedIndex) and isinstance(idx.nn.matrix, np.memmap)
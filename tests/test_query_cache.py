@@ -0,0 +1,43 @@
+from app import app, db
+from app.ai.cache import LRUCache
+from app.ai.embeddings import EmbeddingIndexer
+from app.models import Product
+
+
+def test_lru_cache_eviction_and_ttl():
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)  # evicts 'b', the least recently used
+    assert cache.get('b') is None and cache.evictions == 1
+    now[0] = 11
+    assert cache.get('a') is None and cache.expirations == 1
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2
+
+
+def test_repeated_queries_skip_encoding():
+    with app.app_context():
+        db.create_all()
+        if not Product.query.get(1):
+            db.session.add(Product(id=1, name='Blue Bracelet', price=100, description='Handmade blue bracelet'))
+            db.session.commit()
+        idx = EmbeddingIndexer()
+        idx.build_index(force=True)
+        calls = []
+        encode = idx._encode
+        idx._encode = lambda texts, *a: calls.append(list(texts)) or encode(texts, *a)
+
+        first = idx.query('Gelang  Biru', k=3)
+        assert idx.query('gelang biru', k=3) == first
+        assert calls == [['gelang biru']]
+        stats = idx.query_cache_stats()
+        assert stats['results']['hits'] == 1
+
+        # A new index version invalidates results but reuses the query vector
+        idx.upsert_products([Product(id=999998, name='Gelang Biru Laut', price=1)])
+        idx.query('gelang biru', k=3)
+        assert calls[1:] == [['Gelang Biru Laut ']]  # the product, not the query
+        assert idx.query_cache_stats()['vectors']['hits'] >= 1
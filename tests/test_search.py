@@ -0,0 +1,29 @@
+import numpy as np
+from app.ai.search import CosineIndex, l2_normalize, top_k
+
+
+def test_top_k_matches_full_sort():
+    scores = np.random.default_rng(3).standard_normal((4, 50))
+    inds, vals = top_k(scores, 5)
+    expected = np.argsort(-scores, axis=1)[:, :5]
+    np.testing.assert_array_equal(inds, expected)
+    np.testing.assert_allclose(vals, np.take_along_axis(scores, expected, axis=1))
+    # k larger than the row count returns everything, sorted
+    inds, _ = top_k(scores[:, :3], 10)
+    assert inds.shape == (4, 3)
+
+
+def test_cosine_index_batch_matches_single():
+    rng = np.random.default_rng(4)
+    mat = l2_normalize(rng.standard_normal((200, 16)))
+    engine = CosineIndex(mat)
+    queries = rng.standard_normal((3, 16))
+    dists, inds = engine.kneighbors(queries, 7)
+    for qi in range(3):
+        d1, i1 = engine.kneighbors(queries[qi:qi + 1], 7)
+        np.testing.assert_array_equal(i1[0], inds[qi])
+        sims = l2_normalize(queries[qi:qi + 1]) @ mat.T
+        np.testing.assert_allclose(d1[0], 1.0 - np.sort(sims[0])[::-1][:7], rtol=1e-5, atol=1e-6)
+    # zero query vector (no known words) scores every row at distance 1
+    d0, _ = engine.kneighbors(np.zeros((1, 16)), 3)
+    np.testing.assert_allclose(d0, 1.0)
@@ -0,0 +1,101 @@
+import numpy as np
+from app import app, db
+from app.ai.ann import IVFIndex
+from app.ai.embeddings import EmbeddingIndexer
+from app.ai.quant import QuantizedIndex
+from app.ai.routes import _budget_filter
+from app.ai.search import CosineIndex, l2_normalize
+from app.models import Product
+
+
+def test_engines_apply_mask_before_top_k():
+    rng = np.random.default_rng(11)
+    mat = l2_normalize(rng.standard_normal((2000, 16)))
+    queries = rng.standard_normal((3, 16))
+    mask = rng.random(2000) < 0.05
+    allowed = np.flatnonzero(mask)
+    _, truth = CosineIndex(mat[allowed]).kneighbors(queries, 5)
+    for engine in (CosineIndex(mat), QuantizedIndex(mat), IVFIndex(mat, nlist=8, nprobe=8)):
+        _, inds = engine.kneighbors(queries, 5, mask=mask)
+        np.testing.assert_array_equal(inds, allowed[truth])
+    # fewer allowed rows than k: all of them come back; none allowed: empty
+    few = np.zeros(2000, dtype=bool)
+    few[[3, 7]] = True
+    for engine in (CosineIndex(mat), QuantizedIndex(mat), IVFIndex(mat, nlist=8, nprobe=1)):
+        _, inds = engine.kneighbors(queries, 5, mask=few)
+        assert inds.shape == (3, 2) and set(inds[0]) == {3, 7}
+        _, inds = engine.kneighbors(queries, 5, mask=np.zeros(2000, dtype=bool))
+        assert inds.shape == (3, 0)
+
+
+def test_query_filters_by_price_and_stock():
+    with app.app_context():
+        db.create_all()
+        idx = EmbeddingIndexer()
+        idx.build_index(force=True)
+        # Prices in a band no other test product uses, so rank does not matter
+        idx.upsert_products([
+            Product(id=999981, name='Zamrud bracelet', price=7, stock=3),
+            Product(id=999982, name='Zamrud bracelet deluxe', price=9, stock=3),
+            Product(id=999983, name='Zamrud bracelet mini', price=8, stock=0),
+        ])
+        ids = lambda **f: {pid for pid, _ in idx.query('zamrud bracelet', k=50, **f)}
+        assert ids(min_price=7, max_price=8) == {999981, 999983}
+        assert ids(min_price=7, max_price=9, in_stock=True) == {999981, 999982}
+        assert ids(min_price=10**9) == set()
+
+        # Stock-only edits republish the filter attributes, not the rows
+        version = idx.version
+        assert idx.upsert_products([Product(id=999983, name='Zamrud bracelet mini', price=8, stock=5)]) == 0
+        assert idx.version == version
+        assert ids(min_price=7, max_price=8, in_stock=True) == {999981, 999983}
+        idx.remove_products([999981])
+        assert ids(min_price=7, max_price=8) == {999983}
+
+
+def test_search_endpoint_filters():
+    with app.app_context():
+        db.create_all()
+        if not Product.query.get(1):
+            db.session.add(Product(id=1, name='Blue Bracelet', price=100, description='Handmade blue bracelet'))
+            db.session.commit()
+    client = app.test_client()
+    items = client.get('/api/ai/search?q=bracelet&max_price=150&in_stock=0').get_json()['items']
+    assert all(it['price'] <= 150 for it in items)
+    assert client.get('/api/ai/search?q=bracelet&min_price=abc').status_code == 400
+    resp = client.post('/api/ai/search_batch', json={'queries': ['bracelet'], 'min_price': 10**9})
+    assert resp.get_json()['results'][0]['items'] == []
+
+
+def test_budget_filter_parsing():
+    assert _budget_filter('gelang budget 100 ribu') == {'max_price': 100000}
+    assert _budget_filter('harga di atas 50rb') == {'min_price': 50000}
+    assert _budget_filter('kisaran 50-100k') == {'min_price': 50000, 'max_price': 100000}
+    assert _budget_filter('di bawah Rp 75.000') == {'max_price': 75000}
+    assert _budget_filter('yang murah') == {}
+    assert _budget_filter('50 sampai 100 ribu') == {'min_price': 50000, 'max_price': 100000}
+    assert _budget_filter('lebih dari 1 jt') == {'min_price': 1000000}
+    # Numbers that are not prices: years, sizes, quantities
+    assert _budget_filter('gelang terpopuler 2024') == {}
+    assert _budget_filter('kalung 45 cm harga berapa') == {}
+    assert _budget_filter('cincin ukuran 18 harganya') == {}
+    # Keywords match whole words only: 'batas' (limit) and 'atasan' (a top) are not 'atas'
+    assert _budget_filter('batas harga 100rb') == {'max_price': 100000}
+    assert _budget_filter('atasan rajut 150rb') == {'max_price': 150000}
+    # A bare range end takes the scale of the low end
+    assert _budget_filter('kisaran 100-200') == {'min_price': 100000, 'max_price': 200000}
+    assert _budget_filter('budget 50rb - 75') == {'min_price': 50000, 'max_price': 75000}
+
+
+def test_chat_falls_back_when_budget_excludes_everything():
+    with app.app_context():
+        db.create_all()
+        if not Product.query.get(1):
+            db.session.add(Product(id=1, name='Blue Bracelet', price=100, description='Handmade blue bracelet'))
+            db.session.commit()
+        client = app.test_client()
+        resp = client.post('/api/ai/chat', json={'message': 'gelang bracelet di atas 900 juta'})
+        assert resp.status_code == 200 and resp.get_json()['suggestions']
+        # A misread would have filtered to max_price=2024
+        resp = client.post('/api/ai/chat', json={'message': 'gelang terpopuler 2024'})
+        assert any(it['price'] > 2024 for it in resp.get_json()['suggestions'])
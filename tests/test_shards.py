@@ -0,0 +1,85 @@
+import numpy as np
+import scipy.sparse as sp
+from app import app, db
+from app.ai.embeddings import EmbeddingIndexer
+from app.ai.search import CosineIndex, l2_normalize
+from app.ai.shards import ShardedIndex, ShardPool, shard_bounds
+from app.models import Product
+
+
+def test_shard_bounds_cover_rows():
+    assert shard_bounds(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert shard_bounds(2, 4) == [(0, 1), (1, 2)]
+
+
+def test_sharded_index_matches_single_process():
+    rng = np.random.default_rng(21)
+    mat = l2_normalize(rng.standard_normal((3000, 16)))
+    queries = rng.standard_normal((4, 16))
+    d_exact, i_exact = CosineIndex(mat).kneighbors(queries, 7)
+    mask = rng.random(3000) < 0.1
+    _, i_masked = CosineIndex(mat).kneighbors(queries, 7, mask=mask.copy())
+    engine = ShardedIndex(mat, shards=3)
+    try:
+        assert engine.shards == 3 and len(engine) == 3000
+        d, i = engine.kneighbors(queries, 7)
+        np.testing.assert_array_equal(i, i_exact)
+        np.testing.assert_allclose(d, d_exact, rtol=1e-5, atol=1e-6)
+        np.testing.assert_array_equal(engine.kneighbors(queries, 7, mask=mask)[1], i_masked)
+        assert engine.kneighbors(queries, 7, mask=np.zeros(3000, dtype=bool))[1].shape == (4, 0)
+    finally:
+        engine.close()
+
+    # Generations share the pool's workers; one dropped by newer loads falls back in-process
+    pool = ShardPool(2)
+    try:
+        first = ShardedIndex(mat, shards=2, pool=pool)
+        for _ in range(2):
+            ShardedIndex(mat[:100], shards=2, pool=pool)
+        np.testing.assert_array_equal(first.kneighbors(queries, 7)[1], i_exact)
+    finally:
+        pool.close()
+
+    # TF-IDF rows stay sparse in the workers
+    csr = l2_normalize(sp.random(500, 40, density=0.1, format='csr', random_state=1))
+    engine = ShardedIndex(csr, shards=2)
+    try:
+        np.testing.assert_array_equal(engine.kneighbors(csr[:3], 5)[1], CosineIndex(csr).kneighbors(csr[:3], 5)[1])
+    finally:
+        engine.close()
+
+
+def test_indexer_shards_and_stops_workers():
+    with app.app_context():
+        db.create_all()
+        if Product.query.count() < 2:
+            db.session.add_all([
+                Product(id=1, name='Blue Bracelet', price=100, description='Handmade blue bracelet'),
+                Product(id=2, name='Red Necklace', price=200, description='Stylish red necklace'),
+            ])
+            db.session.commit()
+        plain = EmbeddingIndexer()
+        plain.build_index(force=True)
+        idx = EmbeddingIndexer(shards=2, shard_min_rows=1)
+        idx.build_index(force=True)
+        engine = idx.nn
+        assert isinstance(engine, ShardedIndex)
+        # Same scores (ties may come back from either shard in any order)
+        dists = lambda i: np.round([d for _, d in i.query('bracelet', k=3)], 5)
+        np.testing.assert_array_equal(dists(idx), dists(plain))
+        pids = lambda: {p.pid for ex in idx._shard_pool._executors for p in ex._processes.values()}
+        workers = pids()
+        procs = [p for ex in idx._shard_pool._executors for p in ex._processes.values()]
+        # A rebuild loads a new generation into the same workers (no new processes)
+        idx.build_index(force=True)
+        assert idx.nn is not engine and idx.nn.pool is engine.pool
+        assert pids() == workers
+        # The previous snapshot's engine still answers
+        assert engine.kneighbors(idx.embeddings[:1], 2)[1].shape == (1, 2)
+
+        idx.close()
+        for p in procs:
+            p.join(timeout=5)
+        assert not any(p.is_alive() for p in procs)
+        # Snapshots left on a closed pool scan in-process
+        np.testing.assert_array_equal(dists(idx), dists(plain))
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+from app import app
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_create_app_records_phases():
+    report = app.extensions['startup']
+    phases = [p['phase'] for p in report['phases']]
+    assert phases[0] == 'config' and 'blueprints' in phases and phases[-1] == 'database'
+    assert report['total_seconds'] >= sum(p['seconds'] for p in report['phases']) - 1e-3
+
+
+def test_ai_stack_is_imported_on_first_use():
+    code = (
+        "import json, sys, app; from app.ai import embeddings; "
+        "boot = [m for m in ('sklearn', 'sentence_transformers', 'torch', 'scipy.sparse') if m in sys.modules]; "
+        "embeddings._load_sklearn(); "
+        "print(json.dumps({'boot': boot, 'sklearn': 'sklearn' in sys.modules}))"
+    )
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result == {'boot': [], 'sklearn': True}
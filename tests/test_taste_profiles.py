@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+from app import app, db
+from app.ai.embeddings import EmbeddingIndexer
+from app.ai.profiles import TasteProfile, delete_profile, load_profile, owner_key, record_interaction
+from app.models import Product, User
+
+
+def test_running_profile_matches_history_weights():
+    idx = EmbeddingIndexer.__new__(EmbeddingIndexer)
+    idx.recency_half_life = 3.0
+    history = [5, 7, 5, 9, 7]  # oldest first
+    profile = TasteProfile('session:x')
+    for pid in history:
+        profile.record(pid, half_life=3.0, max_items=10)
+    expected = idx.history_weights(list(reversed(history)))
+    assert profile.weights.keys() == expected.keys()
+    for pid, w in expected.items():
+        assert profile.weights[pid] == pytest.approx(w)
+    profile.record(11, half_life=3.0, max_items=2)
+    assert set(profile.weights) == {11, 7}
+
+
+def test_profile_logged_and_merged_on_login():
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(username='taste_user').first()
+        if not user:
+            user = User(username='taste_user')
+            user.set_password('pw')
+            db.session.add(user)
+            db.session.commit()
+        pid = Product.query.order_by(Product.id).first().id
+        uid = user.id
+
+    client = app.test_client()
+    # A fresh app context so requests do not see a user left in ``g`` by other tests
+    with app.app_context():
+        client.get(f'/product/{pid}')
+        with client.session_transaction() as s:
+            sid = s['sid']
+        assert load_profile(owner_key(session_id=sid)).weights == {pid: 1.0}
+        r = client.get('/api/ai/recommend_for_user')
+        assert r.status_code == 200 and all(item['id'] != pid for item in r.get_json()['items'])
+
+        client.post('/login', data={'username': 'taste_user', 'password': 'pw'})
+        assert load_profile(owner_key(session_id=sid)) is None
+        assert load_profile(owner_key(user_id=uid)).weights.get(pid, 0) >= 1.0
+        r = client.get('/api/ai/recommend_for_user')
+        assert r.status_code == 200 and r.get_json()['items']
+
+
+def test_concurrent_events_are_all_counted():
+    owner = owner_key(session_id='concurrent-events')
+    with app.app_context():
+        db.create_all()
+        delete_profile(owner)
+    start, errors = threading.Barrier(4), []
+
+    def _log(pid):
+        with app.app_context():
+            start.wait()
+            try:
+                for _ in range(10):
+                    record_interaction(owner, pid, half_life=1e9, max_items=10)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=_log, args=(pid,)) for pid in (1, 2, 3, 4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with app.app_context():
+        profile = load_profile(owner)
+        delete_profile(owner)
+    assert not errors
+    # No read-modify-write lost another thread's event
+    assert profile.events == 40
+    assert profile.weights == pytest.approx({1: 10.0, 2: 10.0, 3: 10.0, 4: 10.0})
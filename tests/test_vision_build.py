@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+from PIL import Image  # type: ignore
+
+from app.ai import vision
+from app.ai.vision import VisionIndexer
+
+
+def _indexer(tmp_path, catalog, **kw):
+    idx = VisionIndexer(static_folder=str(tmp_path / 'static'), persist_dir=str(tmp_path / 'index'), **kw)
+    idx._catalog_images = lambda: sorted(catalog.items())
+    return idx
+
+
+def _save(tmp_path, name, colour):
+    folder = tmp_path / 'static' / 'images'
+    folder.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (24, 24), colour).save(folder / name)
+
+
+def _counting(monkeypatch):
+    calls = []
+    real = vision._describe
+
+    def describe(job):
+        calls.append(os.path.basename(job[0]))
+        return real(job)
+    monkeypatch.setattr(vision, '_describe', describe)
+    return calls
+
+
+def test_rebuild_only_describes_new_or_changed_images(tmp_path, monkeypatch):
+    calls = _counting(monkeypatch)
+    catalog = {1: 'red.png', 2: 'blue.png'}
+    _save(tmp_path, 'red.png', (200, 0, 0))
+    _save(tmp_path, 'blue.png', (0, 0, 200))
+    idx = _indexer(tmp_path, catalog)
+    idx.build_index()
+    assert sorted(calls) == ['blue.png', 'red.png']
+
+    calls.clear()
+    _save(tmp_path, 'green.png', (0, 200, 0))
+    catalog[3] = 'green.png'
+    idx.build_index(force=True)
+    assert calls == ['green.png'] and idx.ids == [1, 2, 3]
+
+    # Rewriting an image changes its size/mtime key
+    calls.clear()
+    _save(tmp_path, 'red.png', (0, 0, 180))
+    st = os.stat(tmp_path / 'static' / 'images' / 'red.png')
+    os.utime(tmp_path / 'static' / 'images' / 'red.png', ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    del catalog[2]
+    idx.build_index(force=True)
+    assert calls == ['red.png'] and idx.ids == [1, 3]
+    assert idx.query_image(Image.new('RGB', (8, 8), (0, 0, 190)), k=1)[0][0] == 1
+
+    # A new process picks the keys up from the persisted sidecar
+    calls.clear()
+    fresh = _indexer(tmp_path, catalog)
+    fresh.build_index(force=True)
+    assert calls == [] and fresh.ids == [1, 3]
+    np.testing.assert_allclose(np.asarray(fresh.features), np.asarray(idx.features))
+
+
+def test_parallel_build_matches_serial(tmp_path):
+    rng = np.random.default_rng(3)
+    catalog = {}
+    for pid in range(1, vision._PARALLEL_MIN + 9):
+        catalog[pid] = f'p{pid}.png'
+        _save(tmp_path, catalog[pid], tuple(int(c) for c in rng.integers(0, 256, 3)))
+    catalog[999] = 'missing.png'
+    (tmp_path / 'static' / 'images' / 'broken.png').write_bytes(b'not an image')
+    catalog[1000] = 'broken.png'
+
+    parallel = _indexer(tmp_path, catalog, workers=2)
+    parallel.build_index()
+    serial = VisionIndexer(static_folder=str(tmp_path / 'static'), workers=1)
+    serial._catalog_images = parallel._catalog_images
+    serial.build_index()
+    assert parallel.ids == serial.ids == list(range(1, vision._PARALLEL_MIN + 9))
+    np.testing.assert_array_equal(np.asarray(parallel.features), np.asarray(serial.features))
@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image  # type: ignore
+
+from app import app
+from app.ai.vision import ImageTooLarge, VisionIndexer, _hist_feature, load_image, nearest_l2
+
+
+def test_nearest_l2_matches_brute_force():
+    rng = np.random.default_rng(5)
+    feats = rng.random((300, 24), dtype=np.float32)
+    queries = rng.random((2, 24), dtype=np.float32)
+    dists, inds = nearest_l2(feats, np.einsum('ij,ij->i', feats, feats), queries, 6)
+    full = np.linalg.norm(feats[None, :, :] - queries[:, None, :], axis=2)
+    np.testing.assert_array_equal(inds, np.argsort(full, axis=1)[:, :6])
+    np.testing.assert_allclose(dists, np.sort(full, axis=1)[:, :6], rtol=1e-4, atol=1e-4)
+
+
+def test_query_image_ranks_closest_colour_first():
+    idx = VisionIndexer(static_folder=None)
+    colours = {1: (200, 0, 0), 2: (0, 0, 200), 3: (0, 200, 0)}
+    feats = [_hist_feature(Image.new('RGB', (16, 16), c)) for c in colours.values()]
+    idx._publish(list(colours), np.vstack(feats))
+    assert idx.features.shape == (3, 768) and idx.features.dtype == np.float32
+    hits = idx.query_image(Image.new('RGB', (16, 16), (0, 0, 200)), k=2)
+    assert hits[0][0] == 2 and hits[0][1] < 1e-3
+    assert len(hits) == 2
+
+
+def _encoded(size, fmt):
+    bio = io.BytesIO()
+    Image.new('RGB', size, (30, 90, 200)).save(bio, format=fmt)
+    bio.seek(0)
+    return bio
+
+
+def test_load_image_decodes_at_working_size():
+    for fmt in ('JPEG', 'PNG'):
+        img = load_image(_encoded((2400, 1600), fmt), work_size=200)
+        assert img.mode == 'RGB' and 200 <= max(img.size) < 400
+    small = load_image(_encoded((120, 80), 'PNG'), work_size=200)
+    assert small.size == (120, 80)
+    with pytest.raises(ImageTooLarge):
+        load_image(_encoded((2400, 1600), 'PNG'), max_pixels=1_000_000)
+
+
+def test_visual_search_refuses_oversized_upload(monkeypatch):
+    monkeypatch.setitem(app.config, 'VISION_MAX_PIXELS', 1000)
+    with app.app_context():
+        resp = app.test_client().post('/api/ai/visual_search', content_type='multipart/form-data',
+                                      data={'image': (_encoded((64, 64), 'PNG'), 'big.png')})
+    assert resp.status_code == 413
+
+
+def test_visual_search_maps_decompression_bomb_to_413(monkeypatch):
+    # Pillow refuses images over twice MAX_IMAGE_PIXELS while reading the header
+    monkeypatch.setitem(app.config, 'VISION_MAX_PIXELS', 0)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with app.app_context():
+        resp = app.test_client().post('/api/ai/visual_search', content_type='multipart/form-data',
+                                      data={'image': (_encoded((64, 64), 'PNG'), 'bomb.png')})
+    assert resp.status_code == 413
+
+
+def test_load_image_reduces_before_converting(monkeypatch):
+    sizes = []
+    convert = Image.Image.convert
+    monkeypatch.setattr(Image.Image, 'convert', lambda im, *a, **kw: sizes.append(im.size) or convert(im, *a, **kw))
+    bio = io.BytesIO()
+    Image.new('L', (1600, 1200), 90).save(bio, format='PNG')
+    bio.seek(0)
+    img = load_image(bio, work_size=200)
+    assert img.mode == 'RGB' and img.getpixel((0, 0)) == (90, 90, 90) and sizes == [(200, 150)]
+    # Palette images are converted first (averaging palette indices is meaningless)
+    bio = io.BytesIO()
+    Image.new('P', (1600, 1200)).save(bio, format='PNG')
+    bio.seek(0)
+    assert load_image(bio, work_size=200).size == (200, 150)
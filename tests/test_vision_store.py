@@ -0,0 +1,53 @@
+import json
+import os
+
+import numpy as np
+from PIL import Image  # type: ignore
+
+from app.ai.search import is_sparse
+from app.ai.store import read_matrix_file, write_matrix_file
+from app.ai.vision import VisionIndexer, _hist_feature
+
+
+def test_csr_matrix_file_round_trip(tmp_path):
+    import scipy.sparse as sp
+    dense = np.zeros((4, 10), dtype=np.float32)
+    dense[0, 3], dense[2, 9], dense[2, 0] = 1.0, 0.5, 0.25
+    path = str(tmp_path / 'm.vec')
+    write_matrix_file(path, sp.csr_matrix(dense), [5, 6, 7, 8], tag='x')
+    ids, matrix, header = read_matrix_file(path)
+    assert ids == [5, 6, 7, 8] and header['layout'] == 'csr' and header['tag'] == 'x'
+    assert is_sparse(matrix)
+    # the arrays are views of the mapped file, not copies
+    assert not (matrix.data.flags.owndata or matrix.indices.flags.owndata or matrix.indptr.flags.owndata)
+    np.testing.assert_array_equal(matrix.toarray(), dense)
+
+
+def test_legacy_json_is_converted_to_binary_store(tmp_path):
+    colours = [(200, 0, 0), (0, 0, 200), (0, 200, 0)]
+    feats = np.vstack([_hist_feature(Image.new('RGB', (8, 8), c)) for c in colours])
+    with open(tmp_path / 'vision_features.json', 'w') as f:
+        json.dump({'ids': [1, 2, 3], 'features': feats.tolist()}, f)
+
+    first = VisionIndexer(static_folder=None, persist_dir=str(tmp_path))
+    first.build_index()
+    assert first.ids == [1, 2, 3]
+    assert os.path.isfile(tmp_path / 'vision-features-rgb768.vec')
+
+    # Later loads map the binary file; one-hot histograms are stored as CSR
+    os.remove(tmp_path / 'vision_features.json')
+    second = VisionIndexer(static_folder=None, persist_dir=str(tmp_path))
+    second.build_index()
+    assert is_sparse(second.features)
+    np.testing.assert_allclose(second.features.toarray(), feats)
+    query = Image.new('RGB', (8, 8), (0, 0, 190))
+    assert second.query_image(query, k=3) == first.query_image(query, k=3)
+    assert second.query_image(query, k=1)[0][0] == 2
+
+
+def test_feature_file_from_another_descriptor_is_ignored(tmp_path, monkeypatch):
+    idx = VisionIndexer(static_folder=None, persist_dir=str(tmp_path))
+    idx._persist_features([1], np.ones((1, 768), dtype=np.float32))
+    assert idx._load_features()[0] == [1]
+    monkeypatch.setattr(idx.descriptor, 'version', idx.descriptor.version + 1)
+    assert idx._load_features() is None